@@ -16,11 +16,56 @@ SCENARIO_DIR = BASE_DIR / "app" / "simulations" / "data"
 
 DATABASE_URL = f"sqlite:///{DB_PATH}"
 
+# Write-behind journal for customer order requests (batched into the DB)
+ORDER_REQUEST_JOURNAL = BASE_DIR / "order_requests.journal"
+ORDER_REQUEST_FLUSH_INTERVAL = 0.5  # seconds
+ORDER_REQUEST_MAX_BATCH = 500
+
 # The narrative date for the demo - all logic uses this as "today"
 APP_SIMULATION_DATE = "2025-10-10"
 
 # Gemini API key (Now it will actually find it)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 
-# Copilot timeout in seconds
-COPILOT_TIMEOUT = 3.0
\ No newline at end of file
+# Copilot timeout in seconds for a whole chat exchange, tool rounds included
+# (kept well inside the frontend's 10s request timeout)
+COPILOT_TIMEOUT = 3.0
+# Most of that budget one data tool the model asked for may use
+COPILOT_TOOL_TIMEOUT = 2.0
+
+# Copilot model and the most model calls allowed in flight at once
+COPILOT_MODEL = "gemini-2.5-flash"
+COPILOT_MAX_CONCURRENCY = 8
+
+# Copilot model backend: "gemini", or "standin" for a local stand-in used in load tests
+COPILOT_BACKEND = os.getenv("COPILOT_BACKEND", "gemini")
+COPILOT_STANDIN_LATENCY_MS = float(os.getenv("COPILOT_STANDIN_LATENCY_MS", "800"))  # median
+COPILOT_STANDIN_LATENCY_SIGMA = float(os.getenv("COPILOT_STANDIN_LATENCY_SIGMA", "0.5"))  # log-normal spread
+COPILOT_STANDIN_ERROR_RATE = float(os.getenv("COPILOT_STANDIN_ERROR_RATE", "0.02"))
+COPILOT_STANDIN_CHUNK_CHARS = int(os.getenv("COPILOT_STANDIN_CHUNK_CHARS", "16"))
+COPILOT_STANDIN_CHUNK_DELAY_MS = float(os.getenv("COPILOT_STANDIN_CHUNK_DELAY_MS", "30"))
+COPILOT_STANDIN_TOOL_CALL_RATE = float(os.getenv("COPILOT_STANDIN_TOOL_CALL_RATE", "0"))  # first turns that call a tool
+
+# Cached copilot answers per (question, scenario, inventory snapshot)
+COPILOT_CACHE_TTL = 300  # seconds
+COPILOT_CACHE_MAX_ENTRIES = 1000
+
+# Copilot prompt budget: snapshot size in the system prompt, size of each tool
+# result, and model/tool round trips per question
+COPILOT_PROMPT_BUDGET_CHARS = 2000
+COPILOT_TOOL_RESULT_BUDGET_CHARS = 1500
+COPILOT_MAX_TOOL_ROUNDS = 3
+
+# Monte Carlo stockout simulation: worker processes, paths per pool task,
+# and paths vectorized at once inside a task (bounds memory)
+MONTE_CARLO_WORKERS = int(os.getenv("MONTE_CARLO_WORKERS", str(os.cpu_count() or 1)))
+MONTE_CARLO_CHUNK_PATHS = 500
+MONTE_CARLO_BATCH_PATHS = 100
+MONTE_CARLO_MAX_PATHS = 20000
+# Simulations run at once (each uses the whole pool); later ones wait up to the timeout
+MONTE_CARLO_MAX_CONCURRENT = 2
+MONTE_CARLO_QUEUE_TIMEOUT = 10.0  # seconds
+
+# Custom what-if scenarios kept: ids (parameter sets) and their results per
+# inventory version, least recently used dropped first
+CUSTOM_SCENARIO_CACHE_SIZE = 256
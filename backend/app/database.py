@@ -17,6 +17,16 @@ class Base(DeclarativeBase):
     pass
 
 
+def init_db():
+    """Create any missing tables and indexes (existing tables are left untouched)."""
+    import app.models  # noqa: F401 - register all models on Base.metadata
+
+    Base.metadata.create_all(bind=engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -2,16 +2,24 @@ from __future__ import annotations
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
+from app.database import engine, Base, init_db
 from app.config import APP_SIMULATION_DATE
 
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: preload Prophet models and scenario data
+    # Startup: create new tables, preload Prophet models, scenario data, spatial and colour indexes, score dealers, copilot client, simulation pool
     from app.services.forecast_service import preload_models
     from app.simulations.scenarios import preload_scenarios
+    from app.services.dealer_service import refresh_all_health_scores
+    from app.services.geo_service import build_spatial_indexes
+    from app.services.color_service import build_color_index
+    from app.services.order_request_queue import order_request_queue
+    from app.services.copilot_service import init_copilot_client
+    from app.simulations.monte_carlo import start_simulation_pool, stop_simulation_pool
+    init_db()
+    order_request_queue.start()
     try:
         preload_models()
     except Exception as e:
@@ -20,8 +28,30 @@ async def lifespan(app: FastAPI):
         preload_scenarios()
     except Exception as e:
         print(f"Warning: Could not preload scenarios: {e}")
+    try:
+        build_spatial_indexes()
+    except Exception as e:
+        print(f"Warning: Could not build spatial indexes: {e}")
+    try:
+        build_color_index()
+    except Exception as e:
+        print(f"Warning: Could not build colour index: {e}")
+    try:
+        refresh_all_health_scores()
+    except Exception as e:
+        print(f"Warning: Could not compute dealer health scores: {e}")
+    try:
+        init_copilot_client()
+    except Exception as e:
+        print(f"Warning: Could not configure copilot model client: {e}")
+    try:
+        start_simulation_pool()
+    except Exception as e:
+        print(f"Warning: Could not start Monte Carlo worker pool, simulating in-process: {e}")
     yield
-    # Shutdown
+    # Shutdown: drain queued order requests, stop the simulation workers
+    order_request_queue.stop()
+    stop_simulation_pool()
 
 
 app = FastAPI(
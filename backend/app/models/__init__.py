@@ -1,14 +1,14 @@
 from __future__ import annotations
 from app.models.product import Product, Shade, SKU
 from app.models.inventory import Region, Warehouse, InventoryLevel, InventoryTransfer
-from app.models.dealer import Dealer, DealerOrder
+from app.models.dealer import Dealer, DealerOrder, DealerBundleAcceptance, DealerHealthScore
 from app.models.sales import SalesHistory
-from app.models.customer import CustomerOrderRequest
+from app.models.customer import CustomerOrderRequest, CustomerOrderRequestRef
 
 __all__ = [
     "Product", "Shade", "SKU",
     "Region", "Warehouse", "InventoryLevel", "InventoryTransfer",
-    "Dealer", "DealerOrder",
+    "Dealer", "DealerOrder", "DealerBundleAcceptance", "DealerHealthScore",
     "SalesHistory",
-    "CustomerOrderRequest",
+    "CustomerOrderRequest", "CustomerOrderRequestRef",
 ]
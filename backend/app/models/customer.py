@@ -15,3 +15,11 @@ class CustomerOrderRequest(Base):
     dealer_id = Column(Integer, ForeignKey("dealers.id"), nullable=False)
     status = Column(String, default="requested")  # requested, contacted, fulfilled
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CustomerOrderRequestRef(Base):
+    """Queue reference of each inserted order request (lets journal replay skip rows already inserted)."""
+    __tablename__ = "customer_order_request_refs"
+
+    ref = Column(String, primary_key=True)
+    request_id = Column(Integer, ForeignKey("customer_order_requests.id"), nullable=False)
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime
@@ -40,3 +40,32 @@ class DealerOrder(Base):
     savings_amount = Column(Float, default=0.0)
 
     dealer = relationship("Dealer", back_populates="orders")
+
+    __table_args__ = (
+        # Keyset pagination of a dealer's order history by (order_date, id)
+        Index("ix_dealer_orders_dealer_date_id", "dealer_id", "order_date", "id"),
+    )
+
+
+class DealerBundleAcceptance(Base):
+    """One row per accepted smart-order recommendation set (makes bundle acceptance idempotent)."""
+    __tablename__ = "dealer_bundle_acceptances"
+
+    recommendation_set_id = Column(String, primary_key=True)
+    dealer_id = Column(Integer, ForeignKey("dealers.id"), nullable=False)
+    orders_placed = Column(Integer, nullable=False, default=0)
+    total_savings = Column(Float, nullable=False, default=0.0)
+    accepted_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DealerHealthScore(Base):
+    """Precomputed dealer health score, refreshed by the batch scoring job."""
+    __tablename__ = "dealer_health_scores"
+
+    dealer_id = Column(Integer, ForeignKey("dealers.id"), primary_key=True)
+    health_score = Column(Float, nullable=False)
+    coverage_score = Column(Float, nullable=False)
+    stockout_score = Column(Float, nullable=False)
+    fulfillment_score = Column(Float, nullable=False)
+    breadth_score = Column(Float, nullable=False)
+    computed_at = Column(DateTime, default=datetime.utcnow)
@@ -3,6 +3,8 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.services.analytics_service import get_dashboard_summary, get_dealer_performance, get_top_skus
+from app.services.dealer_service import refresh_health_scores
+from app.services.order_request_queue import order_request_queue
 from app.services.inventory_service import (
     get_warehouse_map_data, get_warehouse_inventory,
     get_recommended_transfers, approve_transfer, get_dead_stock,
@@ -51,6 +53,16 @@ def dealer_performance(region_id: int = None, db: Session = Depends(get_db)):
     return get_dealer_performance(db, region_id)
 
 
+@router.post("/dealers/health-scores/refresh")
+def refresh_dealer_health_scores(db: Session = Depends(get_db)):
+    return {"success": True, "dealers_scored": refresh_health_scores(db)}
+
+
 @router.get("/top-skus")
 def top_skus(limit: int = 10, db: Session = Depends(get_db)):
     return get_top_skus(db, limit)
+
+
+@router.get("/order-requests/queue")
+def order_request_queue_metrics():
+    return order_request_queue.metrics()
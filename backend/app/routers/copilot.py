@@ -1,13 +1,17 @@
 from __future__ import annotations
 from typing import Optional, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from app.database import get_db
 
 # Import your services
-from app.services.copilot_service import get_chat_response
-from app.services.inventory_service import get_warehouse_map_data
+from app.services.copilot_service import (
+    get_chat_response, stream_chat_response, get_inventory_snapshot, get_copilot_metrics,
+)
+from app.sse import format_sse
 
 router = APIRouter()
 
@@ -22,64 +26,63 @@ async def chat(request: ChatRequest, db: Session = Depends(get_db)):
     """
     AI Copilot chat endpoint with Generative UI support.
     
-    1. Fetches real-time warehouse data.
+    1. Fetches the cached real-time warehouse snapshot.
     2. Injects critical/overstock alerts into the AI's context.
     3. Returns a structured JSON response (text + optional UI widget).
     """
     
-    # Initialize context from request or empty dict
-    context = request.context or {}
+    context = await _build_context(request, db)
 
-    # --- Context Injection Logic ---
-    try:
-        # Fetch real-time data from the database
-        map_data = get_warehouse_map_data(db)
-        
-        # Filter for warehouses that need attention
-        critical = [w for w in map_data if w.get("status") == "critical"]
-        overstocked = [w for w in map_data if w.get("status") == "overstocked"]
+    # --- Call the AI Service ---
+    # This function (in copilot_service.py) handles the Gemini API call
+    response = await get_chat_response(request.message, context, db)
+    
+    return response
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, db: Session = Depends(get_db)):
+    """
+    Streaming variant of /chat (server-sent events): `token` events carry the
+    answer text as it is generated, then `ui_widget`, then `done` with the
+    complete response (the heuristic fallback on timeout or error).
+    """
+    context = await _build_context(request, db)
 
-        snapshot_lines = []
-        
-        # Format Critical Alerts clearly for the AI
-        if critical:
-            snapshot_lines.append("⚠️ CRITICAL ALERTS (High Priority):")
-            for w in critical:
-                # Safe access to keys with defaults
-                city = w.get('city', 'Unknown')
-                code = w.get('code', 'N/A')
-                crit_count = w.get('critical_skus', 0)
-                rev_risk = w.get('revenue_at_risk', 0)
-                
-                snapshot_lines.append(
-                    f"- {city} ({code}): {crit_count} SKUs at risk. Revenue impact: ₹{rev_risk:,.0f}"
-                )
-        
-        # Format Overstock Alerts
-        if overstocked:
-            snapshot_lines.append("📦 OVERSTOCK ALERTS:")
-            for w in overstocked:
-                city = w.get('city', 'Unknown')
-                code = w.get('code', 'N/A')
-                over_count = w.get('overstock_skus', 0)
-                
-                snapshot_lines.append(
-                    f"- {city} ({code}): {over_count} excess SKUs."
-                )
+    async def events():
+        async for event, data in stream_chat_response(request.message, context, db):
+            yield format_sse(event, data)
 
-        # Finalize the snapshot string
-        if not snapshot_lines:
-            context["inventory_snapshot"] = "✅ All warehouses are currently healthy. No critical issues."
-        else:
-            context["inventory_snapshot"] = "\n".join(snapshot_lines)
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
+
+async def _build_context(request: ChatRequest, db: Session) -> Dict[str, Any]:
+    # Initialize context from request or empty dict; the snapshot and its
+    # version (part of the response cache key) only ever come from the server
+    context = dict(request.context or {})
+    context.pop("inventory_snapshot", None)
+    context.pop("snapshot_version", None)
+
+    # --- Context Injection Logic ---
+    try:
+        # Cached between inventory changes, so chats don't rebuild the warehouse map
+        snapshot = await run_in_threadpool(get_inventory_snapshot, db)
+        context["inventory_snapshot"] = snapshot["text"]
+        context["snapshot_version"] = snapshot["version"]
     except Exception as e:
         # Fallback if DB fetch fails, so chat doesn't crash
         print(f"Error building copilot context: {e}")
         context["inventory_snapshot"] = "Error: Unable to fetch real-time inventory data."
+        context["snapshot_version"] = None
 
-    # --- Call the AI Service ---
-    # This function (in copilot_service.py) handles the Gemini API call
-    response = await get_chat_response(request.message, context)
-    
-    return response
\ No newline at end of file
+    return context
+
+
+@router.get("/metrics")
+def copilot_metrics():
+    """Model call concurrency and latency histograms per outcome."""
+    return get_copilot_metrics()
@@ -1,11 +1,18 @@
 from __future__ import annotations
-from fastapi import APIRouter, Depends, UploadFile, File
+from fastapi import APIRouter, Depends, Query, Request, Response, UploadFile, File
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from app.database import get_db
-from app.models import Shade, SKU, Product, Dealer, InventoryLevel, CustomerOrderRequest
-from datetime import datetime
-import math
+from app.models import Shade, SKU, Product, Dealer
+from app.services.geo_service import get_dealer_index
+from app.services.availability_service import get_shade_availability, get_shade_substitutes
+from app.services.catalog_service import get_catalog_snapshot, CACHE_CONTROL
+from app.services.order_request_queue import order_request_queue
+from app.services.search_service import search_shades
+from app.services.color_service import (
+    get_color_index, match_confidence, extract_dominant_colors, MAX_UPLOAD_BYTES,
+)
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter()
 
@@ -20,33 +27,48 @@ class OrderRequestCreate(BaseModel):
 
 @router.get("/shades")
 def get_shades(
+    request: Request,
     family: str = None, category: str = None, trending: bool = None,
     db: Session = Depends(get_db),
 ):
-    query = db.query(Shade)
-    if family:
-        query = query.filter(Shade.shade_family == family)
-    if trending is not None:
-        query = query.filter(Shade.is_trending == trending)
-
-    shades = query.all()
-    result = []
-    for s in shades:
-        product = db.query(Product).filter(Product.id == s.product_id).first()
-        if category and product and product.category != category:
-            continue
-        result.append({
-            "id": s.id,
-            "shade_code": s.shade_code,
-            "shade_name": s.shade_name,
-            "hex_color": s.hex_color,
-            "shade_family": s.shade_family,
-            "is_trending": s.is_trending,
-            "product_name": product.name if product else "",
-            "product_category": product.category if product else "",
-            "finish": product.finish if product else "",
-        })
-    return result
+    snapshot = get_catalog_snapshot(db, family, category, trending)
+    headers = {"ETag": snapshot["etag"], "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+    if _etag_matches(request.headers.get("if-none-match", ""), snapshot["etag"]):
+        return Response(status_code=304, headers=headers)
+
+    if _accepts_gzip(request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=snapshot["gzip_body"], media_type="application/json", headers=headers)
+    return Response(content=snapshot["body"], media_type="application/json", headers=headers)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # Weak comparison, as If-None-Match requires: W/ prefixes are ignored
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding.lower()] = q
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+@router.get("/shades/search")
+def search_shade_catalog(q: str = Query(..., max_length=100), limit: int = Query(10, ge=1, le=50), db: Session = Depends(get_db)):
+    """Autocomplete search over shade name, shade code and product name (typo tolerant)."""
+    return search_shades(db, q, limit)
 
 
 @router.get("/shades/{shade_id}")
@@ -80,138 +102,157 @@ def get_shade_detail(shade_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/shades/{shade_id}/availability")
-def shade_availability(shade_id: int, lat: float = 19.07, lng: float = 72.87, db: Session = Depends(get_db)):
-    """Find nearby dealers with stock for this shade."""
-    shade = db.query(Shade).filter(Shade.id == shade_id).first()
-    if not shade:
-        return []
+def shade_availability(
+    shade_id: int, lat: float = 19.07, lng: float = 72.87,
+    size: list[str] = Query(["4L"]),
+    db: Session = Depends(get_db),
+):
+    """Find nearby dealers with stock for this shade, in one or more sizes."""
+    return get_shade_availability(db, shade_id, lat, lng, size)
 
-    # Get 4L SKU for this shade
-    sku = db.query(SKU).filter(SKU.shade_id == shade_id, SKU.size == "4L").first()
-    if not sku:
-        return []
 
-    dealers = db.query(Dealer).all()
-    results = []
+@router.get("/shades/{shade_id}/substitutes")
+def shade_substitutes(
+    shade_id: int, lat: float = 19.07, lng: float = 72.87, size: str = "4L",
+    limit: int = Query(5, ge=1, le=20),
+    db: Session = Depends(get_db),
+):
+    """Closest-colour alternatives that nearby dealers have in stock."""
+    return get_shade_substitutes(db, shade_id, lat, lng, size, limit)
 
-    for dealer in dealers:
-        # Calculate distance
-        dist = _haversine(lat, lng, dealer.latitude, dealer.longitude)
-        if dist > 50:  # 50km radius
-            continue
-
-        # Check stock at dealer's warehouse
-        level = db.query(InventoryLevel).filter(
-            InventoryLevel.warehouse_id == dealer.warehouse_id,
-            InventoryLevel.sku_id == sku.id,
-        ).first()
-
-        stock = level.current_stock if level else 0
-        if stock > 50:
-            stock_status = "In Stock"
-        elif stock > 0:
-            stock_status = "Low Stock"
-        else:
-            stock_status = "Out of Stock"
 
+@router.get("/dealers/nearby")
+def nearby_dealers(
+    lat: float = 19.07, lng: float = 72.87,
+    radius_km: float = Query(50, gt=0, le=500), limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+):
+    hits = get_dealer_index(db).nearest(lat, lng, k=limit, max_radius_km=radius_km)
+    dealers = {d.id: d for d in db.query(Dealer).filter(Dealer.id.in_([h[0] for h in hits]))}
+    results = []
+    for dealer_id, dist in hits:
+        d = dealers[dealer_id]
         results.append({
-            "dealer_id": dealer.id,
-            "dealer_name": dealer.name,
-            "city": dealer.city,
+            "id": d.id,
+            "name": d.name,
+            "city": d.city,
             "distance_km": round(dist, 1),
-            "stock_status": stock_status,
-            "stock_qty": stock,
-            "latitude": dealer.latitude,
-            "longitude": dealer.longitude,
+            "tier": d.tier,
+            "latitude": d.latitude,
+            "longitude": d.longitude,
         })
-
-    return sorted(results, key=lambda x: x["distance_km"])[:10]
-
-
-@router.get("/dealers/nearby")
-def nearby_dealers(lat: float = 19.07, lng: float = 72.87, db: Session = Depends(get_db)):
-    dealers = db.query(Dealer).all()
-    results = []
-    for d in dealers:
-        dist = _haversine(lat, lng, d.latitude, d.longitude)
-        if dist < 50:
-            results.append({
-                "id": d.id,
-                "name": d.name,
-                "city": d.city,
-                "distance_km": round(dist, 1),
-                "tier": d.tier,
-                "latitude": d.latitude,
-                "longitude": d.longitude,
-            })
-    return sorted(results, key=lambda x: x["distance_km"])[:10]
+    return results
 
 
 @router.post("/order-request")
-def create_order_request(req: OrderRequestCreate, db: Session = Depends(get_db)):
-    order_req = CustomerOrderRequest(
-        customer_name=req.customer_name,
-        customer_phone=req.customer_phone,
-        shade_id=req.shade_id,
-        size_preference=req.size_preference,
-        dealer_id=req.dealer_id,
-        status="requested",
-        created_at=datetime.utcnow(),
-    )
-    db.add(order_req)
-    db.commit()
-    return {"success": True, "request_id": order_req.id, "status": "requested"}
+def create_order_request(req: OrderRequestCreate):
+    """
+    Accept an order request immediately; it is written to the DB with the next
+    batch. `request_id` is the queue reference (kept under its original key for
+    existing clients), also returned as `request_ref`.
+    """
+    ref = order_request_queue.submit(req.model_dump())
+    return {"success": True, "request_id": ref, "request_ref": ref, "status": "requested"}
 
 
 @router.post("/snap-find")
-async def snap_and_find(hex_color: str = "#FFD700", db: Session = Depends(get_db)):
+async def snap_and_find(
+    hex_color: str = "#FFD700", file: UploadFile = File(None),
+    db: Session = Depends(get_db),
+):
     """
-    Find closest shade match for a given hex color.
-    In production with Gemini Vision, this would accept an image upload.
+    Find closest shade match for a given hex color, or for the dominant
+    colors of an uploaded photo. Decoding and matching run in the threadpool,
+    off the event loop.
     """
+    if file is not None:
+        return await _snap_and_find_image(file, db)
+    return await run_in_threadpool(_match_hex, db, hex_color)
+
+
+def _match_hex(db: Session, hex_color: str) -> dict:
     # Parse input hex
     target_r, target_g, target_b = _hex_to_rgb(hex_color)
 
-    # Find closest shade by Euclidean RGB distance
-    shades = db.query(Shade).all()
-    best_match = None
-    best_distance = float("inf")
-
-    for shade in shades:
-        dist = math.sqrt(
-            (shade.rgb_r - target_r) ** 2 +
-            (shade.rgb_g - target_g) ** 2 +
-            (shade.rgb_b - target_b) ** 2
-        )
-        if dist < best_distance:
-            best_distance = dist
-            best_match = shade
-
-    if not best_match:
+    # Top matches by CIEDE2000 over the precomputed Lab index
+    shade_ids, delta_e = get_color_index(db).match_rgb([target_r, target_g, target_b], k=4)
+    if shade_ids.size == 0:
         return {"error": "No match found"}
 
-    product = db.query(Product).filter(Product.id == best_match.product_id).first()
+    matches = _describe_matches(db, shade_ids[0], delta_e[0])
 
     return {
         "detected_color": {"hex": hex_color, "rgb": {"r": target_r, "g": target_g, "b": target_b}},
-        "match": {
-            "shade_name": best_match.shade_name,
-            "shade_code": best_match.shade_code,
-            "hex_color": best_match.hex_color,
-            "shade_family": best_match.shade_family,
-            "product_name": product.name if product else "",
-            "confidence": round(max(0, 100 - best_distance / 4.41), 1),
-        },
-        "shade_id": best_match.id,
+        "match": matches[0],
+        "alternatives": matches[1:],
+        "shade_id": matches[0]["shade_id"],
+    }
+
+
+async def _snap_and_find_image(file: UploadFile, db: Session) -> dict:
+    # Read in chunks so oversized uploads are rejected without buffering them whole
+    chunks, size = [], 0
+    while chunk := await file.read(1024 * 1024):
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            return {"error": f"Image exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit"}
+        chunks.append(chunk)
+    return await run_in_threadpool(_match_image, db, b"".join(chunks))
+
+
+def _match_image(db: Session, data: bytes) -> dict:
+    try:
+        colors = extract_dominant_colors(data)
+    except Exception as e:
+        return {"error": f"Could not read image: {e}"}
+    if not colors:
+        return {"error": "No match found"}
+
+    # Match every dominant color in one batched lookup
+    shade_ids, delta_e = get_color_index(db).match_rgb([c["rgb"] for c in colors], k=1)
+    if shade_ids.size == 0:
+        return {"error": "No match found"}
+    matches = _describe_matches(db, shade_ids[:, 0], delta_e[:, 0])
+
+    dominant = [
+        {
+            "hex": "#{:02X}{:02X}{:02X}".format(*c["rgb"]),
+            "rgb": {"r": c["rgb"][0], "g": c["rgb"][1], "b": c["rgb"][2]},
+            "weight": round(c["weight"], 3),
+            "match": m,
+        }
+        for c, m in zip(colors, matches)
+    ]
+
+    return {
+        "detected_color": {"hex": dominant[0]["hex"], "rgb": dominant[0]["rgb"]},
+        "match": matches[0],
+        "dominant_colors": dominant,
+        "shade_id": matches[0]["shade_id"],
     }
 
 
-def _haversine(lat1, lon1, lat2, lon2):
-    R = 6371
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+def _describe_matches(db: Session, shade_ids, delta_e) -> list[dict]:
+    rows = {
+        shade.id: (shade, product)
+        for shade, product in db.query(Shade, Product).outerjoin(
+            Product, Product.id == Shade.product_id
+        ).filter(Shade.id.in_([int(i) for i in shade_ids]))
+    }
+    matches = []
+    for shade_id, de, confidence in zip(shade_ids, delta_e, match_confidence(delta_e)):
+        shade, product = rows[int(shade_id)]
+        matches.append({
+            "shade_id": shade.id,
+            "shade_name": shade.shade_name,
+            "shade_code": shade.shade_code,
+            "hex_color": shade.hex_color,
+            "shade_family": shade.shade_family,
+            "product_name": product.name if product else "",
+            "delta_e": round(float(de), 2),
+            "confidence": round(float(confidence), 1),
+        })
+    return matches
 
 
 def _hex_to_rgb(hex_color: str):
@@ -1,11 +1,17 @@
 from __future__ import annotations
-from fastapi import APIRouter, Depends
+import asyncio
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from app.database import get_db
 from app.services.dealer_service import (
-    get_dealer_dashboard, get_smart_orders, get_dealer_alerts,
+    get_dealer_dashboard, get_smart_order_set, accept_smart_order_bundle, get_dealer_alerts,
+    refresh_health_scores, get_order_history,
 )
+from app.services.alert_service import get_warehouse_alerts, public_alerts, subscribe, unsubscribe
+from app.sse import format_sse
 from app.models import Dealer, DealerOrder
 from datetime import datetime
 
@@ -17,14 +23,26 @@ class OrderCreate(BaseModel):
     quantity: int
 
 
+class BundleAccept(BaseModel):
+    recommendation_set_id: str
+
+
 @router.get("/{dealer_id}/dashboard")
 def dealer_dashboard(dealer_id: int, db: Session = Depends(get_db)):
     return get_dealer_dashboard(db, dealer_id)
 
 
+@router.post("/{dealer_id}/health-score/refresh")
+def refresh_health_score(dealer_id: int, db: Session = Depends(get_db)):
+    refreshed = refresh_health_scores(db, [dealer_id])
+    if not refreshed:
+        return {"error": "Dealer not found"}
+    return get_dealer_dashboard(db, dealer_id)
+
+
 @router.get("/{dealer_id}/smart-orders")
 def smart_orders(dealer_id: int, db: Session = Depends(get_db)):
-    return get_smart_orders(db, dealer_id)
+    return get_smart_order_set(db, dealer_id)
 
 
 @router.post("/{dealer_id}/orders")
@@ -41,61 +59,65 @@ def place_order(dealer_id: int, order: OrderCreate, db: Session = Depends(get_db
     )
     db.add(new_order)
     db.commit()
+    refresh_health_scores(db, [dealer_id])
     return {"success": True, "order_id": new_order.id, "status": "placed"}
 
 
 @router.post("/{dealer_id}/orders/bundle")
-def accept_bundle(dealer_id: int, db: Session = Depends(get_db)):
-    """Accept all AI-recommended orders at once."""
-    recs = get_smart_orders(db, dealer_id)
-    total_savings = 0
-    orders_placed = 0
-
-    for rec in recs:
-        if rec["urgency"] in ("CRITICAL", "RECOMMENDED"):
-            order = DealerOrder(
-                dealer_id=dealer_id,
-                sku_id=rec["sku_id"],
-                quantity=rec["recommended_qty"],
-                order_date=datetime.utcnow(),
-                status="placed",
-                is_ai_suggested=True,
-                order_source="ai_recommendation",
-                savings_amount=rec["savings_amount"],
-            )
-            db.add(order)
-            total_savings += rec["savings_amount"]
-            orders_placed += 1
-
-    db.commit()
-    return {
-        "success": True,
-        "orders_placed": orders_placed,
-        "total_savings": round(total_savings, 0),
-        "message": f"Bundle accepted! {orders_placed} orders placed. You saved ₹{total_savings:,.0f}!",
-    }
+def accept_bundle(dealer_id: int, bundle: BundleAccept, db: Session = Depends(get_db)):
+    """Accept all AI-recommended orders from a previously fetched recommendation set."""
+    return accept_smart_order_bundle(db, dealer_id, bundle.recommendation_set_id)
 
 
 @router.get("/{dealer_id}/orders")
-def order_history(dealer_id: int, db: Session = Depends(get_db)):
-    orders = db.query(DealerOrder).filter(
-        DealerOrder.dealer_id == dealer_id
-    ).order_by(DealerOrder.order_date.desc()).limit(50).all()
-
-    return [
-        {
-            "id": o.id,
-            "sku_id": o.sku_id,
-            "quantity": o.quantity,
-            "order_date": o.order_date.isoformat() if o.order_date else None,
-            "status": o.status,
-            "is_ai_suggested": o.is_ai_suggested,
-            "savings_amount": o.savings_amount,
-        }
-        for o in orders
-    ]
+def order_history(
+    dealer_id: int, cursor: str = None, limit: int = Query(50, ge=1, le=200),
+    status: str = None, source: str = None,
+    db: Session = Depends(get_db),
+):
+    return get_order_history(db, dealer_id, cursor=cursor, limit=limit, status=status, source=source)
 
 
 @router.get("/{dealer_id}/alerts")
 def dealer_alerts(dealer_id: int, db: Session = Depends(get_db)):
     return get_dealer_alerts(db, dealer_id)
+
+
+@router.get("/{dealer_id}/alerts/stream")
+async def dealer_alert_stream(dealer_id: int, request: Request, db: Session = Depends(get_db)):
+    """
+    Server-sent events: the current alerts on connect, then an `alerts` event
+    whenever the alerts at the dealer's warehouse change (inventory, transfers
+    in or out, or trending shades).
+    """
+    # Queries run off the event loop; pushes are computed by the publishing thread
+    found = await run_in_threadpool(_stream_snapshot, db, dealer_id)
+    if found is None:
+        return {"error": "Dealer not found"}
+
+    warehouse_id, initial = found
+    queue = subscribe(warehouse_id)
+
+    async def events():
+        try:
+            yield format_sse("snapshot", {"alerts": initial})
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            unsubscribe(warehouse_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _stream_snapshot(db: Session, dealer_id: int) -> tuple[int, dict] | None:
+    dealer = db.query(Dealer).filter(Dealer.id == dealer_id).first()
+    if not dealer:
+        return None
+    return dealer.warehouse_id, public_alerts(get_warehouse_alerts(db, dealer.warehouse_id))
@@ -1,18 +1,66 @@
 from __future__ import annotations
-from fastapi import APIRouter
-from app.simulations.scenarios import get_scenario_list, get_scenario_data
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+from app.config import MONTE_CARLO_MAX_PATHS
+from app.database import get_db
+from app.simulations.scenarios import (
+    get_scenario_list, get_scenario_data, get_scenario_definition,
+    run_custom_scenario, get_custom_scenario, CUSTOM_PREFIX,
+)
+from app.simulations.monte_carlo import get_inputs, run_monte_carlo, DEFAULT_HORIZON_DAYS
 
 router = APIRouter()
 
 
+class CustomScenario(BaseModel):
+    name: str = "Custom scenario"
+    affected_regions: list[str] = []  # empty: every region
+    affected_categories: list[str] = []  # empty: every category
+    inventory_multiplier: float = Field(1.0, ge=0, le=5)
+    demand_multiplier: float = Field(1.0, ge=0, le=10)
+    duration_days: int = Field(7, ge=1, le=365)
+
+
 @router.get("/scenarios")
 def list_scenarios():
     return get_scenario_list()
 
 
 @router.get("/scenario/{scenario_id}/data")
-def scenario_data(scenario_id: str):
-    data = get_scenario_data(scenario_id.upper())
+def scenario_data(scenario_id: str, db: Session = Depends(get_db)):
+    scenario_id = scenario_id.upper()
+    if scenario_id.startswith(CUSTOM_PREFIX):
+        data = get_custom_scenario(db, scenario_id)
+    else:
+        data = get_scenario_data(scenario_id)
     if not data:
         return {"error": "Scenario not found"}
     return data
+
+
+@router.post("/custom")
+def custom_scenario(body: CustomScenario, db: Session = Depends(get_db)):
+    result = run_custom_scenario(db, body.model_dump(exclude={"name"}))
+    if "error" in result:
+        return result
+    return {**result, "name": body.name}
+
+
+@router.get("/monte-carlo")
+def monte_carlo(
+    paths: int = Query(2000, ge=100, le=MONTE_CARLO_MAX_PATHS),
+    horizon: int = Query(DEFAULT_HORIZON_DAYS, ge=7, le=90),
+    seed: int = 42,
+    scenario_id: str | None = None,
+    db: Session = Depends(get_db),
+):
+    definition = None
+    if scenario_id and scenario_id.upper() != "NORMAL":
+        definition = get_scenario_definition(scenario_id.upper())
+        if definition is None:
+            return {"error": "Scenario not found"}
+    result = run_monte_carlo(get_inputs(db, horizon, definition), paths, seed)
+    if "error" in result:
+        return result
+    return {"scenario_id": (scenario_id or "NORMAL").upper(), **result}
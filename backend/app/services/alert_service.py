@@ -0,0 +1,231 @@
+from __future__ import annotations
+"""
+Dealer alert computation and push fan-out.
+Alerts are computed once per warehouse when its inventory, its transfers or
+the trending shades change, and pushed to every dealer of that warehouse
+subscribed over SSE.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, aliased, object_session
+from app.database import SessionLocal
+from app.sse import format_sse
+from app.models import InventoryLevel, InventoryTransfer, Warehouse, SKU, Shade
+from app.services.inventory_service import get_inventory_version, on_inventory_change
+
+STOCKOUT_THRESHOLD_DAYS = 7
+ACTIVE_TRANSFER_STATUSES = ["PENDING", "APPROVED", "IN_TRANSIT"]
+
+# {warehouse_id: (inventory_version, alerts)}
+_warehouse_alerts: dict = {}
+
+# {warehouse_id: set of (event_loop, queue)} for connected SSE clients
+_subscribers: dict = {}
+
+# Warehouses whose transfers or trending shades changed since their alerts were cached
+_stale: set = set()
+# Pushes for committed transfer/trending changes run here, off the committing request
+_publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="alert-publisher")
+
+
+def get_warehouse_alerts(db: Session, warehouse_id: int) -> dict:
+    """Stockout, transfer and trending alerts for a warehouse, cached per inventory version."""
+    version = get_inventory_version(warehouse_id)
+    cached = _warehouse_alerts.get(warehouse_id)
+    if cached and cached[0] == version and warehouse_id not in _stale:
+        return cached[1]
+
+    _stale.discard(warehouse_id)
+    alerts = _compute_warehouse_alerts(db, warehouse_id)
+    _warehouse_alerts[warehouse_id] = (version, alerts)
+    return alerts
+
+
+def public_alerts(alerts: dict) -> dict:
+    """Shape returned to dealers (top 5 stockouts, as the alerts endpoint always has)."""
+    return {
+        "stockout_alerts": alerts["stockout_alerts"][:5],
+        "trending": alerts["trending"],
+        "transfer_notifications": alerts["transfer_notifications"],
+    }
+
+
+def _compute_warehouse_alerts(db: Session, warehouse_id: int) -> dict:
+    # Stockout alerts, most urgent first
+    critical = db.query(InventoryLevel, SKU, Shade).join(
+        SKU, SKU.id == InventoryLevel.sku_id
+    ).join(
+        Shade, Shade.id == SKU.shade_id
+    ).filter(
+        InventoryLevel.warehouse_id == warehouse_id,
+        InventoryLevel.days_of_cover < STOCKOUT_THRESHOLD_DAYS,
+    ).order_by(InventoryLevel.days_of_cover.asc()).all()
+
+    stockout_alerts = [
+        {
+            "sku_id": sku.id,
+            "shade_name": shade.shade_name,
+            "shade_hex": shade.hex_color,
+            "days_remaining": round(level.days_of_cover, 1),
+            "current_stock": level.current_stock,
+        }
+        for level, sku, shade in critical
+    ]
+
+    # Active transfers into or out of this warehouse
+    from_wh = aliased(Warehouse)
+    to_wh = aliased(Warehouse)
+    transfers = db.query(InventoryTransfer, from_wh, to_wh, Shade).join(
+        from_wh, from_wh.id == InventoryTransfer.from_warehouse_id
+    ).join(
+        to_wh, to_wh.id == InventoryTransfer.to_warehouse_id
+    ).join(
+        SKU, SKU.id == InventoryTransfer.sku_id
+    ).join(
+        Shade, Shade.id == SKU.shade_id
+    ).filter(
+        (InventoryTransfer.from_warehouse_id == warehouse_id) |
+        (InventoryTransfer.to_warehouse_id == warehouse_id),
+        InventoryTransfer.status.in_(ACTIVE_TRANSFER_STATUSES),
+    ).all()
+
+    transfer_notifications = []
+    for t, src, dst, shade in transfers:
+        inbound = t.to_warehouse_id == warehouse_id
+        transfer_notifications.append({
+            "transfer_id": t.id,
+            "direction": "inbound" if inbound else "outbound",
+            "shade_name": shade.shade_name,
+            "shade_hex": shade.hex_color,
+            "quantity": t.quantity,
+            "status": t.status,
+            "counterpart_city": src.city if inbound else dst.city,
+        })
+
+    # Trending shades
+    trending = db.query(Shade).filter(Shade.is_trending == True).limit(5).all()
+
+    return {
+        "stockout_alerts": stockout_alerts,
+        "trending": [{"shade_name": s.shade_name, "shade_hex": s.hex_color} for s in trending],
+        "transfer_notifications": transfer_notifications,
+    }
+
+
+def _diff_alerts(old: dict | None, new: dict) -> dict:
+    """What changed between two alert sets, keyed the way dealers care about it."""
+    old = old or {"stockout_alerts": [], "trending": [], "transfer_notifications": []}
+
+    old_stockouts = {a["sku_id"] for a in old["stockout_alerts"]}
+    new_stockouts = {a["sku_id"] for a in new["stockout_alerts"]}
+    old_transfers = {(t["transfer_id"], t["status"]) for t in old["transfer_notifications"]}
+    old_trending = {t["shade_name"] for t in old["trending"]}
+
+    return {
+        "new_stockouts": [a for a in new["stockout_alerts"] if a["sku_id"] not in old_stockouts],
+        "resolved_stockouts": [a for a in old["stockout_alerts"] if a["sku_id"] not in new_stockouts],
+        "transfer_updates": [
+            t for t in new["transfer_notifications"]
+            if (t["transfer_id"], t["status"]) not in old_transfers
+        ],
+        "new_trending": [t for t in new["trending"] if t["shade_name"] not in old_trending],
+    }
+
+
+# --- Push channel ---
+
+def subscribe(warehouse_id: int) -> asyncio.Queue:
+    """Register an SSE client for a warehouse. Must be called from the event loop."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+    _subscribers.setdefault(warehouse_id, set()).add((asyncio.get_running_loop(), queue))
+    return queue
+
+
+def unsubscribe(warehouse_id: int, queue: asyncio.Queue) -> None:
+    subs = _subscribers.get(warehouse_id, set())
+    for sub in [s for s in subs if s[1] is queue]:
+        subs.discard(sub)
+    if not subs:
+        _subscribers.pop(warehouse_id, None)
+
+
+@on_inventory_change
+def _publish_alert_changes(db: Session, warehouse_ids: set[int]) -> None:
+    """Recompute alerts once per changed warehouse and fan the changes out."""
+    for wh_id in warehouse_ids:
+        subs = list(_subscribers.get(wh_id, ()))
+        if not subs:
+            continue  # polling callers pick up the new version lazily
+
+        cached = _warehouse_alerts.get(wh_id)
+
+        new = get_warehouse_alerts(db, wh_id)
+        changes = _diff_alerts(cached[1] if cached else None, new)
+        if not any(changes.values()):
+            continue
+
+        message = format_sse("alerts", {"alerts": public_alerts(new), "changes": changes})
+        for loop, queue in subs:
+            loop.call_soon_threadsafe(_offer, queue, message)
+
+
+def _publish_in_session(warehouse_ids: set[int]) -> None:
+    db = SessionLocal()
+    try:
+        _publish_alert_changes(db, warehouse_ids)
+    except Exception as e:
+        print(f"Warning: alert push failed: {e}")
+    finally:
+        db.close()
+
+
+def _offer(queue: asyncio.Queue, message: str) -> None:
+    # Drop events for clients that stopped reading rather than buffer without bound
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        pass
+
+
+# --- Transfer and trending changes ---
+# Not inventory changes, so nothing publishes them: flushes record the
+# warehouses they touch on the session, and commits push them.
+
+_PENDING = "alert_warehouses"
+_ALL_WAREHOUSES = 0  # trending shades appear in every warehouse's alerts
+
+
+def _mark_transfer(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING, set()).update({target.from_warehouse_id, target.to_warehouse_id})
+
+
+def _mark_trending(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and (target.is_trending or inspect(target).attrs.is_trending.history.deleted):
+        session.info.setdefault(_PENDING, set()).add(_ALL_WAREHOUSES)
+
+
+def _after_commit(session):
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    warehouse_ids = set(_warehouse_alerts) | set(_subscribers) if _ALL_WAREHOUSES in pending else pending
+    _stale.update(warehouse_ids)
+    subscribed = {wh_id for wh_id in warehouse_ids if wh_id in _subscribers}
+    if subscribed:
+        _publisher.submit(_publish_in_session, subscribed)
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING, None)
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(InventoryTransfer, _event, _mark_transfer)
+    event.listen(Shade, _event, _mark_trending)
+event.listen(Session, "after_commit", _after_commit)
+event.listen(Session, "after_rollback", _after_rollback)
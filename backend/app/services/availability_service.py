@@ -0,0 +1,207 @@
+from __future__ import annotations
+"""
+Shade availability near a customer.
+Stock for all warehouses in range is resolved in one query and cached per
+(shade, sizes) and warehouse until inventory at that warehouse changes.
+Dealer rows are held alongside the dealer spatial index, so a request only
+runs the nearest-dealer lookup for its exact location.
+Out-of-stock shades get in-stock substitutes from the colour neighbour table.
+"""
+
+import numpy as np
+from collections import OrderedDict
+from sqlalchemy.orm import Session
+from app.models import SKU, Shade, Product, Dealer, InventoryLevel
+from app.services.color_service import get_color_index, match_confidence
+from app.services.geo_service import get_dealer_index, get_dealer_warehouse_distances
+from app.services.inventory_service import get_inventory_version
+
+NEARBY_RADIUS_KM = 50
+MAX_RESULTS = 10
+MAX_SUBSTITUTES = 5
+
+CACHE_MAX_ENTRIES = 5000
+
+# {(shade_id, sizes): {warehouse_id: (inventory_version, {size: qty})}}
+_stock_cache: OrderedDict = OrderedDict()
+# Dealer rows by id, for the dealer index they were loaded with
+_dealers: dict = {}
+
+
+def get_shade_availability(
+    db: Session, shade_id: int, lat: float, lng: float, sizes: list[str],
+) -> list[dict]:
+    """Nearby dealers with stock status for each requested size of a shade."""
+    sizes = list(dict.fromkeys(sizes)) or ["4L"]
+    skus = db.query(SKU.id, SKU.size).filter(SKU.shade_id == shade_id, SKU.size.in_(sizes)).all()
+    if not skus:
+        return []
+
+    hits = get_dealer_index(db).nearest(lat, lng, k=MAX_RESULTS, max_radius_km=NEARBY_RADIUS_KM)
+    if not hits:
+        return []
+    dealers = _dealer_rows(db)
+
+    warehouse_ids = {dealers[dealer_id].warehouse_id for dealer_id, _ in hits}
+    stock = _warehouse_stock(db, shade_id, skus, warehouse_ids)
+
+    primary = next(size for size in sizes if any(s.size == size for s in skus))
+    distances = get_dealer_warehouse_distances(db)
+    results = []
+    for dealer_id, dist in hits:
+        dealer = dealers[dealer_id]
+        by_size = {
+            size: {"stock_qty": qty, "stock_status": _stock_status(qty)}
+            for size, qty in stock[dealer.warehouse_id].items()
+        }
+        results.append({
+            "dealer_id": dealer.id,
+            "dealer_name": dealer.name,
+            "city": dealer.city,
+            "distance_km": round(dist, 1),
+            "stock_status": by_size[primary]["stock_status"],
+            "stock_qty": by_size[primary]["stock_qty"],
+            "stock_by_size": by_size,
+            "lead_time_days": distances.lead_time(dealer.id, dealer.warehouse_id),
+            "latitude": dealer.latitude,
+            "longitude": dealer.longitude,
+        })
+
+    return results
+
+
+def get_shade_substitutes(
+    db: Session, shade_id: int, lat: float, lng: float, size: str = "4L", limit: int = MAX_SUBSTITUTES,
+) -> dict:
+    """
+    Closest in-stock alternatives to a shade at dealers near the customer.
+    Candidates come from the precomputed colour neighbour table; their stock at
+    every nearby warehouse is fetched in one query and evaluated as a matrix.
+    """
+    neighbour_ids, neighbour_de = get_color_index(db).neighbours(shade_id)
+    if neighbour_ids.size == 0:
+        return {"error": "Shade not found"}
+
+    hits = get_dealer_index(db).nearest(lat, lng, k=MAX_RESULTS, max_radius_km=NEARBY_RADIUS_KM)
+    result = {"shade_id": shade_id, "size": size, "in_stock_nearby": False, "substitutes": []}
+    if not hits:
+        return result
+    dealers = _dealer_rows(db)
+
+    # Row 0 is the requested shade, then its neighbours by increasing delta E
+    shade_ids = np.concatenate([[shade_id], neighbour_ids])
+    warehouse_ids = sorted({dealers[dealer_id].warehouse_id for dealer_id, _ in hits})
+    row = {int(sid): i for i, sid in enumerate(shade_ids)}
+    col = {wh_id: j for j, wh_id in enumerate(warehouse_ids)}
+
+    stock = np.zeros((len(shade_ids), len(warehouse_ids)), dtype=np.int64)
+    levels = db.query(SKU.shade_id, InventoryLevel.warehouse_id, InventoryLevel.current_stock).join(
+        InventoryLevel, InventoryLevel.sku_id == SKU.id
+    ).filter(
+        SKU.shade_id.in_([int(i) for i in shade_ids]),
+        SKU.size == size,
+        InventoryLevel.warehouse_id.in_(warehouse_ids),
+    ).all()
+    for level in levels:
+        stock[row[level.shade_id], col[level.warehouse_id]] = level.current_stock
+
+    # Shade x dealer stock, dealers ordered nearest first
+    dealer_stock = stock[:, [col[dealers[dealer_id].warehouse_id] for dealer_id, _ in hits]]
+    available = dealer_stock > 0
+    result["in_stock_nearby"] = bool(available[0].any())
+
+    candidates = np.nonzero(available[1:].any(axis=1))[0][:limit] + 1
+    if candidates.size == 0:
+        return result
+    nearest_dealer = available[candidates].argmax(axis=1)
+    total_stock = stock[candidates].sum(axis=1)
+
+    info = {
+        shade.id: (shade, product)
+        for shade, product in db.query(Shade, Product).outerjoin(
+            Product, Product.id == Shade.product_id
+        ).filter(Shade.id.in_([int(shade_ids[i]) for i in candidates]))
+    }
+    delta_e = neighbour_de[candidates - 1]
+    distances = get_dealer_warehouse_distances(db)
+    for i, pos, total, de, confidence in zip(
+        candidates, nearest_dealer, total_stock, delta_e, match_confidence(delta_e),
+    ):
+        shade, product = info[int(shade_ids[i])]
+        dealer_id, dist = hits[pos]
+        dealer = dealers[dealer_id]
+        qty = int(dealer_stock[i, pos])
+        result["substitutes"].append({
+            "shade_id": shade.id,
+            "shade_name": shade.shade_name,
+            "shade_code": shade.shade_code,
+            "hex_color": shade.hex_color,
+            "shade_family": shade.shade_family,
+            "product_name": product.name if product else "",
+            "delta_e": round(float(de), 2),
+            "confidence": round(float(confidence), 1),
+            "nearby_stock_qty": int(total),
+            "dealers_in_stock": int(available[i].sum()),
+            "nearest_dealer": {
+                "dealer_id": dealer.id,
+                "dealer_name": dealer.name,
+                "city": dealer.city,
+                "distance_km": round(dist, 1),
+                "stock_qty": qty,
+                "stock_status": _stock_status(qty),
+                "lead_time_days": distances.lead_time(dealer.id, dealer.warehouse_id),
+            },
+        })
+
+    return result
+
+
+def _dealer_rows(db: Session) -> dict:
+    # Reloaded whenever the dealer spatial index is rebuilt (dealers added or moved)
+    index = get_dealer_index(db)
+    if _dealers.get("index") is not index:
+        rows = db.query(
+            Dealer.id, Dealer.name, Dealer.city, Dealer.warehouse_id, Dealer.latitude, Dealer.longitude,
+        ).all()
+        _dealers["rows"] = {r.id: r for r in rows}
+        _dealers["index"] = index
+    return _dealers["rows"]
+
+
+def _warehouse_stock(
+    db: Session, shade_id: int, skus: list, warehouse_ids: set[int],
+) -> dict[int, dict[str, int]]:
+    """{warehouse_id: {size: qty}}, served from the cache where still current."""
+    key = (shade_id, tuple(sorted(s.size for s in skus)))
+    entry = _stock_cache.get(key, {})
+    versions = {wh_id: get_inventory_version(wh_id) for wh_id in warehouse_ids}
+    stale = {wh_id for wh_id in warehouse_ids if wh_id not in entry or entry[wh_id][0] != versions[wh_id]}
+
+    if stale:
+        size_by_sku = {s.id: s.size for s in skus}
+        fresh = {wh_id: {size: 0 for size in size_by_sku.values()} for wh_id in stale}
+        levels = db.query(
+            InventoryLevel.warehouse_id, InventoryLevel.sku_id, InventoryLevel.current_stock,
+        ).filter(
+            InventoryLevel.warehouse_id.in_(stale),
+            InventoryLevel.sku_id.in_(size_by_sku),
+        ).all()
+        for level in levels:
+            fresh[level.warehouse_id][size_by_sku[level.sku_id]] = level.current_stock
+
+        entry = {**entry, **{wh_id: (versions[wh_id], qty) for wh_id, qty in fresh.items()}}
+
+    _stock_cache[key] = entry
+    _stock_cache.move_to_end(key)
+    while len(_stock_cache) > CACHE_MAX_ENTRIES:
+        _stock_cache.popitem(last=False)
+
+    return {wh_id: entry[wh_id][1] for wh_id in warehouse_ids}
+
+
+def _stock_status(stock: int) -> str:
+    if stock > 50:
+        return "In Stock"
+    if stock > 0:
+        return "Low Stock"
+    return "Out of Stock"
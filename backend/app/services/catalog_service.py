@@ -0,0 +1,98 @@
+from __future__ import annotations
+"""
+Shade catalogue snapshots.
+The catalogue changes rarely but is fetched by every customer session, so
+each filter combination is serialized once per catalogue version and kept
+with a gzip copy and an ETag.
+"""
+
+import gzip
+import hashlib
+import json
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import Shade, Product
+
+CACHE_CONTROL = "public, max-age=300"
+
+# Bumped on any Shade/Product insert, update or delete
+_catalog_version: int = 0
+
+# {(family, category, trending): snapshot} for the current version only. Filters
+# are checked against the catalogue's own values, so keys stay bounded.
+_snapshots: dict = {}
+_snapshots_version: int = -1
+_known_filters: dict = {}
+_NO_MATCH = ("", "", None)
+
+
+def get_catalog_version() -> int:
+    return _catalog_version
+
+
+def get_catalog_snapshot(
+    db: Session, family: str | None = None, category: str | None = None, trending: bool | None = None,
+) -> dict:
+    """Serialized catalogue for the given filters: {"body", "gzip_body", "etag", "version"}."""
+    global _snapshots_version
+    if _snapshots_version != _catalog_version:
+        _snapshots.clear()
+        _known_filters.clear()
+        _snapshots_version = _catalog_version
+    if not _known_filters:
+        _known_filters["family"] = {f for (f,) in db.query(Shade.shade_family).distinct()}
+        _known_filters["category"] = {c for (c,) in db.query(Product.category).distinct()}
+
+    key = (family, category, trending)
+    if (family and family not in _known_filters["family"]) or \
+            (category and category not in _known_filters["category"]):
+        key = _NO_MATCH  # nothing can match; every unknown filter shares one empty snapshot
+    if key not in _snapshots:
+        shades = [] if key == _NO_MATCH else list_shades(db, family, category, trending)
+        body = json.dumps(shades, separators=(",", ":")).encode()
+        digest = hashlib.sha1(body).hexdigest()[:16]
+        _snapshots[key] = {
+            "body": body,
+            "gzip_body": gzip.compress(body, compresslevel=9),
+            "etag": f'W/"catalog-{_catalog_version}-{digest}"',
+            "version": _catalog_version,
+        }
+    return _snapshots[key]
+
+
+def list_shades(
+    db: Session, family: str | None = None, category: str | None = None, trending: bool | None = None,
+) -> list[dict]:
+    """Shades with their product details, filtered in the database."""
+    query = db.query(Shade, Product).outerjoin(Product, Product.id == Shade.product_id)
+    if family:
+        query = query.filter(Shade.shade_family == family)
+    if category:
+        query = query.filter(Product.category == category)
+    if trending is not None:
+        query = query.filter(Shade.is_trending == trending)
+
+    return [
+        {
+            "id": s.id,
+            "shade_code": s.shade_code,
+            "shade_name": s.shade_name,
+            "hex_color": s.hex_color,
+            "shade_family": s.shade_family,
+            "is_trending": s.is_trending,
+            "product_name": product.name if product else "",
+            "product_category": product.category if product else "",
+            "finish": product.finish if product else "",
+        }
+        for s, product in query.order_by(Shade.id).all()
+    ]
+
+
+def _bump_version(mapper, connection, target):
+    global _catalog_version
+    _catalog_version += 1
+
+
+for _model in (Shade, Product):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _bump_version)
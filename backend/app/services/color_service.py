@@ -0,0 +1,296 @@
+from __future__ import annotations
+"""
+Perceptual shade matching.
+Shade colours are precomputed into CIELAB; nearest candidates come from a
+KD-tree (or a vectorized scan when SciPy is unavailable) and are re-ranked
+by CIEDE2000. All functions accept batches of query colours.
+Also extracts dominant colours from uploaded photos for snap-and-find.
+"""
+
+import io
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Shade
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # optional: brute-force Lab scan is used instead
+    cKDTree = None
+
+# sRGB (D65) -> XYZ
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_D65_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+# Candidates fetched per requested match before CIEDE2000 re-ranking
+_CANDIDATE_FACTOR = 4
+_MIN_CANDIDATES = 16
+
+# Perceptual neighbours kept per shade for substitute lookups
+NEIGHBOUR_COUNT = 24
+
+
+def rgb_to_lab(rgb) -> np.ndarray:
+    """Convert sRGB values (0-255, shape (..., 3)) to CIELAB."""
+    c = np.asarray(rgb, dtype=float) / 255.0
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ _RGB_TO_XYZ.T / _D65_WHITE
+
+    delta = 6 / 29
+    f = np.where(xyz > delta ** 3, np.cbrt(xyz), xyz / (3 * delta ** 2) + 4 / 29)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+def ciede2000(lab1, lab2) -> np.ndarray:
+    """CIEDE2000 colour difference between broadcastable arrays of Lab colours."""
+    lab1 = np.asarray(lab1, dtype=float)
+    lab2 = np.asarray(lab2, dtype=float)
+    L1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    L2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    c_bar = (np.hypot(a1, b1) + np.hypot(a2, b2)) / 2
+    g = 0.5 * (1 - np.sqrt(c_bar ** 7 / (c_bar ** 7 + 25.0 ** 7)))
+    a1p, a2p = (1 + g) * a1, (1 + g) * a2
+    c1p, c2p = np.hypot(a1p, b1), np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+    chroma_zero = (c1p * c2p) == 0
+
+    dl = L2 - L1
+    dc = c2p - c1p
+    dh = h2p - h1p
+    dh = np.where(dh > 180, dh - 360, np.where(dh < -180, dh + 360, dh))
+    dh = np.where(chroma_zero, 0, dh)
+    dH = 2 * np.sqrt(c1p * c2p) * np.sin(np.radians(dh / 2))
+
+    l_bar = (L1 + L2) / 2
+    cp_bar = (c1p + c2p) / 2
+    h_sum = h1p + h2p
+    h_bar = np.where(
+        np.abs(h1p - h2p) <= 180, h_sum / 2,
+        np.where(h_sum < 360, (h_sum + 360) / 2, (h_sum - 360) / 2),
+    )
+    h_bar = np.where(chroma_zero, h_sum, h_bar)
+
+    t = (1 - 0.17 * np.cos(np.radians(h_bar - 30)) + 0.24 * np.cos(np.radians(2 * h_bar))
+         + 0.32 * np.cos(np.radians(3 * h_bar + 6)) - 0.20 * np.cos(np.radians(4 * h_bar - 63)))
+    d_theta = 30 * np.exp(-(((h_bar - 275) / 25) ** 2))
+    r_c = 2 * np.sqrt(cp_bar ** 7 / (cp_bar ** 7 + 25.0 ** 7))
+    s_l = 1 + 0.015 * (l_bar - 50) ** 2 / np.sqrt(20 + (l_bar - 50) ** 2)
+    s_c = 1 + 0.045 * cp_bar
+    s_h = 1 + 0.015 * cp_bar * t
+    r_t = -np.sin(np.radians(2 * d_theta)) * r_c
+
+    return np.sqrt(
+        (dl / s_l) ** 2 + (dc / s_c) ** 2 + (dH / s_h) ** 2
+        + r_t * (dc / s_c) * (dH / s_h)
+    )
+
+
+class ShadeColorIndex:
+    """Lab coordinates for every shade with nearest-neighbour lookup."""
+
+    def __init__(self, shade_ids, rgb):
+        self.shade_ids = np.asarray(shade_ids, dtype=np.int64)
+        self.lab = rgb_to_lab(np.asarray(rgb, dtype=float).reshape(-1, 3))
+        self.tree = cKDTree(self.lab) if cKDTree is not None and len(self.lab) else None
+        self.position = {int(sid): pos for pos, sid in enumerate(self.shade_ids)}
+        self._neighbours: tuple[np.ndarray, np.ndarray] | None = None
+
+    def __len__(self) -> int:
+        return len(self.shade_ids)
+
+    def match_lab(self, lab, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k shades for each query Lab colour (shape (n, 3)).
+        Returns (shade_ids, delta_e) arrays of shape (n, k), best first.
+        """
+        lab = np.atleast_2d(np.asarray(lab, dtype=float))
+        k = min(k, len(self))
+        if k == 0:
+            return np.empty((len(lab), 0), dtype=np.int64), np.empty((len(lab), 0))
+
+        # Euclidean Lab (CIE76) candidates, then CIEDE2000 re-ranking
+        n_cand = min(len(self), max(k * _CANDIDATE_FACTOR, _MIN_CANDIDATES))
+        if self.tree is not None:
+            _, cand = self.tree.query(lab, k=n_cand)
+            cand = np.asarray(cand).reshape(len(lab), n_cand)
+        else:
+            d2 = ((lab[:, None, :] - self.lab[None, :, :]) ** 2).sum(axis=-1)
+            cand = np.argpartition(d2, n_cand - 1, axis=1)[:, :n_cand]
+
+        delta_e = ciede2000(lab[:, None, :], self.lab[cand])
+        order = np.argsort(delta_e, axis=1)[:, :k]
+        best = np.take_along_axis(cand, order, axis=1)
+        return self.shade_ids[best], np.take_along_axis(delta_e, order, axis=1)
+
+    def match_rgb(self, rgb, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """Same as match_lab for sRGB query colours (0-255, shape (n, 3))."""
+        return self.match_lab(rgb_to_lab(np.atleast_2d(rgb)), k)
+
+    def neighbour_table(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (shade_ids, delta_e) arrays of shape (n_shades, NEIGHBOUR_COUNT): each
+        shade's closest other shades by CIEDE2000, built once per index.
+        """
+        if self._neighbours is None:
+            k = min(NEIGHBOUR_COUNT + 1, len(self))
+            ids, delta_e = self.match_lab(self.lab, k)
+            # Drop each shade itself (not always column 0 when colours are duplicated)
+            keep = ids != self.shade_ids[:, None]
+            rows = [(i[m][:k - 1], d[m][:k - 1]) for i, d, m in zip(ids, delta_e, keep)]
+            if rows:
+                self._neighbours = (np.stack([r[0] for r in rows]), np.stack([r[1] for r in rows]))
+            else:
+                self._neighbours = (np.empty((0, 0), dtype=np.int64), np.empty((0, 0)))
+        return self._neighbours
+
+    def neighbours(self, shade_id: int) -> tuple[np.ndarray, np.ndarray]:
+        """Closest other shades to shade_id, best first (empty if unknown)."""
+        pos = self.position.get(int(shade_id))
+        if pos is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        ids, delta_e = self.neighbour_table()
+        return ids[pos], delta_e[pos]
+
+
+# --- Dominant colour extraction from photos ---
+
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+# JPEGs are decoded at a reduced scale, so they may be larger than formats
+# that must be decoded in full (16 MP is at most 64 MB at 4 bytes per pixel)
+MAX_DECODE_PIXELS = 50_000_000
+MAX_FULL_DECODE_PIXELS = 16_000_000
+ANALYSIS_SIZE = 256
+
+
+def extract_dominant_colors(image_bytes: bytes, n_colors: int = 5, seed: int = 0) -> list[dict]:
+    """
+    Dominant colours of an image as [{"rgb": (r, g, b), "weight": share}], largest first.
+    JPEGs are decoded at a reduced scale (draft mode); other formats are decoded
+    in full once, in their own mode, and are limited to MAX_FULL_DECODE_PIXELS.
+    The image is shrunk before conversion to RGB, so only the small copy is converted.
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        limit = MAX_DECODE_PIXELS if img.format == "JPEG" else MAX_FULL_DECODE_PIXELS
+        if img.width * img.height > limit:
+            raise ValueError(f"Image too large ({img.width}x{img.height})")
+        img.draft("RGB", (ANALYSIS_SIZE, ANALYSIS_SIZE))
+        try:
+            img.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.Resampling.BILINEAR)
+        except ValueError:
+            # Modes Pillow can't resample (e.g. 16-bit) are converted first
+            img = img.convert("RGB")
+            img.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.Resampling.BILINEAR)
+        pixels = np.asarray(img.convert("RGB"), dtype=np.uint8).reshape(-1, 3)
+
+    # Collapse pixels into a 32-level-per-channel histogram before clustering
+    q = pixels >> 3
+    bins = (q[:, 0].astype(np.int32) << 10) | (q[:, 1].astype(np.int32) << 5) | q[:, 2]
+    counts = np.bincount(bins, minlength=1 << 15)
+    occupied = np.nonzero(counts)[0]
+    weights = counts[occupied].astype(float)
+    mean_rgb = np.stack([
+        np.bincount(bins, weights=pixels[:, c], minlength=1 << 15)[occupied] for c in range(3)
+    ], axis=1) / weights[:, None]
+
+    centers, center_weights = _weighted_kmeans(rgb_to_lab(mean_rgb), weights, n_colors, seed)
+    centers_rgb = _lab_to_rgb(centers)
+
+    order = np.argsort(-center_weights)
+    total = center_weights.sum()
+    return [
+        {"rgb": tuple(int(v) for v in centers_rgb[i]), "weight": float(center_weights[i] / total)}
+        for i in order
+        if center_weights[i] > 0
+    ]
+
+
+def _weighted_kmeans(points: np.ndarray, weights: np.ndarray, k: int, seed: int, iterations: int = 12):
+    """Weighted k-means with k-means++ seeding; returns (centers, total weight per center)."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(points))
+
+    centers = [points[rng.choice(len(points), p=weights / weights.sum())]]
+    for _ in range(1, k):
+        d2 = ((points[:, None, :] - np.asarray(centers)[None]) ** 2).sum(-1).min(1) * weights
+        if d2.sum() == 0:
+            break
+        centers.append(points[rng.choice(len(points), p=d2 / d2.sum())])
+    centers = np.asarray(centers)
+
+    for _ in range(iterations):
+        labels = ((points[:, None, :] - centers[None]) ** 2).sum(-1).argmin(1)
+        cluster_w = np.bincount(labels, weights=weights, minlength=len(centers))
+        sums = np.stack([np.bincount(labels, weights=weights * points[:, c], minlength=len(centers))
+                         for c in range(3)], axis=1)
+        moved = np.where(cluster_w[:, None] > 0, sums / np.maximum(cluster_w, 1e-9)[:, None], centers)
+        if np.allclose(moved, centers, atol=0.05):
+            centers = moved
+            break
+        centers = moved
+
+    labels = ((points[:, None, :] - centers[None]) ** 2).sum(-1).argmin(1)
+    return centers, np.bincount(labels, weights=weights, minlength=len(centers))
+
+
+def _lab_to_rgb(lab) -> np.ndarray:
+    lab = np.asarray(lab, dtype=float)
+    fy = (lab[..., 0] + 16) / 116
+    f = np.stack([fy + lab[..., 1] / 500, fy, fy - lab[..., 2] / 200], axis=-1)
+    delta = 6 / 29
+    xyz = np.where(f > delta, f ** 3, 3 * delta ** 2 * (f - 4 / 29)) * _D65_WHITE
+    linear = np.clip(xyz @ np.linalg.inv(_RGB_TO_XYZ).T, 0, 1)
+    srgb = np.where(linear <= 0.0031308, linear * 12.92, 1.055 * linear ** (1 / 2.4) - 0.055)
+    return np.clip(np.round(srgb * 255), 0, 255).astype(int)
+
+
+def match_confidence(delta_e) -> np.ndarray:
+    """Map CIEDE2000 distance to a 0-100 score (identical colour = 100)."""
+    return np.clip(100 - np.asarray(delta_e, dtype=float), 0, 100)
+
+
+# --- Process-wide index, rebuilt lazily after shade changes ---
+
+_index: ShadeColorIndex | None = None
+_dirty = True
+
+
+def get_color_index(db: Session) -> ShadeColorIndex:
+    global _index, _dirty
+    if _dirty or _index is None:
+        rows = db.query(Shade.id, Shade.rgb_r, Shade.rgb_g, Shade.rgb_b).all()
+        _index = ShadeColorIndex([r.id for r in rows], [(r.rgb_r, r.rgb_g, r.rgb_b) for r in rows])
+        _dirty = False
+    return _index
+
+
+def build_color_index():
+    """Build the shade colour index at startup."""
+    db = SessionLocal()
+    try:
+        index = get_color_index(db)
+        index.neighbour_table()
+        print(f"  Colour index: {len(index)} shades ({'KD-tree' if index.tree is not None else 'vectorized scan'}).")
+    finally:
+        db.close()
+
+
+def _mark_dirty(mapper, connection, target):
+    global _dirty
+    _dirty = True
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(Shade, _event, _mark_dirty)
@@ -0,0 +1,169 @@
+from __future__ import annotations
+"""
+Model backends for the copilot.
+Each backend turns (system instruction, conversation) into the copilot's JSON
+reply, either whole (`generate`) or as raw text chunks (`stream`). The
+conversation is a user message or a list of {"role": "user"|"model", "parts": [text]}
+turns, so tool calls and their results can be fed back to the model.
+`gemini` calls Google Gemini; `standin` is a local stand-in with configurable
+latency, error rate and streaming, for load-testing the copilot path.
+"""
+
+import json
+import random
+import asyncio
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Union
+
+import google.generativeai as genai
+
+from app.config import (
+    GEMINI_API_KEY, COPILOT_MODEL, COPILOT_BACKEND,
+    COPILOT_STANDIN_LATENCY_MS, COPILOT_STANDIN_LATENCY_SIGMA, COPILOT_STANDIN_ERROR_RATE,
+    COPILOT_STANDIN_CHUNK_CHARS, COPILOT_STANDIN_CHUNK_DELAY_MS, COPILOT_STANDIN_TOOL_CALL_RATE,
+)
+
+Contents = Union[str, list[dict]]
+
+
+class GeminiBackend:
+    """Google Gemini through the async API; configured once per process."""
+
+    name = "gemini"
+    _MAX_CACHED_MODELS = 16
+
+    def __init__(self, api_key: str = GEMINI_API_KEY, model_name: str = COPILOT_MODEL):
+        self.api_key = api_key
+        self.model_name = model_name
+        self._configured = False
+        self._models: "OrderedDict[str, Any]" = OrderedDict()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def start(self) -> None:
+        if self.available and not self._configured:
+            genai.configure(api_key=self.api_key)
+            self._configured = True
+
+    def _get_model(self, system_instruction: str):
+        # Models differ only by system prompt (scenario + snapshot); reuse them per prompt
+        self.start()
+        model = self._models.get(system_instruction)
+        if model is None:
+            model = genai.GenerativeModel(
+                model_name=self.model_name,
+                generation_config={"response_mime_type": "application/json", "temperature": 0.4},
+                system_instruction=system_instruction,
+            )
+            self._models[system_instruction] = model
+            while len(self._models) > self._MAX_CACHED_MODELS:
+                self._models.popitem(last=False)
+        else:
+            self._models.move_to_end(system_instruction)
+        return model
+
+    async def generate(self, system_instruction: str, contents: Contents) -> str:
+        response = await self._get_model(system_instruction).generate_content_async(contents)
+        return response.text
+
+    async def stream(self, system_instruction: str, contents: Contents) -> AsyncIterator[str]:
+        response = await self._get_model(system_instruction).generate_content_async(contents, stream=True)
+        async for chunk in response:
+            try:
+                yield chunk.text
+            except ValueError:
+                continue  # chunk without text parts (e.g. the final finish-reason chunk)
+
+
+class StandInError(RuntimeError):
+    pass
+
+
+class StandInBackend:
+    """
+    Local stand-in for the model: schema-valid answers after a log-normal
+    delay (median latency_ms), failing with probability error_rate, and
+    streamed in chunk_chars pieces every chunk_delay_ms. A tool_call_rate
+    share of questions first asks for a tool before answering.
+    """
+
+    name = "standin"
+    available = True
+
+    _ANSWERS = [
+        {
+            "text": "Pune is short on Bridal Red ahead of the wedding season while Mumbai holds excess. "
+                    "Moving 500 units from Mumbai covers the gap.",
+            "ui_widget": {"type": "TRANSFER_CARD", "props": {
+                "from": "Mumbai", "to": "Pune", "sku": "Bridal Red", "qty": 500, "eta": "2 days", "savings": "₹15,000",
+            }},
+        },
+        {
+            "text": "Three warehouses have SKUs under three days of cover. Prioritise the critical ones "
+                    "before the weekend demand peak.",
+            "ui_widget": {"type": "INSIGHT_CARD", "props": {"title": "Stockout risk", "value": "3 warehouses"}},
+        },
+        {
+            "text": "Inventory looks balanced for the current scenario. No transfers are needed right now.",
+            "ui_widget": None,
+        },
+    ]
+
+    def __init__(
+        self,
+        latency_ms: float = COPILOT_STANDIN_LATENCY_MS,
+        latency_sigma: float = COPILOT_STANDIN_LATENCY_SIGMA,
+        error_rate: float = COPILOT_STANDIN_ERROR_RATE,
+        chunk_chars: int = COPILOT_STANDIN_CHUNK_CHARS,
+        chunk_delay_ms: float = COPILOT_STANDIN_CHUNK_DELAY_MS,
+        tool_call_rate: float = COPILOT_STANDIN_TOOL_CALL_RATE,
+        seed: int | None = None,
+    ):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.chunk_chars = max(1, chunk_chars)
+        self.chunk_delay_ms = chunk_delay_ms
+        self.tool_call_rate = tool_call_rate
+        self._rng = random.Random(seed)
+
+    def start(self) -> None:
+        pass
+
+    _TOOL_CALL = {"tool_call": {"name": "warehouse_stock", "args": {"sku": "Bridal Red"}}}
+
+    def _answer(self, contents: Contents) -> str:
+        if isinstance(contents, str):
+            contents = [{"role": "user", "parts": [contents]}]
+        message = contents[0]["parts"][0]
+        # Only the opening turn may ask for a tool; after a tool result, answer
+        if len(contents) == 1 and self._rng.random() < self.tool_call_rate:
+            return json.dumps(self._TOOL_CALL)
+        return json.dumps(self._ANSWERS[sum(map(ord, message)) % len(self._ANSWERS)], ensure_ascii=False)
+
+    async def _first_byte(self) -> None:
+        await asyncio.sleep(self.latency_ms * self._rng.lognormvariate(0, self.latency_sigma) / 1000)
+        if self._rng.random() < self.error_rate:
+            raise StandInError("stand-in model error")
+
+    async def generate(self, system_instruction: str, contents: Contents) -> str:
+        await self._first_byte()
+        return self._answer(contents)
+
+    async def stream(self, system_instruction: str, contents: Contents) -> AsyncIterator[str]:
+        await self._first_byte()
+        answer = self._answer(contents)
+        for i in range(0, len(answer), self.chunk_chars):
+            if i:
+                await asyncio.sleep(self.chunk_delay_ms / 1000)
+            yield answer[i:i + self.chunk_chars]
+
+
+def create_backend(name: str = COPILOT_BACKEND):
+    if name == "standin":
+        return StandInBackend()
+    if name == "gemini":
+        return GeminiBackend()
+    raise ValueError(f"Unknown copilot backend: {name}")
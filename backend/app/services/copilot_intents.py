@@ -0,0 +1,221 @@
+from __future__ import annotations
+"""
+Fast-path intent router for common copilot questions.
+Cheap keyword/regex rules recognise stockouts (optionally by city or shade),
+dead stock, pending transfers and a shade's demand forecast, and answer them
+straight from the inventory, alert and forecast services - no model call.
+"""
+
+import re
+from sqlalchemy.orm import Session
+from app.models import Warehouse, Region, Shade, SKU
+from app.services.alert_service import get_warehouse_alerts, STOCKOUT_THRESHOLD_DAYS
+from app.services.catalog_service import get_catalog_version
+from app.services.forecast_service import get_forecasts
+from app.services.geo_service import get_warehouse_index
+from app.services.inventory_service import get_dead_stock, get_recommended_transfers
+
+FORECAST_HORIZON_DAYS = 30
+MAX_LISTED = 5
+
+_TRANSFER_RE = re.compile(r"\btransfers?\b|\bin[- ]transit\b|\bshipments?\b")
+_DEAD_STOCK_RE = re.compile(r"\bdead[- ]?stock\b|\boverstock(ed)?\b|\bexcess\b|\bslow[- ]moving\b|\bcapital (locked|stuck)\b")
+# Stockout phrasing only: a bare "low" or "critical" is too often part of an open question
+_STOCKOUT_RE = re.compile(
+    r"\bstock(ing)?[- ]?outs?\b|\bout of stock\b|\brunning (out|low)\b|\bshortages?\b"
+    r"|\blow[- ](on )?stock\b|\bcritical(ly low)? stock\b"
+)
+_FORECAST_RE = re.compile(r"\bforecasts?\b|\bdemand\b|\bpredict(ed|ion)?\b|\bproject(ed|ion)\b|\bhow (much|many) will\b")
+# Open-ended questions are left to the model
+_OPEN_ENDED_RE = re.compile(r"\b(why|should|what if|explain|plan|strategy)\b")
+
+
+def route_intent(db: Session, message: str) -> dict | None:
+    """Answer the message from services if it matches a known intent, else None."""
+    msg = message.lower()
+    if _OPEN_ENDED_RE.search(msg):
+        return None
+
+    city = _match_city(db, msg)
+    shade = _match_shade(db, msg)
+
+    if _FORECAST_RE.search(msg) and shade:
+        return _forecast_answer(db, shade, msg, city)
+    if _TRANSFER_RE.search(msg):
+        return _transfers_answer(db, city)
+    if _DEAD_STOCK_RE.search(msg):
+        return _dead_stock_answer(db, city)
+    if _STOCKOUT_RE.search(msg):
+        return _stockouts_answer(db, city, shade)
+    return None
+
+
+# --- Entity matching ---
+
+_entities: dict = {}
+
+
+def _warehouses(db: Session) -> list:
+    # Plain rows, refreshed whenever the warehouse spatial index is rebuilt
+    index = get_warehouse_index(db)
+    if _entities.get("warehouse_index") is not index:
+        _entities["warehouses"] = db.query(Warehouse.id, Warehouse.city, Warehouse.region_id).all()
+        _entities["warehouse_index"] = index
+    return _entities["warehouses"]
+
+
+def _match_city(db: Session, msg: str):
+    return next((w for w in _warehouses(db) if re.search(rf"\b{re.escape(w.city.lower())}\b", msg)), None)
+
+
+def _match_shade(db: Session, msg: str) -> tuple[int, str] | None:
+    """(shade_id, name) for the longest shade name or shade code mentioned."""
+    version = get_catalog_version()
+    if _entities.get("shades_version") != version:
+        rows = db.query(Shade.id, Shade.shade_name, Shade.shade_code).all()
+        names = sorted(
+            [(r.shade_name.lower(), r.id, r.shade_name) for r in rows]
+            + [(r.shade_code.lower(), r.id, r.shade_name) for r in rows],
+            key=lambda s: -len(s[0]),
+        )
+        # Whole words only, so "Bridal Redwood" is not read as "Bridal Red"
+        _entities["shades"] = [(re.compile(rf"\b{re.escape(key)}\b"), sid, name) for key, sid, name in names]
+        _entities["shades_version"] = version
+    return next(((sid, name) for pattern, sid, name in _entities["shades"] if pattern.search(msg)), None)
+
+
+# --- Answers ---
+
+def _stockouts_answer(db: Session, city, shade: tuple[int, str] | None) -> dict:
+    # One row per (warehouse, shade): most urgent size and total units across sizes
+    grouped: dict = {}
+    for wh in [city] if city else _warehouses(db):
+        for alert in get_warehouse_alerts(db, wh.id)["stockout_alerts"]:
+            if shade is not None and alert["shade_name"] != shade[1]:
+                continue
+            row = grouped.setdefault((wh.id, alert["shade_name"]), {
+                "city": wh.city, "shade_name": alert["shade_name"], "days": alert["days_remaining"], "units": 0,
+            })
+            row["days"] = min(row["days"], alert["days_remaining"])
+            row["units"] += alert["current_stock"]
+    rows = sorted(grouped.values(), key=lambda r: r["days"])
+
+    where = f"in {city.city}" if city else "across the network"
+    subject = f"{shade[1]} " if shade else ""
+    if not rows:
+        return _answer(f"No {subject}stock is below {STOCKOUT_THRESHOLD_DAYS} days of cover {where}.", None)
+
+    listed = "; ".join(
+        f"{r['shade_name']} in {r['city']} ({r['days']} days, {r['units']} units)" for r in rows[:MAX_LISTED]
+    )
+    cities = len({r["city"] for r in rows})
+    return _answer(
+        f"{_count(len(rows), subject + 'stock position')} {'is' if len(rows) == 1 else 'are'} "
+        f"below {STOCKOUT_THRESHOLD_DAYS} days of cover {where}"
+        + (f" ({cities} warehouses)" if not city and cities > 1 else "")
+        + f". Most urgent: {listed}.",
+        {"type": "INSIGHT_CARD", "props": {
+            "title": f"Stockout risk {where}",
+            "items": [
+                {"shade": r["shade_name"], "location": r["city"], "days_left": r["days"]}
+                for r in rows[:MAX_LISTED]
+            ],
+        }},
+    )
+
+
+def _dead_stock_answer(db: Session, city) -> dict:
+    rows = [r for r in get_dead_stock(db) if city is None or r["warehouse_city"] == city.city]
+    where = f"in {city.city}" if city else "across the network"
+    if not rows:
+        return _answer(f"No SKUs have more than 90 days of cover {where}.", None)
+
+    locked = sum(r["capital_locked"] for r in rows)
+    listed = "; ".join(
+        f"{r['shade_name']} {r['size']} in {r['warehouse_city']} ({r['days_of_cover']:.0f} days)"
+        for r in rows[:MAX_LISTED]
+    )
+    return _answer(
+        f"{_count(len(rows), 'SKU position')} {where} {'is' if len(rows) == 1 else 'are'} dead stock (over 90 days of cover), "
+        f"locking ₹{locked:,.0f} of capital. Largest: {listed}.",
+        {"type": "INSIGHT_CARD", "props": {
+            "title": f"Dead stock {where} (days of cover)",
+            "items": [
+                {"shade": r["shade_name"], "location": r["warehouse_city"], "days_left": round(r["days_of_cover"])}
+                for r in rows[:MAX_LISTED]
+            ],
+        }},
+    )
+
+
+def _transfers_answer(db: Session, city) -> dict:
+    # Transfers whose warehouse no longer exists can't be routed; leave them out
+    transfers = [
+        t for t in get_recommended_transfers(db)
+        if t["from_warehouse"] and t["to_warehouse"]
+        and (city is None or city.id in (t["from_warehouse"]["id"], t["to_warehouse"]["id"]))
+    ]
+    where = f" involving {city.city}" if city else ""
+    if not transfers:
+        return _answer(f"There are no pending or in-transit transfers{where}.", None)
+
+    pending = [t for t in transfers if t["status"] == "PENDING"]
+    moving = len(transfers) - len(pending)
+    listed = "; ".join(
+        f"{t['quantity']} × {t['shade_name']} {t['from_warehouse']['city']} → {t['to_warehouse']['city']} ({t['status'].lower()})"
+        for t in transfers[:MAX_LISTED]
+    )
+    widget = None
+    if pending:
+        t = pending[0]
+        widget = {"type": "TRANSFER_CARD", "props": {
+            "from": t["from_warehouse"]["city"], "to": t["to_warehouse"]["city"],
+            "sku": t["shade_name"], "qty": t["quantity"], "eta": f"{t['lead_time_days']} days",
+        }}
+    return _answer(
+        f"{_count(len(pending), 'transfer')}{where} awaiting approval and {moving} approved or in transit: {listed}.",
+        widget,
+    )
+
+
+def _forecast_answer(db: Session, shade: tuple[int, str], msg: str, city) -> dict:
+    shade_id, shade_name = shade
+    sku = db.query(SKU).filter(SKU.shade_id == shade_id, SKU.size == "4L").first() \
+        or db.query(SKU).filter(SKU.shade_id == shade_id).first()
+    if sku is None:
+        return _answer(f"{shade_name} has no SKUs to forecast.", None)
+
+    regions = db.query(Region).all()
+    if city:
+        regions = [r for r in regions if r.id == city.region_id]
+    else:
+        named = [r for r in regions if re.search(rf"\b{r.name.lower()}\b", msg)]
+        regions = named or regions
+
+    forecasts = get_forecasts([(sku.id, r.id) for r in regions], FORECAST_HORIZON_DAYS)
+    totals = {
+        r.name: sum(e["predicted"] for e in forecasts[(sku.id, r.id)])
+        for r in regions
+    }
+    total = sum(totals.values())
+    where = f"the {regions[0].name} region" if len(regions) == 1 else "all regions"
+    breakdown = ", ".join(f"{name} {qty:,.0f}" for name, qty in sorted(totals.items(), key=lambda kv: -kv[1]))
+    return _answer(
+        f"Forecast demand for {shade_name} ({sku.size}, {sku.sku_code}) over the next {FORECAST_HORIZON_DAYS} days "
+        f"in {where}: {total:,.0f} units" + (f" ({breakdown})." if len(regions) > 1 else "."),
+        {"type": "INSIGHT_CARD", "props": {
+            "title": f"{shade_name} {FORECAST_HORIZON_DAYS}-day forecast",
+            "items": [
+                {"shade": shade_name, "location": name, "value": f"{qty:,.0f} units"}
+                for name, qty in sorted(totals.items(), key=lambda kv: -kv[1])
+            ],
+        }},
+    )
+
+
+def _count(n: int, noun: str) -> str:
+    return f"{n} {noun}{'' if n == 1 else 's'}"
+
+
+def _answer(text: str, widget: dict | None) -> dict:
+    return {"text": text, "ui_widget": widget}
@@ -1,14 +1,26 @@
 from __future__ import annotations
+import re
 import json
 import asyncio
 import logging
-from typing import Optional, Dict, Any
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Optional, Dict, Any, AsyncIterator
+from sqlalchemy.orm import Session
 
-# --- CHANGED: Use the Stable SDK ---
-import google.generativeai as genai
-# -----------------------------------
-
-from app.config import GEMINI_API_KEY, COPILOT_TIMEOUT, APP_SIMULATION_DATE
+from app.config import (
+    COPILOT_TIMEOUT, COPILOT_MAX_CONCURRENCY,
+    COPILOT_CACHE_TTL, COPILOT_CACHE_MAX_ENTRIES, APP_SIMULATION_DATE,
+    COPILOT_PROMPT_BUDGET_CHARS, COPILOT_MAX_TOOL_ROUNDS, COPILOT_TOOL_TIMEOUT,
+)
+from app.database import SessionLocal
+from app.services.copilot_backends import create_backend
+from app.services.copilot_intents import route_intent
+from app.services.copilot_tools import TOOLS, describe_tools, run_tool
+from starlette.concurrency import run_in_threadpool
+from app.services.inventory_service import get_warehouse_map_data, get_network_inventory_version
 
 # Configure structured logging
 logger = logging.getLogger(__name__)
@@ -36,60 +48,531 @@ OUTPUT FORMAT (JSON ONLY):
 }}
 """
 
-async def get_chat_response(message: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+# Appended when the model may query data tools (a database session is available)
+TOOLS_PROMPT = f"""
+DATA TOOLS:
+The snapshot below only summarises the network. For exact stock, transfer
+options or forecasts, call ONE tool by replying with ONLY:
+{{"tool_call": {{"name": "<tool>", "args": {{...}}}}}}
+The tool result is sent back to you; then call another tool or give the final
+answer in the output format above. At most {COPILOT_MAX_TOOL_ROUNDS} tool calls per question.
+
+{describe_tools()}
+"""
+
+# --- 2. INVENTORY SNAPSHOT (rebuilt only when inventory changes) ---
+_snapshot: Optional[Dict[str, Any]] = None
+_snapshot_lock = threading.Lock()
+
+
+def get_inventory_snapshot(db: Session) -> Dict[str, Any]:
+    """
+    Text summary of critical and overstocked warehouses for the prompt:
+    {"version": network inventory version, "text": ...}. Concurrent chats
+    share one build per inventory version.
+    """
+    global _snapshot
+    version = get_network_inventory_version()
+    if _snapshot is not None and _snapshot["version"] == version:
+        return _snapshot
+
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot["version"] != version:
+            _snapshot = {"version": version, "text": _format_snapshot(get_warehouse_map_data(db))}
+    return _snapshot
+
+
+def _format_snapshot(map_data: list[dict], budget: int = COPILOT_PROMPT_BUDGET_CHARS) -> str:
     """
-    Orchestrator function: Decides whether to use Real AI or Heuristic Fallback.
+    Worst warehouses first, cut off at `budget` characters; anything left out
+    is counted so the model knows to use the tools for it.
+    """
+    critical = sorted(
+        (w for w in map_data if w.get("status") == "critical"), key=lambda w: -w.get("revenue_at_risk", 0)
+    )
+    overstocked = sorted(
+        (w for w in map_data if w.get("status") == "overstocked"), key=lambda w: -w.get("overstock_skus", 0)
+    )
+    if not critical and not overstocked:
+        return "✅ All warehouses are currently healthy. No critical issues."
+
+    sections = [
+        # Format Critical Alerts clearly for the AI
+        ("⚠️ CRITICAL ALERTS (High Priority):", [
+            f"- {w.get('city', 'Unknown')} ({w.get('code', 'N/A')}): {w.get('critical_skus', 0)} SKUs at risk. "
+            f"Revenue impact: ₹{w.get('revenue_at_risk', 0):,.0f}"
+            for w in critical
+        ]),
+        # Format Overstock Alerts
+        ("📦 OVERSTOCK ALERTS:", [
+            f"- {w.get('city', 'Unknown')} ({w.get('code', 'N/A')}): {w.get('overstock_skus', 0)} excess SKUs."
+            for w in overstocked
+        ]),
+    ]
+
+    snapshot_lines = []
+    used, omitted = 0, 0
+    limit = budget - 80  # room for the omission note
+    for header, lines in sections:
+        if not lines:
+            continue
+        snapshot_lines.append(header)
+        used += len(header) + 1
+        for line in lines:
+            if used + len(line) + 1 > limit:
+                omitted += 1
+                continue
+            snapshot_lines.append(line)
+            used += len(line) + 1
+
+    if omitted:
+        snapshot_lines.append(f"...and {omitted} more warehouse alerts not listed (use the data tools).")
+    return "\n".join(snapshot_lines)
+
+
+# --- 3. MODEL BACKEND (created once, shared by all chats) ---
+_backend = create_backend()
+_call_slots: Optional[asyncio.Semaphore] = None  # created lazily inside the event loop
+_in_flight = 0
+
+
+def init_copilot_client() -> None:
+    """Start the configured model backend once at startup."""
+    if _backend.available:
+        _backend.start()
+        print(f"  Copilot backend: {_backend.name} (max {COPILOT_MAX_CONCURRENCY} concurrent calls).")
+
+
+# --- 4. LATENCY METRICS ---
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2000, 3000, 5000, 10000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (milliseconds)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect_left(self.buckets, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"<={b}ms" for b in self.buckets] + [f">{self.buckets[-1]}ms"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 1) if self.count else None,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+# Outcomes: intent (answered by the fast-path router), success (model answered),
+# timeout, fallback (model error or backend unavailable)
+_latency = {outcome: LatencyHistogram() for outcome in ("intent", "success", "timeout", "fallback")}
+_tool_latency = {name: LatencyHistogram() for name in TOOLS}
+
+
+def get_copilot_metrics() -> Dict[str, Any]:
+    return {
+        "backend": _backend.name,
+        "max_concurrency": COPILOT_MAX_CONCURRENCY,
+        "in_flight": _in_flight,
+        "latency": {outcome: h.snapshot() for outcome, h in _latency.items()},
+        "tools": {name: h.snapshot() for name, h in _tool_latency.items()},
+        "response_cache": _response_cache.stats(),
+    }
+
+
+# --- 5. RESPONSE CACHE (same question, scenario and inventory snapshot) ---
+class ResponseCache:
+    """LRU cache of model responses with a time-to-live per entry."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: tuple, response: Dict[str, Any]) -> None:
+        self._entries[key] = (time.monotonic(), response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+_response_cache = ResponseCache(COPILOT_CACHE_MAX_ENTRIES, COPILOT_CACHE_TTL)
+
+
+def _cache_key(message: str, context: Dict[str, Any], scenario_id: str) -> tuple:
+    # Case, spacing and trailing punctuation don't change the question
+    normalized = " ".join(message.lower().split()).rstrip("?!. ")
+    return normalized, scenario_id, context.get("snapshot_version")
+
+
+# --- 6. ORCHESTRATION ---
+async def get_chat_response(
+    message: str, context: Optional[Dict[str, Any]] = None, db: Optional[Session] = None,
+) -> Dict[str, Any]:
+    """
+    Orchestrator function: answers common questions from the services directly,
+    otherwise decides whether to use Real AI or Heuristic Fallback.
+    Responses carry a `source`: intent, model, cache or fallback.
     """
     context = context or {}
     scenario_id = context.get("scenario_id", "NORMAL")
+    started = time.perf_counter()
 
-    if not GEMINI_API_KEY:
-        return _heuristic_response(message, scenario_id)
+    routed = await _route_intent(db, message, started)
+    if routed is not None:
+        return routed
+
+    if not _backend.available:
+        _latency["fallback"].observe((time.perf_counter() - started) * 1000)
+        return _fallback_response(message, scenario_id)
+
+    key = _cache_key(message, context, scenario_id)
+    cached = _response_cache.get(key)
+    if cached is not None:
+        return {**cached, "source": "cache"}
 
     try:
-        # Run Gemini logic with a timeout safety net
-        return await asyncio.wait_for(
-            _call_gemini_api(message, context, scenario_id),
-            timeout=COPILOT_TIMEOUT
-        )
-    except (asyncio.TimeoutError, Exception) as e:
-        logger.error(f"Gemini API Error: {e}")
-        return _heuristic_response(message, scenario_id)
+        response, parsed = await _call_model(message, context, scenario_id, tools=db is not None)
+        _latency["success"].observe((time.perf_counter() - started) * 1000)
+        # Only model answers are cached; fallbacks retry the model next time
+        _cache_response(key, response, parsed)
+        return {**response, "source": "model"}
+    except asyncio.TimeoutError:
+        logger.error(f"Copilot model ({_backend.name}) call or tool timed out")
+        _latency["timeout"].observe((time.perf_counter() - started) * 1000)
+    except Exception as e:
+        logger.error(f"Copilot model ({_backend.name}) error: {e}")
+        _latency["fallback"].observe((time.perf_counter() - started) * 1000)
+    return _fallback_response(message, scenario_id)
 
 
-async def _call_gemini_api(user_message: str, context: Dict[str, Any], scenario_id: str) -> Dict[str, Any]:
+async def _call_model(
+    user_message: str, context: Dict[str, Any], scenario_id: str, tools: bool = False,
+) -> tuple[Dict[str, Any], bool]:
     """
-    Constructs the prompt and calls Google Gemini (Stable Version).
+    Constructs the prompt and calls the model backend asynchronously. Tool
+    calls requested by the model are run and their results sent back until
+    it answers, returned with whether the answer was valid JSON. The whole
+    exchange (slot waits, model calls and tools) gets COPILOT_TIMEOUT, and
+    no tool more than COPILOT_TOOL_TIMEOUT of it.
     """
-    # --- CONFIGURE STABLE CLIENT ---
-    genai.configure(api_key=GEMINI_API_KEY)
-    
-    # Use the stable model name that always works
-    model = genai.GenerativeModel(
-        model_name="gemini-2.5-flash", 
-        generation_config={"response_mime_type": "application/json", "temperature": 0.4},
-        system_instruction=f"""
+    deadline = time.monotonic() + COPILOT_TIMEOUT
+    system_instruction = _system_instruction(context, scenario_id, tools=tools)
+    contents = [{"role": "user", "parts": [user_message]}]
+    tool_calls = []
+    for round_no in range(COPILOT_MAX_TOOL_ROUNDS + 1):
+        raw = await asyncio.wait_for(_generate(system_instruction, contents), _remaining(deadline))
+        response, parsed = _parse_response(raw)
+        call = _tool_call(response, tools, round_no)
+        if call is None:
+            break
+        contents += await asyncio.wait_for(_run_tool_call(call, raw, tool_calls), _tool_budget(deadline))
+
+    return ({**response, "tool_calls": tool_calls} if tool_calls else response), parsed
+
+
+async def _generate(system_instruction: str, contents: list[dict]) -> str:
+    global _in_flight
+    # Call slots are held per model call, not while tools run
+    async with _get_call_slots():
+        _in_flight += 1
+        try:
+            return await _backend.generate(system_instruction, contents)
+        finally:
+            _in_flight -= 1
+
+
+def _tool_call(response: Dict[str, Any], tools: bool, round_no: int) -> Optional[Dict[str, Any]]:
+    """The tool call requested by a model reply, or None for a final answer."""
+    call = response.get("tool_call")
+    if not isinstance(call, dict):
+        return None
+    if not tools:
+        raise ValueError("model requested a tool but no tools are available")
+    if round_no >= COPILOT_MAX_TOOL_ROUNDS:
+        raise ValueError(f"model requested more than {COPILOT_MAX_TOOL_ROUNDS} tool calls")
+    return call
+
+
+async def _run_tool_call(call: Dict[str, Any], raw: str, tool_calls: list) -> list[dict]:
+    """Runs a requested tool; returns the conversation turns to send back to the model."""
+    name = str(call.get("name"))
+    args = call.get("args") if isinstance(call.get("args"), dict) else {}
+    result, ms = await run_in_threadpool(_run_tool_in_session, name, args)
+    if name in _tool_latency:
+        _tool_latency[name].observe(ms)
+    tool_calls.append({"name": name, "args": args, "ms": round(ms, 1)})
+    return [
+        {"role": "model", "parts": [raw]},
+        {"role": "user", "parts": [f"TOOL RESULT ({name}): {result}"]},
+    ]
+
+
+def _run_tool_in_session(name: str, args: Dict[str, Any]) -> tuple[str, float]:
+    # Own session: a timed-out tool keeps running in its thread after the
+    # request (and its session) is gone
+    db = SessionLocal()
+    try:
+        return run_tool(db, name, args)
+    finally:
+        db.close()
+
+
+async def _route_intent(db: Optional[Session], message: str, started: float) -> Optional[Dict[str, Any]]:
+    if db is None:
+        return None
+    try:
+        answer = await run_in_threadpool(route_intent, db, message)
+    except Exception as e:
+        logger.error(f"Copilot intent routing failed: {e}")
+        return None
+    if answer is None:
+        return None
+    _latency["intent"].observe((time.perf_counter() - started) * 1000)
+    return {**answer, "source": "intent"}
+
+
+def _fallback_response(message: str, scenario_id: str) -> Dict[str, Any]:
+    return {**_heuristic_response(message, scenario_id), "source": "fallback"}
+
+
+def _system_instruction(context: Dict[str, Any], scenario_id: str, tools: bool = False) -> str:
+    return f"""
         {BASE_SYSTEM_PROMPT}
+        {TOOLS_PROMPT if tools else ""}
 
         CURRENT SIMULATION SCENARIO: {scenario_id}
 
         REAL-TIME INVENTORY SNAPSHOT:
         {context.get("inventory_snapshot", "No current inventory data available.")}
         """
-    )
 
-    # --- CALL API ---
-    response = model.generate_content(user_message)
 
+def _get_call_slots() -> asyncio.Semaphore:
+    global _call_slots
+    if _call_slots is None:
+        _call_slots = asyncio.Semaphore(COPILOT_MAX_CONCURRENCY)
+    return _call_slots
+
+
+def _parse_response(raw: str) -> tuple[Dict[str, Any], bool]:
     # --- PARSE RESPONSE ---
     try:
-        return json.loads(response.text)
+        return json.loads(raw), True
     except Exception:
         # Fallback parsing if JSON mode glitches
         return {
-            "text": response.text, 
+            "text": raw,
             "ui_widget": None
-        }
+        }, False
+
+
+def _cache_response(key: tuple, response: Dict[str, Any], parsed: bool) -> None:
+    # A glitched (non-JSON) answer, or one given without a current inventory
+    # snapshot (snapshot_version None), is served once but never cached
+    if parsed and key[2] is not None:
+        _response_cache.put(key, response)
+
+
+# --- 7. STREAMING ---
+async def stream_chat_response(
+    message: str, context: Optional[Dict[str, Any]] = None, db: Optional[Session] = None,
+) -> AsyncIterator[tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of get_chat_response, yielding (event, data):
+    `token` {"text": delta} while the model writes its answer, then
+    `ui_widget` and finally `done` with the complete response. Timeouts and
+    errors end the stream with the heuristic fallback in `done`, whose text
+    replaces any partial tokens already sent. Tool-call rounds send no
+    tokens; the answer streams once the model has the data it asked for.
+    """
+    context = context or {}
+    scenario_id = context.get("scenario_id", "NORMAL")
+    started = time.perf_counter()
+
+    routed = await _route_intent(db, message, started)
+    if routed is not None:
+        for event in _complete_events(routed):
+            yield event
+        return
+
+    if not _backend.available:
+        _latency["fallback"].observe((time.perf_counter() - started) * 1000)
+        for event in _complete_events(_fallback_response(message, scenario_id)):
+            yield event
+        return
+
+    key = _cache_key(message, context, scenario_id)
+    cached = _response_cache.get(key)
+    if cached is not None:
+        for event in _complete_events({**cached, "source": "cache"}):
+            yield event
+        return
+
+    system_instruction = _system_instruction(context, scenario_id, tools=db is not None)
+    contents = [{"role": "user", "parts": [message]}]
+    tool_calls = []
+    # One budget for the whole exchange, tool rounds included
+    deadline = time.monotonic() + COPILOT_TIMEOUT
+    try:
+        for round_no in range(COPILOT_MAX_TOOL_ROUNDS + 1):
+            text_stream = _TextFieldStream()
+            raw = []
+            async for chunk in _stream_model(system_instruction, contents, deadline):
+                raw.append(chunk)
+                delta = text_stream.feed(chunk)
+                if delta:
+                    yield "token", {"text": delta}
+            response, parsed = _parse_response("".join(raw))
+            call = _tool_call(response, db is not None, round_no)
+            if call is None:
+                break
+            contents += await asyncio.wait_for(
+                _run_tool_call(call, "".join(raw), tool_calls), _tool_budget(deadline)
+            )
+        if tool_calls:
+            response = {**response, "tool_calls": tool_calls}
+        _latency["success"].observe((time.perf_counter() - started) * 1000)
+        _cache_response(key, response, parsed)
+        response = {**response, "source": "model"}
+    except asyncio.TimeoutError:
+        logger.error(f"Copilot model ({_backend.name}) stream call or tool timed out")
+        _latency["timeout"].observe((time.perf_counter() - started) * 1000)
+        response = _fallback_response(message, scenario_id)
+    except Exception as e:
+        logger.error(f"Copilot model ({_backend.name}) error: {e}")
+        _latency["fallback"].observe((time.perf_counter() - started) * 1000)
+        response = _fallback_response(message, scenario_id)
+
+    yield "ui_widget", {"ui_widget": response.get("ui_widget")}
+    yield "done", response
+
+
+def _complete_events(response: Dict[str, Any]) -> list[tuple[str, Dict[str, Any]]]:
+    """Events for an answer that is already complete (intent, cache hit or fallback)."""
+    return [
+        ("token", {"text": response.get("text", "")}),
+        ("ui_widget", {"ui_widget": response.get("ui_widget")}),
+        ("done", response),
+    ]
+
+
+async def _stream_model(system_instruction: str, contents: list[dict], deadline: float) -> AsyncIterator[str]:
+    """Raw response text chunks; every wait is bounded by the exchange's deadline."""
+    global _in_flight
+    slots = _get_call_slots()
+
+    await asyncio.wait_for(slots.acquire(), _remaining(deadline))
+    _in_flight += 1
+    chunks = _backend.stream(system_instruction, contents)
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), _remaining(deadline))
+            except StopAsyncIteration:
+                break
+            yield chunk
+    finally:
+        await chunks.aclose()
+        _in_flight -= 1
+        slots.release()
+
+
+def _remaining(deadline: float) -> float:
+    return max(0.0, deadline - time.monotonic())
+
+
+def _tool_budget(deadline: float) -> float:
+    return min(COPILOT_TOOL_TIMEOUT, _remaining(deadline))
+
+
+class _TextFieldStream:
+    """Decodes the top-level "text" value of a JSON answer as it streams in."""
+
+    _START = re.compile(r'"text"\s*:\s*"')
+
+    def __init__(self):
+        self.buffer = ""
+        self.start: Optional[int] = None
+        self.emitted = 0
+        self.closed = False
+
+    def feed(self, chunk: str) -> str:
+        """Append a chunk; returns newly decoded text, if any."""
+        if self.closed:
+            return ""
+        self.buffer += chunk
+        if self.start is None:
+            match = self._START.search(self.buffer)
+            if not match:
+                return ""
+            self.start = match.end()
+
+        raw = self.buffer[self.start:]
+        i = 0
+        while i < len(raw):
+            if raw[i] == "\\":
+                i += 2
+            elif raw[i] == '"':
+                raw = raw[:i]
+                self.closed = True
+                break
+            else:
+                i += 1
+
+        text = self._decode(raw)
+        if text is None:
+            return ""
+        # Hold back half of a surrogate pair until its partner arrives
+        if text and "\ud800" <= text[-1] <= "\udbff":
+            text = text[:-1]
+        delta = text[self.emitted:]
+        self.emitted = len(text)
+        return delta
+
+    @staticmethod
+    def _decode(raw: str) -> Optional[str]:
+        try:
+            return json.loads(f'"{raw}"', strict=False)
+        except ValueError:
+            pass
+        # An escape sequence may be cut off at the end of the chunk
+        cut = raw.rfind("\\")
+        if cut < 0:
+            return None
+        try:
+            return json.loads(f'"{raw[:cut]}"', strict=False)
+        except ValueError:
+            return None
 
 
 def _heuristic_response(message: str, scenario_id: str) -> Dict[str, Any]:
@@ -0,0 +1,187 @@
+from __future__ import annotations
+"""
+Narrow data tools the copilot model can call instead of receiving the whole
+network in its prompt. Each tool runs a targeted query against the existing
+services; results are size-capped so tool output stays within the prompt budget.
+"""
+
+import json
+import time
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.config import COPILOT_TOOL_RESULT_BUDGET_CHARS
+from app.models import InventoryLevel, SKU, Shade, Warehouse, Region
+from app.services.forecast_service import get_forecasts
+from app.services.geo_service import get_warehouse_distances
+
+# Days of cover a source warehouse keeps before it can give stock away
+TRANSFER_KEEP_DAYS = 30
+FORECAST_HORIZON_DAYS = 30
+
+
+def _find_skus(db: Session, sku: str):
+    """SKUs matching a SKU code, shade code or shade name (4L first)."""
+    needle = sku.strip().lower()
+    query = db.query(SKU, Shade).join(Shade, Shade.id == SKU.shade_id)
+    rows = query.filter(func.lower(SKU.sku_code) == needle).all()
+    if not rows:
+        rows = query.filter(
+            (func.lower(Shade.shade_code) == needle) | (func.lower(Shade.shade_name) == needle)
+        ).all()
+    return sorted(rows, key=lambda r: r[0].size != "4L")
+
+
+def warehouse_stock(db: Session, sku: str, city: str | None = None) -> dict:
+    rows = _find_skus(db, sku)
+    if not rows:
+        return {"error": f"Unknown SKU or shade: {sku}"}
+    sku_row, shade = rows[0]
+
+    levels = db.query(InventoryLevel, Warehouse).join(
+        Warehouse, Warehouse.id == InventoryLevel.warehouse_id
+    ).filter(InventoryLevel.sku_id == sku_row.id)
+    if city:
+        levels = levels.filter(func.lower(Warehouse.city) == city.strip().lower())
+
+    return {
+        "sku_code": sku_row.sku_code,
+        "shade_name": shade.shade_name,
+        "size": sku_row.size,
+        "warehouses": [
+            {
+                "city": wh.city,
+                "stock": level.current_stock,
+                "days_of_cover": round(level.days_of_cover, 1),
+                "reorder_point": level.reorder_point,
+            }
+            for level, wh in sorted(levels.all(), key=lambda r: r[0].days_of_cover)
+        ],
+    }
+
+
+def transfer_candidates(db: Session, sku: str, to_city: str) -> dict:
+    rows = _find_skus(db, sku)
+    if not rows:
+        return {"error": f"Unknown SKU or shade: {sku}"}
+    sku_row, shade = rows[0]
+    dest = db.query(Warehouse).filter(func.lower(Warehouse.city) == to_city.strip().lower()).first()
+    if not dest:
+        return {"error": f"Unknown warehouse city: {to_city}"}
+
+    distances = get_warehouse_distances(db)
+    candidates = []
+    for level, wh in db.query(InventoryLevel, Warehouse).join(
+        Warehouse, Warehouse.id == InventoryLevel.warehouse_id
+    ).filter(InventoryLevel.sku_id == sku_row.id, Warehouse.id != dest.id):
+        daily_demand = level.current_stock / max(level.days_of_cover, 0.1)
+        spare = int(level.current_stock - daily_demand * TRANSFER_KEEP_DAYS)
+        if spare > 0:
+            candidates.append({
+                "from_city": wh.city,
+                "spare_units": spare,
+                "days_of_cover": round(level.days_of_cover, 1),
+                "distance_km": round(distances.distance(wh.id, dest.id)),
+                "lead_time_days": distances.lead_time(wh.id, dest.id),
+            })
+
+    return {
+        "sku_code": sku_row.sku_code,
+        "shade_name": shade.shade_name,
+        "to_city": dest.city,
+        "candidates": sorted(candidates, key=lambda c: (c["lead_time_days"], -c["spare_units"])),
+    }
+
+
+def sku_forecast(db: Session, sku: str, region: str | None = None) -> dict:
+    rows = _find_skus(db, sku)
+    if not rows:
+        return {"error": f"Unknown SKU or shade: {sku}"}
+    sku_row, shade = rows[0]
+
+    regions = db.query(Region).all()
+    if region:
+        regions = [r for r in regions if r.name.lower() == region.strip().lower()]
+        if not regions:
+            return {"error": f"Unknown region: {region}"}
+
+    forecasts = get_forecasts([(sku_row.id, r.id) for r in regions], FORECAST_HORIZON_DAYS)
+    result = []
+    for r in regions:
+        daily = [e["predicted"] for e in forecasts[(sku_row.id, r.id)]]
+        result.append({
+            "region": r.name,
+            "total_units": round(sum(daily)),
+            "weekly_units": [round(sum(daily[i:i + 7])) for i in range(0, len(daily), 7)],
+        })
+    return {
+        "sku_code": sku_row.sku_code,
+        "shade_name": shade.shade_name,
+        "horizon_days": FORECAST_HORIZON_DAYS,
+        "regions": result,
+    }
+
+
+# name -> (function, description, {arg: description}, required args)
+TOOLS = {
+    "warehouse_stock": (
+        warehouse_stock,
+        "Stock, days of cover and reorder point of one SKU at every warehouse (or one city).",
+        {"sku": "SKU code, shade code or shade name", "city": "optional warehouse city"},
+        ["sku"],
+    ),
+    "transfer_candidates": (
+        transfer_candidates,
+        "Warehouses that can spare stock of a SKU for a destination city, nearest first, with lead times.",
+        {"sku": "SKU code, shade code or shade name", "to_city": "destination warehouse city"},
+        ["sku", "to_city"],
+    ),
+    "sku_forecast": (
+        sku_forecast,
+        f"{FORECAST_HORIZON_DAYS}-day demand forecast for a SKU by region (total and weekly units).",
+        {"sku": "SKU code, shade code or shade name", "region": "optional: North, South, East, West or Central"},
+        ["sku"],
+    ),
+}
+
+
+def describe_tools() -> str:
+    """Tool list for the system prompt."""
+    lines = []
+    for name, (_, description, params, required) in TOOLS.items():
+        args = ", ".join(f"{p}{'' if p in required else '?'}: {d}" for p, d in params.items())
+        lines.append(f"- {name}({args}): {description}")
+    return "\n".join(lines)
+
+
+def run_tool(db: Session, name: str, args: dict) -> tuple[str, float]:
+    """Execute a tool call; returns (result JSON capped to the budget, elapsed ms)."""
+    started = time.perf_counter()
+    tool = TOOLS.get(name)
+    if tool is None:
+        result = {"error": f"Unknown tool: {name}"}
+    else:
+        fn, _, params, required = tool
+        # Every tool argument is text; null means "not given"
+        args = {k: v for k, v in (args or {}).items() if k in params and v is not None}
+        invalid = [k for k, v in args.items() if not isinstance(v, str)]
+        missing = [p for p in required if not args.get(p)]
+        if invalid:
+            result = {"error": f"Arguments must be strings: {', '.join(invalid)}"}
+        elif missing:
+            result = {"error": f"Missing arguments: {', '.join(missing)}"}
+        else:
+            result = fn(db, **args)
+    return _fit(result), (time.perf_counter() - started) * 1000
+
+
+def _fit(result: dict) -> str:
+    """JSON for a tool result, dropping trailing list rows until it fits the budget."""
+    text = json.dumps(result, ensure_ascii=False)
+    lists = [k for k, v in result.items() if isinstance(v, list)]
+    while len(text) > COPILOT_TOOL_RESULT_BUDGET_CHARS and lists:
+        key = max(lists, key=lambda k: len(result[k]))
+        if not result[key]:
+            break
+        result = {**result, key: result[key][:-1], "truncated": True}
+        text = json.dumps(result, ensure_ascii=False)
+    return text[:COPILOT_TOOL_RESULT_BUDGET_CHARS]
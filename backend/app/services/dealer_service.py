@@ -5,12 +5,29 @@ Smart order recommendations with cost savings calculation.
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.models import Dealer, DealerOrder, InventoryLevel, SKU, Shade, Warehouse
-from app.services.forecast_service import get_forecast
+from app.database import SessionLocal
+from sqlalchemy import func, insert, case, and_, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from app.models import (
+    Dealer, DealerOrder, DealerBundleAcceptance, DealerHealthScore,
+    InventoryLevel, SKU, Shade, Product, Warehouse,
+)
+from app.services.forecast_service import get_forecasts, get_forecast_version
+from app.services.inventory_service import get_inventory_version, on_inventory_change
+from app.services.alert_service import get_warehouse_alerts, public_alerts
 from app.config import APP_SIMULATION_DATE
-from datetime import date, timedelta
-import numpy as np
+from datetime import date, datetime, timedelta
+import base64
+import hashlib
+import json
+
+# Smart-order recommendation sets per dealer: {dealer_id: (cache_key, set_id, recommendations)}
+_smart_order_cache: dict = {}
+
+# Health scores upserted per statement (7 bound parameters each; SQLite caps
+# the variables in one statement)
+HEALTH_SCORE_UPSERT_ROWS = 500
 
 
 def get_dealer_dashboard(db: Session, dealer_id: int) -> dict:
@@ -41,8 +58,11 @@ def get_dealer_dashboard(db: Session, dealer_id: int) -> dict:
         DealerOrder.is_ai_suggested == True,
     ).scalar() or 0
 
-    # Compute health score
-    health_score = _compute_health_score(db, dealer)
+    # Precomputed health score (scored on demand if the batch job hasn't covered this dealer yet)
+    score = db.query(DealerHealthScore).filter(DealerHealthScore.dealer_id == dealer_id).first()
+    if not score:
+        refresh_health_scores(db, [dealer_id])
+        score = db.query(DealerHealthScore).filter(DealerHealthScore.dealer_id == dealer_id).first()
 
     return {
         "dealer": {
@@ -51,7 +71,8 @@ def get_dealer_dashboard(db: Session, dealer_id: int) -> dict:
             "city": dealer.city,
             "tier": dealer.tier,
         },
-        "health_score": health_score,
+        "health_score": score.health_score,
+        "health_score_updated_at": score.computed_at.isoformat() if score.computed_at else None,
         "total_orders": total_orders,
         "ai_recommendations_pending": ai_recs,
         "revenue_this_month": round(revenue, 0),
@@ -60,74 +81,256 @@ def get_dealer_dashboard(db: Session, dealer_id: int) -> dict:
     }
 
 
-def _compute_health_score(db: Session, dealer: Dealer) -> float:
+def refresh_health_scores(db: Session, dealer_ids: list[int] | None = None) -> int:
+    """
+    Batch health scoring job. Computes scores for all dealers (or the given ones)
+    from one grouped query per source table and upserts them with a timestamp.
+    Coverage stats are computed once per warehouse and shared by its dealers.
+    Also run for a single dealer whenever it places orders, and for a
+    warehouse's dealers whenever its inventory changes.
+    """
+    dealer_query = db.query(Dealer.id, Dealer.warehouse_id)
+    if dealer_ids is not None:
+        dealer_query = dealer_query.filter(Dealer.id.in_(dealer_ids))
+    dealers = dealer_query.all()
+    if not dealers:
+        return 0
+
+    # Stock coverage per warehouse
+    warehouse_ids = {d.warehouse_id for d in dealers}
+    coverage = {
+        row.warehouse_id: row
+        for row in db.query(
+            InventoryLevel.warehouse_id,
+            func.avg(InventoryLevel.days_of_cover).label("avg_cover"),
+            func.sum(case((InventoryLevel.days_of_cover < 3, 1), else_=0)).label("stockout_count"),
+        ).filter(
+            InventoryLevel.warehouse_id.in_(warehouse_ids)
+        ).group_by(InventoryLevel.warehouse_id).all()
+    }
+
+    # Order fulfillment and product breadth per dealer
+    order_query = db.query(
+        DealerOrder.dealer_id,
+        func.count(DealerOrder.id).label("total"),
+        func.sum(case((DealerOrder.status == "delivered", 1), else_=0)).label("delivered"),
+        func.count(func.distinct(DealerOrder.sku_id)).label("unique_skus"),
+    )
+    if dealer_ids is not None:
+        order_query = order_query.filter(DealerOrder.dealer_id.in_(dealer_ids))
+    orders = {row.dealer_id: row for row in order_query.group_by(DealerOrder.dealer_id).all()}
+
+    now = datetime.utcnow()
+    rows = []
+    for dealer in dealers:
+        scores = _compute_health_score(coverage.get(dealer.warehouse_id), orders.get(dealer.id))
+        rows.append({"dealer_id": dealer.id, **scores, "computed_at": now})
+
+    for start in range(0, len(rows), HEALTH_SCORE_UPSERT_ROWS):
+        chunk = rows[start:start + HEALTH_SCORE_UPSERT_ROWS]
+        stmt = sqlite_insert(DealerHealthScore).values(chunk)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[DealerHealthScore.dealer_id],
+            set_={col: stmt.excluded[col] for col in chunk[0] if col != "dealer_id"},
+        ))
+    db.commit()
+    return len(rows)
+
+
+def refresh_all_health_scores() -> int:
+    """Run the batch scoring job for every dealer (used at startup)."""
+    db = SessionLocal()
+    try:
+        count = refresh_health_scores(db)
+        print(f"  Scored {count} dealers.")
+        return count
+    finally:
+        db.close()
+
+
+@on_inventory_change
+def _rescore_warehouse_dealers(db: Session, warehouse_ids: set[int]) -> None:
+    """Stock cover feeds the score, so rescore dealers served by the changed warehouses."""
+    dealer_ids = [d for (d,) in db.query(Dealer.id).filter(Dealer.warehouse_id.in_(warehouse_ids))]
+    if dealer_ids:
+        refresh_health_scores(db, dealer_ids)
+
+
+def _compute_health_score(coverage, orders) -> dict:
     """
     Health score 0-100:
     40% stock coverage, 25% stockout frequency,
     20% order fulfillment, 15% product breadth
     """
-    # Stock coverage (from warehouse inventory)
-    levels = db.query(InventoryLevel).filter(
-        InventoryLevel.warehouse_id == dealer.warehouse_id
-    ).all()
-
-    if not levels:
-        return 50.0
-
-    avg_cover = np.mean([l.days_of_cover for l in levels])
-    coverage_score = min(100, avg_cover / 30 * 100)
-
-    stockout_count = sum(1 for l in levels if l.days_of_cover < 3)
-    stockout_score = max(0, 100 - stockout_count * 15)
-
-    # Order fulfillment
-    total = db.query(func.count(DealerOrder.id)).filter(
-        DealerOrder.dealer_id == dealer.id
-    ).scalar()
-    delivered = db.query(func.count(DealerOrder.id)).filter(
-        DealerOrder.dealer_id == dealer.id,
-        DealerOrder.status == "delivered",
-    ).scalar()
+    if coverage is None:
+        # No inventory data for the warehouse
+        return {
+            "health_score": 50.0, "coverage_score": 0.0, "stockout_score": 0.0,
+            "fulfillment_score": 0.0, "breadth_score": 0.0,
+        }
+
+    coverage_score = min(100, coverage.avg_cover / 30 * 100)
+    stockout_score = max(0, 100 - coverage.stockout_count * 15)
+
+    total = orders.total if orders else 0
+    delivered = orders.delivered if orders else 0
     fulfillment_score = (delivered / max(total, 1)) * 100
 
-    # Product breadth
-    unique_skus = db.query(func.count(func.distinct(DealerOrder.sku_id))).filter(
-        DealerOrder.dealer_id == dealer.id
-    ).scalar()
+    unique_skus = orders.unique_skus if orders else 0
     breadth_score = min(100, unique_skus / 20 * 100)
 
-    return round(
-        0.4 * coverage_score + 0.25 * stockout_score +
-        0.2 * fulfillment_score + 0.15 * breadth_score, 1
-    )
+    return {
+        "health_score": round(
+            0.4 * coverage_score + 0.25 * stockout_score +
+            0.2 * fulfillment_score + 0.15 * breadth_score, 1
+        ),
+        "coverage_score": round(coverage_score, 1),
+        "stockout_score": round(stockout_score, 1),
+        "fulfillment_score": round(fulfillment_score, 1),
+        "breadth_score": round(breadth_score, 1),
+    }
 
 
 def get_smart_orders(db: Session, dealer_id: int) -> list[dict]:
     """Generate AI-driven order recommendations for a dealer."""
+    return get_smart_order_set(db, dealer_id)["orders"]
+
+
+def get_smart_order_set(db: Session, dealer_id: int) -> dict:
+    """
+    Recommendation set for a dealer plus the id used to accept it as a bundle.
+    Cached per dealer until the warehouse inventory or the forecasts change,
+    so repeat views skip the joined query and the forecast batch entirely.
+    """
     dealer = db.query(Dealer).filter(Dealer.id == dealer_id).first()
     if not dealer:
-        return []
+        return {"recommendation_set_id": None, "orders": []}
+
+    cache_key = _smart_order_cache_key(dealer)
+    cached = _smart_order_cache.get(dealer_id)
+    if not cached or cached[0] != cache_key:
+        orders = _build_smart_orders(db, dealer)
+        cached = (cache_key, _recommendation_set_id(dealer_id, orders), orders)
+        _smart_order_cache[dealer_id] = cached
+
+    return {"recommendation_set_id": cached[1], "orders": list(cached[2])}
+
+
+def accept_smart_order_bundle(db: Session, dealer_id: int, recommendation_set_id: str) -> dict:
+    """
+    Place every CRITICAL/RECOMMENDED order of a previously shown recommendation set.
+    Orders are written with a single bulk INSERT; retrying with the same set id
+    returns the original result, and ids from an outdated set are rejected.
+    """
+    accepted = db.query(DealerBundleAcceptance).filter(
+        DealerBundleAcceptance.recommendation_set_id == recommendation_set_id,
+        DealerBundleAcceptance.dealer_id == dealer_id,
+    ).first()
+    if accepted:
+        return _bundle_result(accepted, already_accepted=True)
+
+    if not db.query(Dealer.id).filter(Dealer.id == dealer_id).first():
+        return {"success": False, "message": "Dealer not found"}
+
+    current = get_smart_order_set(db, dealer_id)
+    if recommendation_set_id != current["recommendation_set_id"]:
+        return {
+            "success": False,
+            "stale": True,
+            "message": "These recommendations are out of date. Please refresh and review the new bundle.",
+        }
+
+    recs = current["orders"]
+    now = datetime.utcnow()
+    rows = [
+        {
+            "dealer_id": dealer_id,
+            "sku_id": rec["sku_id"],
+            "quantity": rec["recommended_qty"],
+            "order_date": now,
+            "status": "placed",
+            "is_ai_suggested": True,
+            "order_source": "ai_recommendation",
+            "savings_amount": rec["savings_amount"],
+        }
+        for rec in recs
+        if rec["urgency"] in ("CRITICAL", "RECOMMENDED")
+    ]
+
+    accepted = DealerBundleAcceptance(
+        recommendation_set_id=recommendation_set_id,
+        dealer_id=dealer_id,
+        orders_placed=len(rows),
+        total_savings=round(sum(r["savings_amount"] for r in rows), 0),
+        accepted_at=now,
+    )
+    try:
+        db.add(accepted)
+        db.flush()
+        if rows:
+            db.execute(insert(DealerOrder), rows)
+        db.commit()
+    except IntegrityError:
+        # A concurrent retry of the same bundle won the race
+        db.rollback()
+        accepted = db.query(DealerBundleAcceptance).filter(
+            DealerBundleAcceptance.recommendation_set_id == recommendation_set_id,
+        ).first()
+        return _bundle_result(accepted, already_accepted=True)
+
+    if rows:
+        refresh_health_scores(db, [dealer_id])
+    return _bundle_result(accepted, already_accepted=False)
+
+
+def _bundle_result(accepted: DealerBundleAcceptance, already_accepted: bool) -> dict:
+    return {
+        "success": True,
+        "already_accepted": already_accepted,
+        "orders_placed": accepted.orders_placed,
+        "total_savings": round(accepted.total_savings, 0),
+        "message": f"Bundle accepted! {accepted.orders_placed} orders placed. "
+                   f"You saved ₹{accepted.total_savings:,.0f}!",
+    }
+
+
+def _smart_order_cache_key(dealer: Dealer) -> tuple:
+    return (
+        dealer.warehouse_id,
+        dealer.region_id,
+        get_inventory_version(dealer.warehouse_id),
+        get_forecast_version(),
+    )
 
-    # Get dealer's warehouse inventory
-    levels = db.query(InventoryLevel).filter(
+
+def _recommendation_set_id(dealer_id: int, orders: list[dict]) -> str:
+    # Derived from what the dealer was shown, not from in-process versions, so
+    # ids survive restarts and match across workers
+    raw = f"{dealer_id}:{json.dumps(orders, sort_keys=True)}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def _build_smart_orders(db: Session, dealer: Dealer) -> list[dict]:
+    # Top 15 low-stock items with their SKU, shade and product in one query
+    rows = db.query(InventoryLevel, SKU, Shade, Product).join(
+        SKU, SKU.id == InventoryLevel.sku_id
+    ).join(
+        Shade, Shade.id == SKU.shade_id
+    ).outerjoin(
+        Product, Product.id == Shade.product_id
+    ).filter(
         InventoryLevel.warehouse_id == dealer.warehouse_id,
         InventoryLevel.days_of_cover < 30,
-    ).order_by(InventoryLevel.days_of_cover.asc()).all()
+    ).order_by(InventoryLevel.days_of_cover.asc()).limit(15).all()
+
+    # Forecast demand for every candidate in one batch
+    forecasts = get_forecasts([(sku.id, dealer.region_id) for _, sku, _, _ in rows], horizon=30)
 
     recommendations = []
     sim_date = date.fromisoformat(APP_SIMULATION_DATE)
 
-    for level in levels[:15]:  # Top 15 low-stock items
-        sku = db.query(SKU).filter(SKU.id == level.sku_id).first()
-        if not sku:
-            continue
-        shade = db.query(Shade).filter(Shade.id == sku.shade_id).first()
-        if not shade:
-            continue
-
-        # Forecast demand
-        forecast = get_forecast(sku.id, dealer.region_id, horizon=30)
-        predicted_demand = sum(f["predicted"] for f in forecast.get("forecast", []))
+    for level, sku, shade, product in rows:
+        predicted_demand = sum(f["predicted"] for f in forecasts[(sku.id, dealer.region_id)])
 
         # Calculate recommended quantity
         recommended_qty = max(10, int(predicted_demand * 1.2 - level.current_stock))
@@ -146,10 +349,9 @@ def get_smart_orders(db: Session, dealer_id: int) -> list[dict]:
             urgency = "OPTIONAL"
 
         # Generate context-aware reason
-        reason = _generate_reason(shade, level, sim_date)
+        reason = _generate_reason(shade, product, level, sim_date)
 
         # Stockout date
-        daily_demand = level.current_stock / max(level.days_of_cover, 0.1)
         stockout_date = sim_date + timedelta(days=int(level.days_of_cover))
 
         recommendations.append({
@@ -175,7 +377,7 @@ def get_smart_orders(db: Session, dealer_id: int) -> list[dict]:
     ))
 
 
-def _generate_reason(shade: Shade, level: InventoryLevel, sim_date: date) -> str:
+def _generate_reason(shade: Shade, product: Product | None, level: InventoryLevel, sim_date: date) -> str:
     """Generate context-aware reason for the recommendation."""
     # Check upcoming events relative to simulation date
     days_to_diwali = (date(2025, 10, 25) - sim_date).days
@@ -191,41 +393,92 @@ def _generate_reason(shade: Shade, level: InventoryLevel, sim_date: date) -> str
     if level.days_of_cover < 3:
         return f"CRITICAL: Stock will last only {level.days_of_cover:.0f} days at current sell-through"
 
-    if sim_date.month in (6, 7, 8, 9) and shade.product and shade.product.category == "Waterproofing":
+    if sim_date.month in (6, 7, 8, 9) and product and product.category == "Waterproofing":
         return "Peak monsoon season - waterproofing demand at annual high"
 
     return f"Stock will last {level.days_of_cover:.0f} days - restock recommended before depletion"
 
 
+def get_order_history(
+    db: Session, dealer_id: int, cursor: str | None = None, limit: int = 50,
+    status: str | None = None, source: str | None = None,
+) -> dict:
+    """
+    One page of a dealer's orders, newest first, with SKU and shade details.
+    Keyset-paginated on (order_date, id) so every page costs the same.
+    """
+    query = db.query(DealerOrder, SKU, Shade).outerjoin(
+        SKU, SKU.id == DealerOrder.sku_id
+    ).outerjoin(
+        Shade, Shade.id == SKU.shade_id
+    ).filter(DealerOrder.dealer_id == dealer_id)
+
+    if status:
+        query = query.filter(DealerOrder.status == status)
+    if source:
+        query = query.filter(DealerOrder.order_source == source)
+
+    if cursor:
+        try:
+            after_date, after_id = _decode_order_cursor(cursor)
+        except ValueError:
+            return {"error": "Invalid cursor"}
+        query = query.filter(or_(
+            DealerOrder.order_date < after_date,
+            and_(DealerOrder.order_date == after_date, DealerOrder.id < after_id),
+        ))
+
+    rows = query.order_by(
+        DealerOrder.order_date.desc(), DealerOrder.id.desc()
+    ).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more and rows[-1][0].order_date is not None:
+        last = rows[-1][0]
+        next_cursor = _encode_order_cursor(last.order_date, last.id)
+
+    return {
+        "orders": [
+            {
+                "id": o.id,
+                "sku_id": o.sku_id,
+                "sku_code": sku.sku_code if sku else "",
+                "size": sku.size if sku else "",
+                "shade_name": shade.shade_name if shade else "",
+                "shade_hex": shade.hex_color if shade else "#000",
+                "quantity": o.quantity,
+                "order_date": o.order_date.isoformat() if o.order_date else None,
+                "status": o.status,
+                "order_source": o.order_source,
+                "is_ai_suggested": o.is_ai_suggested,
+                "savings_amount": o.savings_amount,
+            }
+            for o, sku, shade in rows
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+def _encode_order_cursor(order_date: datetime, order_id: int) -> str:
+    raw = json.dumps([order_date.isoformat(), order_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_order_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        order_date, order_id = json.loads(raw)
+        return datetime.fromisoformat(order_date), int(order_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
 def get_dealer_alerts(db: Session, dealer_id: int) -> dict:
     """Get stockout, transfer, and trending alerts for a dealer."""
     dealer = db.query(Dealer).filter(Dealer.id == dealer_id).first()
     if not dealer:
         return {"stockout_alerts": [], "trending": [], "transfer_notifications": []}
 
-    # Stockout alerts
-    critical = db.query(InventoryLevel).filter(
-        InventoryLevel.warehouse_id == dealer.warehouse_id,
-        InventoryLevel.days_of_cover < 7,
-    ).all()
-
-    stockout_alerts = []
-    for level in critical:
-        sku = db.query(SKU).filter(SKU.id == level.sku_id).first()
-        shade = db.query(Shade).filter(Shade.id == sku.shade_id).first() if sku else None
-        if shade:
-            stockout_alerts.append({
-                "shade_name": shade.shade_name,
-                "shade_hex": shade.hex_color,
-                "days_remaining": round(level.days_of_cover, 1),
-                "current_stock": level.current_stock,
-            })
-
-    # Trending shades
-    trending = db.query(Shade).filter(Shade.is_trending == True).limit(5).all()
-
-    return {
-        "stockout_alerts": stockout_alerts[:5],
-        "trending": [{"shade_name": s.shade_name, "shade_hex": s.hex_color} for s in trending],
-        "transfer_notifications": [],
-    }
+    return public_alerts(get_warehouse_alerts(db, dealer.warehouse_id))
@@ -14,10 +14,16 @@ from app.config import MODEL_DIR, APP_SIMULATION_DATE
 # Global model cache
 _models: dict = {}
 
+# Bumped whenever the model set changes; forecast consumers key their caches on it
+_forecast_version: int = 0
+
+# Memoised future-only forecasts, keyed by (sku_id, region_id, horizon)
+_forecast_cache: dict = {}
+
 
 def preload_models():
     """Load all pre-trained Prophet models at startup."""
-    global _models
+    global _models, _forecast_version
     model_dir = Path(MODEL_DIR)
     if not model_dir.exists():
         print("  No model directory found. Skipping model preload.")
@@ -34,6 +40,12 @@ def preload_models():
             print(f"  Warning: Failed to load {pkl_file.name}: {e}")
 
     print(f"  Total models loaded: {len(_models)}")
+    _forecast_cache.clear()
+    _forecast_version += 1
+
+
+def get_forecast_version() -> int:
+    return _forecast_version
 
 
 def get_forecast(sku_id: int, region_id: int, horizon: int = 30) -> dict:
@@ -74,6 +86,54 @@ def get_forecast(sku_id: int, region_id: int, horizon: int = 30) -> dict:
         return _generate_fallback_forecast(sku_id, region_id, horizon)
 
 
+def get_forecasts(keys: list[tuple[int, int]], horizon: int = 30) -> dict[tuple[int, int], list[dict]]:
+    """
+    Batched future-only forecasts for many (sku_id, region_id) pairs.
+    Prophet models predict just the horizon instead of the full history,
+    and results are memoised until the models are reloaded.
+    """
+    result = {}
+    for sku_id, region_id in dict.fromkeys(keys):
+        cache_key = (sku_id, region_id, horizon)
+        if cache_key not in _forecast_cache:
+            _forecast_cache[cache_key] = _predict_future(sku_id, region_id, horizon)
+        result[(sku_id, region_id)] = _forecast_cache[cache_key]
+    return result
+
+
+def _predict_future(sku_id: int, region_id: int, horizon: int) -> list[dict]:
+    key = f"prophet_{sku_id}_{region_id}"
+    model = _models.get(key)
+
+    if model is None:
+        return _generate_fallback_forecast(sku_id, region_id, horizon)["forecast"]
+
+    try:
+        future = model.make_future_dataframe(periods=horizon, include_history=False)
+        forecast = model.predict(future)
+
+        sim_date = date.fromisoformat(APP_SIMULATION_DATE)
+        dates = [ts.date() for ts in forecast["ds"]]
+        yhat = forecast["yhat"].to_numpy()
+        lower = forecast["yhat_lower"].to_numpy()
+        upper = forecast["yhat_upper"].to_numpy()
+
+        return [
+            {
+                "date": d.isoformat(),
+                "predicted": max(0, round(float(yhat[i]), 1)),
+                "lower_bound": max(0, round(float(lower[i]), 1)),
+                "upper_bound": round(float(upper[i]), 1),
+            }
+            for i, d in enumerate(dates)
+            if d > sim_date
+        ]
+
+    except Exception as e:
+        print(f"Forecast error for {key}: {e}")
+        return _generate_fallback_forecast(sku_id, region_id, horizon)["forecast"]
+
+
 def _generate_fallback_forecast(sku_id: int, region_id: int, horizon: int) -> dict:
     """Generate a reasonable-looking fallback forecast without Prophet."""
     import numpy as np
@@ -0,0 +1,208 @@
+from __future__ import annotations
+"""
+Geospatial lookups for dealers and warehouses.
+A uniform lat/lng grid index answers radius and k-nearest queries by
+computing distances only for points in the cells around the query.
+Warehouse-warehouse and dealer-warehouse distance and lead-time matrices
+are precomputed once and shared by availability and transfer logic.
+"""
+
+import math
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Dealer, Warehouse
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEG_LAT = 111.195
+
+# ~55 km cells: a 50 km radius search touches at most a 3x3 block
+GRID_CELL_DEG = 0.5
+
+# Lead-time model: road distance is ~1.3x great-circle, trucks cover ~400 km
+# a day, plus a day for picking and loading
+ROAD_DISTANCE_FACTOR = 1.3
+TRUCK_KM_PER_DAY = 400
+HANDLING_DAYS = 1
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; accepts scalars or broadcastable NumPy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def lead_time_days(distance_km):
+    """Estimated delivery days for a great-circle distance (scalar or array); 0 for the same site."""
+    km = np.asarray(distance_km, dtype=float)
+    days = np.ceil(km * ROAD_DISTANCE_FACTOR / TRUCK_KM_PER_DAY) + HANDLING_DAYS
+    return np.where(km > 0, days, 0).astype(int)
+
+
+class DistanceMatrix:
+    """Pairwise distances (km) and lead times (days) between two point sets."""
+
+    def __init__(self, row_ids, row_lats, row_lngs, col_ids, col_lats, col_lngs):
+        self.row_ids = np.asarray(row_ids, dtype=np.int64)
+        self.col_ids = np.asarray(col_ids, dtype=np.int64)
+        self.row_pos = {int(i): p for p, i in enumerate(self.row_ids)}
+        self.col_pos = {int(i): p for p, i in enumerate(self.col_ids)}
+        self.km = haversine_km(
+            np.asarray(row_lats, dtype=float)[:, None], np.asarray(row_lngs, dtype=float)[:, None],
+            np.asarray(col_lats, dtype=float)[None, :], np.asarray(col_lngs, dtype=float)[None, :],
+        ).reshape(len(self.row_ids), len(self.col_ids))
+        self.lead_days = lead_time_days(self.km)
+
+    def distance(self, row_id: int, col_id: int) -> float:
+        return float(self.km[self.row_pos[row_id], self.col_pos[col_id]])
+
+    def lead_time(self, row_id: int, col_id: int) -> int:
+        return int(self.lead_days[self.row_pos[row_id], self.col_pos[col_id]])
+
+    def nearest(self, row_id: int, k: int, candidates=None) -> list[tuple[int, float]]:
+        """(col_id, distance_km) for the k closest columns, optionally restricted to candidate ids."""
+        dist = self.km[self.row_pos[row_id]]
+        cols = np.arange(len(self.col_ids)) if candidates is None else np.asarray(
+            [self.col_pos[c] for c in candidates if c in self.col_pos], dtype=np.int64
+        )
+        if cols.size == 0:
+            return []
+        order = cols[np.argsort(dist[cols], kind="stable")][:k]
+        return [(int(self.col_ids[c]), float(dist[c])) for c in order]
+
+
+class GridIndex:
+    """Bucket points into fixed-size lat/lng cells for candidate pruning."""
+
+    def __init__(self, ids, lats, lngs, cell_deg: float = GRID_CELL_DEG):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        self.cell_deg = cell_deg
+
+        self.cells: dict[tuple[int, int], np.ndarray] = {}
+        buckets: dict[tuple[int, int], list[int]] = {}
+        for pos, (lat, lng) in enumerate(zip(self.lats, self.lngs)):
+            buckets.setdefault(self._cell(lat, lng), []).append(pos)
+        for cell, positions in buckets.items():
+            self.cells[cell] = np.asarray(positions, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _cell(self, lat: float, lng: float) -> tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def _candidates(self, lat: float, lng: float, dlat_deg: float, dlng_deg: float) -> np.ndarray:
+        lat_lo, lng_lo = self._cell(lat - dlat_deg, lng - dlng_deg)
+        lat_hi, lng_hi = self._cell(lat + dlat_deg, lng + dlng_deg)
+        found = [
+            self.cells[(i, j)]
+            for i in range(lat_lo, lat_hi + 1)
+            for j in range(lng_lo, lng_hi + 1)
+            if (i, j) in self.cells
+        ]
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def _box_for_radius(self, lat: float, radius_km: float) -> tuple[float, float]:
+        dlat = radius_km / KM_PER_DEG_LAT
+        # Longitude degrees shrink towards the poles; size the box for the widest latitude it spans
+        max_lat = min(89.0, abs(lat) + dlat)
+        dlng = radius_km / (KM_PER_DEG_LAT * math.cos(math.radians(max_lat)))
+        return dlat, min(dlng, 180.0)
+
+    def within_radius(self, lat: float, lng: float, radius_km: float) -> list[tuple[int, float]]:
+        """(id, distance_km) for every point within radius_km, nearest first."""
+        dlat, dlng = self._box_for_radius(lat, radius_km)
+        positions = self._candidates(lat, lng, dlat, dlng)
+        if positions.size == 0:
+            return []
+
+        dist = haversine_km(lat, lng, self.lats[positions], self.lngs[positions])
+        mask = dist <= radius_km
+        positions, dist = positions[mask], dist[mask]
+        order = np.argsort(dist, kind="stable")
+        return [(int(self.ids[positions[i]]), float(dist[i])) for i in order]
+
+    def nearest(self, lat: float, lng: float, k: int, max_radius_km: float | None = None) -> list[tuple[int, float]]:
+        """(id, distance_km) for the k nearest points, optionally limited to max_radius_km."""
+        if max_radius_km is not None:
+            return self.within_radius(lat, lng, max_radius_km)[:k]
+        if len(self) == 0:
+            return []
+
+        # Grow the search box ring by ring until the k-th hit is provably inside it
+        radius_km = self.cell_deg * KM_PER_DEG_LAT
+        while True:
+            hits = self.within_radius(lat, lng, radius_km)
+            if len(hits) >= k or len(hits) == len(self) or radius_km > math.pi * EARTH_RADIUS_KM:
+                return hits[:k]
+            radius_km *= 2
+
+
+# --- Process-wide indexes, rebuilt lazily after dealer/warehouse changes ---
+
+_indexes: dict = {}
+_dirty: set = {"dealers", "warehouses"}
+
+
+def get_dealer_index(db: Session) -> GridIndex:
+    if "dealers" in _dirty or "dealers" not in _indexes:
+        rows = db.query(Dealer.id, Dealer.latitude, Dealer.longitude).all()
+        _indexes["dealers"] = GridIndex([r.id for r in rows], [r.latitude for r in rows], [r.longitude for r in rows])
+        _dirty.discard("dealers")
+    return _indexes["dealers"]
+
+
+def get_warehouse_index(db: Session) -> GridIndex:
+    if "warehouses" in _dirty or "warehouses" not in _indexes:
+        rows = db.query(Warehouse.id, Warehouse.latitude, Warehouse.longitude).all()
+        _indexes["warehouses"] = GridIndex([r.id for r in rows], [r.latitude for r in rows], [r.longitude for r in rows])
+        _dirty.discard("warehouses")
+    return _indexes["warehouses"]
+
+
+def get_warehouse_distances(db: Session) -> DistanceMatrix:
+    """Warehouse x warehouse distances and lead times."""
+    wh = get_warehouse_index(db)
+    return _matrix("warehouse_matrix", wh, wh)
+
+
+def get_dealer_warehouse_distances(db: Session) -> DistanceMatrix:
+    """Dealer x warehouse distances and lead times."""
+    return _matrix("dealer_matrix", get_dealer_index(db), get_warehouse_index(db))
+
+
+def _matrix(name: str, rows: GridIndex, cols: GridIndex) -> DistanceMatrix:
+    # Rebuilt whenever either underlying index has been rebuilt
+    sources, matrix = _indexes.get(name, (None, None))
+    if sources is None or sources[0] is not rows or sources[1] is not cols:
+        matrix = DistanceMatrix(rows.ids, rows.lats, rows.lngs, cols.ids, cols.lats, cols.lngs)
+        _indexes[name] = ((rows, cols), matrix)
+    return matrix
+
+
+def build_spatial_indexes():
+    """Build the dealer and warehouse indexes and distance matrices at startup."""
+    db = SessionLocal()
+    try:
+        dealers = get_dealer_index(db)
+        warehouses = get_warehouse_index(db)
+        get_warehouse_distances(db)
+        get_dealer_warehouse_distances(db)
+        print(f"  Spatial index: {len(dealers)} dealers, {len(warehouses)} warehouses (distance matrices ready).")
+    finally:
+        db.close()
+
+
+def _mark_dirty(name: str):
+    def listener(mapper, connection, target):
+        _dirty.add(name)
+    return listener
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(Dealer, _event, _mark_dirty("dealers"))
+    event.listen(Warehouse, _event, _mark_dirty("warehouses"))
@@ -7,8 +7,51 @@ Transfer recommendations, auto-balance, inventory health.
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from app.models import InventoryLevel, InventoryTransfer, Warehouse, SKU, Shade
+from app.services.geo_service import get_warehouse_distances
 from datetime import datetime
 
+# Per-warehouse inventory versions. Caches derived from InventoryLevel rows
+# record the version they were built at and are discarded once it moves on.
+_inventory_versions: dict[int, int] = {}
+# Moves with any warehouse's version, for caches derived from the whole network
+_network_inventory_version = 0
+
+
+def get_inventory_version(warehouse_id: int) -> int:
+    return _inventory_versions.get(warehouse_id, 0)
+
+
+def get_network_inventory_version() -> int:
+    return _network_inventory_version
+
+
+def bump_inventory_version(*warehouse_ids: int) -> None:
+    """Mark inventory at the given warehouses as changed."""
+    global _network_inventory_version
+    for wh_id in warehouse_ids:
+        _inventory_versions[wh_id] = _inventory_versions.get(wh_id, 0) + 1
+    _network_inventory_version += 1
+
+
+# Callbacks run after committed inventory changes: listener(db, warehouse_ids)
+_inventory_listeners: list = []
+
+
+def on_inventory_change(listener):
+    """Register a callback for committed inventory changes (usable as a decorator)."""
+    _inventory_listeners.append(listener)
+    return listener
+
+
+def publish_inventory_change(db: Session, *warehouse_ids: int) -> None:
+    """Bump versions for the given warehouses and notify listeners."""
+    bump_inventory_version(*warehouse_ids)
+    for listener in _inventory_listeners:
+        try:
+            listener(db, set(warehouse_ids))
+        except Exception as e:
+            print(f"Warning: inventory change listener failed: {e}")
+
 
 def get_warehouse_map_data(db: Session) -> list[dict]:
     """Get all warehouses with inventory status for the map."""
@@ -107,6 +150,7 @@ def get_recommended_transfers(db: Session) -> list[dict]:
         InventoryTransfer.status.in_(["PENDING", "APPROVED", "IN_TRANSIT"])
     ).all()
 
+    distances = get_warehouse_distances(db)
     result = []
     for t in transfers:
         from_wh = db.query(Warehouse).filter(Warehouse.id == t.from_warehouse_id).first()
@@ -124,6 +168,8 @@ def get_recommended_transfers(db: Session) -> list[dict]:
             "shade_name": shade.shade_name if shade else "",
             "shade_hex": shade.hex_color if shade else "#000",
             "quantity": t.quantity,
+            "distance_km": round(distances.distance(from_wh.id, to_wh.id), 1) if from_wh and to_wh else None,
+            "lead_time_days": distances.lead_time(from_wh.id, to_wh.id) if from_wh and to_wh else None,
             "status": t.status,
             "reason": t.reason,
             "recommended_at": t.recommended_at.isoformat() if t.recommended_at else None,
@@ -160,17 +206,21 @@ def approve_transfer(db: Session, transfer_id: int) -> dict:
         to_level.days_of_cover = round(to_level.current_stock / max(transfer.quantity / 30, 1), 1)
 
     db.commit()
+    publish_inventory_change(db, transfer.from_warehouse_id, transfer.to_warehouse_id)
 
     to_wh = db.query(Warehouse).filter(Warehouse.id == transfer.to_warehouse_id).first()
     from_wh = db.query(Warehouse).filter(Warehouse.id == transfer.from_warehouse_id).first()
     sku = db.query(SKU).filter(SKU.id == transfer.sku_id).first()
     shade = db.query(Shade).filter(Shade.id == sku.shade_id).first() if sku else None
+    eta_days = get_warehouse_distances(db).lead_time(transfer.from_warehouse_id, transfer.to_warehouse_id)
 
     return {
         "success": True,
         "message": f"Transfer approved. {transfer.quantity} units of {shade.shade_name if shade else 'product'} "
-                   f"moving from {from_wh.city if from_wh else '?'} to {to_wh.city if to_wh else '?'}. ETA: 2 days.",
+                   f"moving from {from_wh.city if from_wh else '?'} to {to_wh.city if to_wh else '?'}. "
+                   f"ETA: {eta_days} day{'s' if eta_days != 1 else ''}.",
         "transfer_id": transfer.id,
+        "eta_days": eta_days,
     }
 
 
@@ -0,0 +1,279 @@
+from __future__ import annotations
+"""
+Write-behind ingestion for customer order requests.
+Requests are appended to a local journal and acknowledged immediately; a
+background thread inserts them in batches on a short interval, so campaign
+traffic costs one SQLite write transaction per batch instead of per request.
+A crash between a batch commit and the journal rewrite replays that batch on
+the next start; each request's ref is stored with it, so replayed requests
+already in the database are skipped rather than inserted twice. Concurrent submitters share
+journal fsyncs (group commit) rather than queueing behind each other's.
+If a batch is rejected, its rows are retried one by one and those the
+database refuses are moved to a dead-letter journal, so one bad request
+can't block the queue. Without a running flusher (scripts, tests) each
+request is inserted as it is submitted.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from app.database import SessionLocal
+from app.models import CustomerOrderRequest, CustomerOrderRequestRef
+from app.config import ORDER_REQUEST_JOURNAL, ORDER_REQUEST_FLUSH_INTERVAL, ORDER_REQUEST_MAX_BATCH
+
+# Most recent dead-lettered requests kept in memory for the metrics endpoint
+DEAD_LETTERS_SHOWN = 20
+
+
+class OrderRequestQueue:
+    def __init__(self, journal_path: Path, flush_interval: float, max_batch: int):
+        self.journal_path = Path(journal_path)
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        self.dead_letter_path = self.journal_path.with_suffix(".dead")
+
+        self._pending: list[dict] = []
+        self._dead_letters: deque = deque(maxlen=DEAD_LETTERS_SHOWN)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        # Journal lines written / known durable, for group commit
+        self._written = 0
+        self._synced = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._journal = None
+
+        self._metrics = {
+            "accepted": 0,
+            "flushed": 0,
+            "flushes": 0,
+            "failed_flushes": 0,
+            "dead_lettered": 0,
+            "duplicates_skipped": 0,
+            "last_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+            "last_flush_at": None,
+        }
+
+    def start(self):
+        """Replay any journaled requests left by a previous run and start flushing."""
+        if self.journal_path.exists():
+            with open(self.journal_path) as f:
+                self._pending = [json.loads(line) for line in f if line.strip()] + self._pending
+            if self._pending:
+                print(f"  Replaying {len(self._pending)} journaled order requests.")
+        self._journal = open(self.journal_path, "a")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="order-request-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and drain what is left."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        while self.flush():
+            pass
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, request: dict) -> str:
+        """Journal a request and queue it for the next batch. Returns its reference."""
+        entry = {
+            "ref": uuid.uuid4().hex,
+            **request,
+            "status": "requested",
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        if not self.running:
+            # Nothing would flush it; insert now
+            with self._lock:
+                self._pending.append(entry)
+                self._metrics["accepted"] += 1
+            self.flush()
+            return entry["ref"]
+
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            if self._journal:
+                self._journal.write(line)
+                self._journal.flush()
+                self._written += 1
+            seq = self._written
+            self._pending.append(entry)
+            self._metrics["accepted"] += 1
+        self._sync(seq)
+        return entry["ref"]
+
+    def _sync(self, seq: int):
+        """Make journal lines up to `seq` durable; one fsync covers every line written before it."""
+        with self._sync_lock:
+            with self._lock:
+                if self._synced >= seq or not self._journal:
+                    return
+                target = self._written
+                # A duplicate descriptor stays valid if the journal is swapped meanwhile
+                fd = os.dup(self._journal.fileno())
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            with self._lock:
+                self._synced = max(self._synced, target)
+
+    def flush(self) -> int:
+        """Insert up to max_batch pending requests in one transaction. Returns the batch size."""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending[:self.max_batch]
+            if not batch:
+                return 0
+
+            start = time.perf_counter()
+            rejected = []
+            duplicates = 0
+            fresh = batch
+            db = SessionLocal()
+            try:
+                fresh = _not_inserted(db, batch)
+                duplicates = len(batch) - len(fresh)
+                if fresh:
+                    _insert(db, fresh)
+                    db.commit()
+            except Exception as e:
+                db.rollback()
+                self._metrics["failed_flushes"] += 1
+                print(f"Warning: order request batch failed ({len(batch)} rows), retrying one by one: {e}")
+                rejected = self._insert_one_by_one(db, fresh)
+                if rejected is None:
+                    return 0
+            finally:
+                db.close()
+
+            with self._lock:
+                del self._pending[:len(batch)]
+                if rejected:
+                    self._dead_letter(rejected)
+                if self._journal:
+                    self._rewrite_journal()
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                m = self._metrics
+                m["flushed"] += len(batch) - duplicates
+                m["duplicates_skipped"] += duplicates
+                m["flushes"] += 1
+                m["last_batch_size"] = len(batch)
+                m["last_flush_ms"] = round(elapsed_ms, 2)
+                m["max_flush_ms"] = round(max(m["max_flush_ms"], elapsed_ms), 2)
+                m["total_flush_ms"] += elapsed_ms
+                m["last_flush_at"] = datetime.utcnow().isoformat()
+            return len(batch)
+
+    def _insert_one_by_one(self, db, batch: list[dict]) -> list[tuple[dict, str]] | None:
+        """
+        Insert a failed batch row by row. Returns the rows the database
+        rejected, with the reason; None if the failure looks transient (the
+        whole batch then stays queued).
+        """
+        rejected = []
+        for entry in batch:
+            try:
+                _insert(db, [entry])
+                db.commit()
+            except (IntegrityError, KeyError, TypeError, ValueError) as e:
+                db.rollback()
+                rejected.append((entry, f"{type(e).__name__}: {getattr(e, 'orig', e)}"))
+            except Exception as e:
+                # Rows committed so far are skipped on retry by their refs
+                db.rollback()
+                print(f"Warning: order request flush failed ({len(batch)} queued): {e}")
+                return None
+        return rejected
+
+    def _dead_letter(self, rejected: list[tuple[dict, str]]):
+        # Caller holds self._lock
+        with open(self.dead_letter_path, "a") as f:
+            for entry, reason in rejected:
+                f.write(json.dumps({**entry, "error": reason}) + "\n")
+                self._dead_letters.append({"ref": entry.get("ref"), "error": reason})
+            f.flush()
+            os.fsync(f.fileno())
+        self._metrics["dead_lettered"] += len(rejected)
+        print(f"Warning: {len(rejected)} order requests rejected, moved to {self.dead_letter_path.name}")
+
+    def metrics(self) -> dict:
+        with self._lock:
+            m = dict(self._metrics)
+            m["queue_depth"] = len(self._pending)
+            m["recent_dead_letters"] = list(self._dead_letters)
+        m["avg_flush_ms"] = round(m.pop("total_flush_ms") / max(m["flushes"], 1), 2)
+        return m
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            while self.flush() == self.max_batch:
+                pass
+
+    def _rewrite_journal(self):
+        # Caller holds self._lock and the journal is open. Atomically replace the journal with what is still pending.
+        tmp_path = self.journal_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            f.writelines(json.dumps(e) + "\n" for e in self._pending)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal.close()
+        os.replace(tmp_path, self.journal_path)
+        # Everything written so far is now committed or in the fsynced new journal
+        self._synced = self._written
+        self._journal = open(self.journal_path, "a")
+
+
+def _not_inserted(db, batch: list[dict]) -> list[dict]:
+    """The entries whose refs are not recorded yet (replays after a crash may repeat some)."""
+    refs = [e["ref"] for e in batch]
+    done = {ref for (ref,) in db.query(CustomerOrderRequestRef.ref).filter(CustomerOrderRequestRef.ref.in_(refs))}
+    return [e for e in batch if e["ref"] not in done] if done else batch
+
+
+def _insert(db, entries: list[dict]) -> None:
+    # Requests and their refs go in one transaction
+    ids = db.execute(
+        insert(CustomerOrderRequest).returning(CustomerOrderRequest.id, sort_by_parameter_order=True),
+        [_row(e) for e in entries],
+    ).scalars().all()
+    db.execute(insert(CustomerOrderRequestRef), [
+        {"ref": e["ref"], "request_id": request_id} for e, request_id in zip(entries, ids)
+    ])
+
+
+def _row(entry: dict) -> dict:
+    return {
+        "customer_name": entry["customer_name"],
+        "customer_phone": entry["customer_phone"],
+        "shade_id": entry["shade_id"],
+        "size_preference": entry["size_preference"],
+        "dealer_id": entry["dealer_id"],
+        "status": entry["status"],
+        "created_at": datetime.fromisoformat(entry["created_at"]),
+    }
+
+
+order_request_queue = OrderRequestQueue(
+    ORDER_REQUEST_JOURNAL, ORDER_REQUEST_FLUSH_INTERVAL, ORDER_REQUEST_MAX_BATCH,
+)
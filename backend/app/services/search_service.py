@@ -0,0 +1,163 @@
+from __future__ import annotations
+"""
+Shade search with prefix and typo-tolerant matching.
+An in-memory inverted index over shade name, shade code and product name
+answers autocomplete queries: prefix matches come from a sorted vocabulary
+(bisect), typos from a symmetric-delete index verified by edit distance.
+Rebuilt whenever the catalogue version changes.
+"""
+
+import re
+from bisect import bisect_left
+from sqlalchemy.orm import Session
+from app.services.catalog_service import get_catalog_version, list_shades
+
+# Relative weight of a hit in each field
+FIELD_WEIGHTS = {"shade_name": 3.0, "shade_code": 2.0, "product_name": 1.0}
+
+# Match quality by kind; fuzzy hits lose a bit more per edit
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.75
+FUZZY_SCORE = 0.6
+FUZZY_PENALTY_PER_EDIT = 0.15
+
+MAX_PREFIX_EXPANSIONS = 50
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _max_edits(token: str) -> int:
+    # Codes are typed exactly (or by prefix); typo tolerance is for words
+    if len(token) < 3 or any(ch.isdigit() for ch in token):
+        return 0
+    return 1 if len(token) <= 5 else 2
+
+
+def _deletes(token: str, depth: int) -> set[str]:
+    """All strings reachable from token by deleting up to `depth` characters."""
+    result = {token}
+    frontier = {token}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        result |= frontier
+    return result
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance, or limit + 1 once it is exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class ShadeSearchIndex:
+    def __init__(self, shades: list[dict]):
+        self.docs = shades
+        # token -> {doc_idx: best field weight}
+        self.postings: dict[str, dict[int, float]] = {}
+        for idx, doc in enumerate(shades):
+            for field, weight in FIELD_WEIGHTS.items():
+                value = doc.get(field) or ""
+                tokens = _tokenize(value)
+                if field == "shade_code":
+                    tokens.append(re.sub(r"[^a-z0-9]", "", value.lower()))
+                for token in tokens:
+                    bucket = self.postings.setdefault(token, {})
+                    bucket[idx] = max(bucket.get(idx, 0.0), weight)
+
+        self.vocab = sorted(self.postings)
+        self.max_token_len = max((len(t) for t in self.vocab), default=0)
+        self.delete_index: dict[str, set[str]] = {}
+        for token in self.vocab:
+            if not _max_edits(token):
+                continue
+            for variant in _deletes(token, _max_edits(token)):
+                self.delete_index.setdefault(variant, set()).add(token)
+
+    def _expand(self, term: str, allow_prefix: bool) -> dict[str, float]:
+        """Vocabulary tokens matching a query term, with their match quality."""
+        matches: dict[str, float] = {}
+        if term in self.postings:
+            matches[term] = EXACT_SCORE
+
+        if allow_prefix:
+            i = bisect_left(self.vocab, term)
+            for token in self.vocab[i:i + MAX_PREFIX_EXPANSIONS]:
+                if not token.startswith(term):
+                    break
+                if token != term:
+                    # Longer completions of the same prefix rank a little lower
+                    matches[token] = max(matches.get(token, 0), PREFIX_SCORE * (0.8 + 0.2 * len(term) / len(token)))
+
+        limit = _max_edits(term)
+        # A term more than `limit` longer than every token can't be within reach
+        # of any of them; skip its (quadratic) delete variants
+        if limit and len(term) <= self.max_token_len + limit:
+            candidates = set()
+            for variant in _deletes(term, limit):
+                candidates |= self.delete_index.get(variant, set())
+            for token in candidates:
+                if token in matches:
+                    continue
+                dist = _edit_distance(term, token, limit)
+                if dist <= limit:
+                    matches[token] = FUZZY_SCORE - FUZZY_PENALTY_PER_EDIT * (dist - 1)
+        return matches
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        terms = _tokenize(query)
+        if not terms:
+            return []
+
+        # Score each document per query term; the last term is still being typed
+        per_term: list[dict[int, float]] = []
+        for pos, term in enumerate(terms):
+            scores: dict[int, float] = {}
+            for token, quality in self._expand(term, allow_prefix=pos == len(terms) - 1).items():
+                for idx, weight in self.postings[token].items():
+                    scores[idx] = max(scores.get(idx, 0.0), quality * weight)
+            per_term.append(scores)
+
+        # Prefer documents matching every term; fall back to any term
+        matched = set.intersection(*(set(s) for s in per_term)) or set().union(*per_term)
+        ranked = sorted(
+            matched,
+            key=lambda idx: (
+                -(sum(s.get(idx, 0.0) for s in per_term) + (0.1 if self.docs[idx]["is_trending"] else 0)),
+                len(self.docs[idx]["shade_name"]),
+                self.docs[idx]["id"],
+            ),
+        )
+        return [
+            {**self.docs[idx], "score": round(sum(s.get(idx, 0.0) for s in per_term), 3)}
+            for idx in ranked[:limit]
+        ]
+
+
+_index: ShadeSearchIndex | None = None
+_index_version: int = -1
+
+
+def search_shades(db: Session, query: str, limit: int = 10) -> list[dict]:
+    global _index, _index_version
+    version = get_catalog_version()
+    if _index is None or _index_version != version:
+        _index = ShadeSearchIndex(list_shades(db))
+        _index_version = version
+    return _index.search(query, limit)
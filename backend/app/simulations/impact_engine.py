@@ -1,2 +1,379 @@
 from __future__ import annotations
-"""Impact engine for What-If scenarios."""
+"""
+Impact engine for What-If scenarios.
+Loads every InventoryLevel row once into flat arrays (stock, daily demand,
+price, warehouse region, product category) and applies a scenario's
+inventory and demand multipliers to the affected region x category rows in a
+single vectorized pass. Aggregates to per-warehouse and per-SKU stockout
+dates, revenue at risk and days of cover.
+"""
+
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy.orm import Session
+from app.config import APP_SIMULATION_DATE
+from app.models import InventoryLevel, Warehouse, Region, SKU, Shade, Product
+from app.services.inventory_service import get_network_inventory_version
+
+# Thresholds shared with the dashboard and inventory map: critical cover and
+# the window over which lost sales count as revenue at risk
+CRITICAL_DAYS = 3
+RISK_WINDOW_DAYS = 7
+# Warehouses with more cover than this can send stock to a critical one
+TRANSFER_SOURCE_DAYS = 30
+# Stockouts further out than this are not given a date
+STOCKOUT_HORIZON_DAYS = 90
+# Cover is capped here when averaging, so rows with no demand don't dominate
+COVER_CAP_DAYS = 365
+
+
+class InventoryNetwork:
+    """Column arrays over all InventoryLevel rows, plus lookup tables for ids and labels."""
+
+    def __init__(self, rows: list):
+        self.size = len(rows)
+        self.warehouse_ids, wh_idx = np.unique(np.array([r.warehouse_id for r in rows], dtype=np.int64), return_inverse=True)
+        self.sku_ids, sku_idx = np.unique(np.array([r.sku_id for r in rows], dtype=np.int64), return_inverse=True)
+        self.wh_idx = wh_idx.astype(np.int64)
+        self.sku_idx = sku_idx.astype(np.int64)
+        self.warehouse_rows = _group_rows(self.wh_idx, len(self.warehouse_ids))
+        self.sku_rows = _group_rows(self.sku_idx, len(self.sku_ids))
+        self.row_index = {(r.warehouse_id, r.sku_id): i for i, r in enumerate(rows)}
+
+        self.stock = np.array([r.current_stock for r in rows], dtype=np.float64)
+        days_of_cover = np.array([r.days_of_cover for r in rows], dtype=np.float64)
+        # Same demand estimate as the dashboard: stock over days of cover
+        self.daily_demand = self.stock / np.maximum(days_of_cover, 0.1)
+        self.mrp = np.array([r.mrp for r in rows], dtype=np.float64)
+        # Value of a normal day's demand, kept current by update_warehouses
+        self.demand_value = float((self.daily_demand * self.mrp).sum())
+
+        self.regions = sorted({r.region for r in rows})
+        self.categories = sorted({r.category for r in rows})
+        self.region_idx = np.array([self.regions.index(r.region) for r in rows], dtype=np.int64)
+        self.category_idx = np.array([self.categories.index(r.category) for r in rows], dtype=np.int64)
+
+        self.warehouse_info = {}
+        self.sku_info = {}
+        for r in rows:
+            self.warehouse_info.setdefault(r.warehouse_id, {"city": r.city, "code": r.code, "region": r.region})
+            self.sku_info.setdefault(r.sku_id, {"sku_code": r.sku_code, "shade_name": r.shade_name, "category": r.category})
+
+    def mask(self, regions: list[str] | None, categories: list[str] | None) -> np.ndarray:
+        """Rows in any of the regions and categories; empty or None means all."""
+        selected = np.ones(self.size, dtype=bool)
+        if regions:
+            selected &= np.isin(self.region_idx, [i for i, r in enumerate(self.regions) if r in regions])
+        if categories:
+            selected &= np.isin(self.category_idx, [i for i, c in enumerate(self.categories) if c in categories])
+        return selected
+
+    def update_warehouses(self, db: Session, warehouse_ids: set[int]) -> np.ndarray | None:
+        """
+        Re-read stock and cover at the given warehouses; returns the rows that
+        changed, or None if positions were added or removed and the network must
+        be reloaded.
+        Arrays are replaced rather than written in place, so readers holding
+        the old ones are unaffected.
+        """
+        levels = db.query(
+            InventoryLevel.warehouse_id, InventoryLevel.sku_id,
+            InventoryLevel.current_stock, InventoryLevel.days_of_cover,
+        ).filter(InventoryLevel.warehouse_id.in_(warehouse_ids)).all()
+        if len(levels) != np.isin(self.warehouse_ids[self.wh_idx], list(warehouse_ids)).sum():
+            return None  # positions were removed
+        stock, daily_demand = self.stock.copy(), self.daily_demand.copy()
+        changed = []
+        for level in levels:
+            row = self.row_index.get((level.warehouse_id, level.sku_id))
+            if row is None:
+                return None
+            new_stock = float(level.current_stock)
+            new_demand = new_stock / max(level.days_of_cover, 0.1)
+            if new_stock != stock[row] or new_demand != daily_demand[row]:
+                self.demand_value += (new_demand - daily_demand[row]) * self.mrp[row]
+                stock[row], daily_demand[row] = new_stock, new_demand
+                changed.append(row)
+        self.stock, self.daily_demand = stock, daily_demand
+        return np.array(changed, dtype=np.int64)
+
+
+def _group_rows(idx: np.ndarray, n: int) -> list[np.ndarray]:
+    """Row indices for each group 0..n-1."""
+    order = np.argsort(idx, kind="stable")
+    return np.split(order, np.cumsum(np.bincount(idx, minlength=n))[:-1])
+
+
+_network: InventoryNetwork | None = None
+_network_version: int = -1
+
+
+def get_network(db: Session) -> InventoryNetwork:
+    """The current network arrays, reloaded when any warehouse's inventory changes."""
+    global _network, _network_version
+    version = get_network_inventory_version()
+    if _network is None or _network_version != version:
+        _network = load_network(db)
+        _network_version = version
+    return _network
+
+
+def refresh_network(db: Session, warehouse_ids: set[int]) -> tuple[InventoryNetwork, np.ndarray | None]:
+    """
+    Bring the cached network up to date after a change at `warehouse_ids`.
+    Returns (network, changed rows); rows are None when the network was
+    reloaded in full and everything derived from it must be rebuilt.
+    """
+    global _network, _network_version
+    version = get_network_inventory_version()
+    if _network is not None and _network_version == version - 1:
+        changed = _network.update_warehouses(db, warehouse_ids)
+        if changed is not None:
+            _network_version = version
+            return _network, changed
+    _network = load_network(db)
+    _network_version = version
+    return _network, None
+
+
+def load_network(db: Session) -> InventoryNetwork:
+    rows = db.query(
+        InventoryLevel.warehouse_id, InventoryLevel.sku_id,
+        InventoryLevel.current_stock, InventoryLevel.days_of_cover,
+        SKU.mrp, SKU.sku_code, Shade.shade_name, Product.category,
+        Warehouse.city, Warehouse.code, Region.name.label("region"),
+    ).join(SKU, SKU.id == InventoryLevel.sku_id) \
+     .join(Shade, Shade.id == SKU.shade_id) \
+     .join(Product, Product.id == Shade.product_id) \
+     .join(Warehouse, Warehouse.id == InventoryLevel.warehouse_id) \
+     .join(Region, Region.id == Warehouse.region_id).all()
+    return InventoryNetwork(rows)
+
+
+def apply_scenario(network: InventoryNetwork, definition: dict, rows: np.ndarray | None = None) -> dict:
+    """
+    Per-row scenario arrays (for all rows, or just `rows`): stock,
+    daily_demand (while the scenario lasts), days_of_cover and
+    revenue_at_risk (lost sales over the risk window at MRP).
+    Demand returns to normal after duration_days (no duration: it persists).
+    """
+    rows = np.arange(network.size) if rows is None else rows
+    affected = network.mask(definition.get("affected_regions"), definition.get("affected_categories"))[rows]
+    duration = definition.get("duration_days") or COVER_CAP_DAYS
+    stock = network.stock[rows] * np.where(affected, definition.get("inventory_multiplier", 1.0), 1.0)
+    base = network.daily_demand[rows]
+    demand = base * np.where(affected, definition.get("demand_multiplier", 1.0), 1.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Runs out during the scenario, or later at the normal rate
+        during = demand * duration
+        days_of_cover = np.where(
+            stock <= during,
+            np.where(demand > 0, stock / demand, 0.0),
+            np.where(base > 0, duration + (stock - during) / base, np.inf),
+        )
+    # Nothing on hand is out of stock whatever the demand; stock nobody buys lasts forever
+    days_of_cover = np.where(stock > 0, days_of_cover, 0.0)
+
+    in_window = min(duration, RISK_WINDOW_DAYS)
+    needed = demand * in_window + base * (RISK_WINDOW_DAYS - in_window)
+    revenue_at_risk = np.maximum(0.0, needed - stock) * network.mrp[rows]
+    return {
+        "affected": affected,
+        "stock": stock,
+        "daily_demand": demand,
+        "days_of_cover": days_of_cover,
+        "revenue_at_risk": revenue_at_risk,
+    }
+
+
+def compute_impact(network: InventoryNetwork, definition: dict, top_skus: int = 50) -> dict:
+    """Per-warehouse and per-SKU impact of a scenario (SKUs: those at risk, worst first)."""
+    return ScenarioImpact(network, definition).summary(top_skus)
+
+
+class ScenarioImpact:
+    """
+    A scenario's per-row results and their per-warehouse, per-SKU and network
+    aggregates. `update(rows)` recomputes only the given rows, re-aggregates
+    only the warehouses and SKUs they belong to, and adjusts the network
+    totals and rankings by the difference, so its cost follows the change.
+    """
+
+    def __init__(self, network: InventoryNetwork, definition: dict):
+        self.network = network
+        self.definition = definition
+        n, n_wh, n_sku = network.size, len(network.warehouse_ids), len(network.sku_ids)
+
+        rows = apply_scenario(network, definition)
+        self.affected_positions = int(rows["affected"].sum())
+        self.stock = rows["stock"]
+        self.daily_demand = rows["daily_demand"]
+        self.days_of_cover = rows["days_of_cover"]
+        self.revenue_at_risk = rows["revenue_at_risk"]
+        self.transferable = np.zeros(n, dtype=bool)
+
+        self.wh_revenue, self.wh_stockouts, self.wh_critical = np.zeros(n_wh), np.zeros(n_wh), np.zeros(n_wh)
+        self.wh_avg_cover, self.wh_first = np.zeros(n_wh), np.full(n_wh, np.inf)
+        self.sku_stock, self.sku_demand, self.sku_revenue = np.zeros(n_sku), np.zeros(n_sku), np.zeros(n_sku)
+        self.sku_positions, self.sku_sources = np.zeros(n_sku), np.zeros(n_sku)
+        self.sku_first_row = np.zeros(n_sku, dtype=np.int64)
+
+        # Summary entries per warehouse and SKU, and their order in the summary
+        self._warehouse_entries: dict[int, dict] = {}
+        self._sku_entries: dict[int, dict] = {}
+        self._warehouse_ranking = _Ranking()
+        self._sku_ranking = _Ranking()
+        self._aggregate(np.arange(n_wh), np.arange(n_sku))
+
+        everything = np.arange(n)
+        self._totals = self._row_totals(everything)
+        self._transferable_total = int(self.transferable.sum())
+
+    def update(self, rows: np.ndarray) -> None:
+        """Recompute after the network's stock or demand changed at `rows`."""
+        if not len(rows):
+            return
+        net = self.network
+        whs, skus = np.unique(net.wh_idx[rows]), np.unique(net.sku_idx[rows])
+        # Transfer sources are per SKU, so every row of a touched SKU may change
+        sku_rows = np.concatenate([net.sku_rows[i] for i in skus])
+        self._totals -= self._row_totals(rows)
+        self._transferable_total -= int(self.transferable[sku_rows].sum())
+
+        values = apply_scenario(net, self.definition, rows)
+        self.stock[rows] = values["stock"]
+        self.daily_demand[rows] = values["daily_demand"]
+        self.days_of_cover[rows] = values["days_of_cover"]
+        self.revenue_at_risk[rows] = values["revenue_at_risk"]
+        self._aggregate(whs, skus)
+
+        self._totals += self._row_totals(rows)
+        self._transferable_total += int(self.transferable[sku_rows].sum())
+
+    def _row_totals(self, rows: np.ndarray) -> np.ndarray:
+        """Contribution of `rows` to the network totals (see summary)."""
+        doc = self.days_of_cover[rows]
+        demand = self.daily_demand[rows]
+        return np.array([
+            (doc < RISK_WINDOW_DAYS).sum(),
+            (doc < CRITICAL_DAYS).sum(),
+            self.revenue_at_risk[rows].sum(),
+            (np.minimum(doc, COVER_CAP_DAYS) * demand).sum(),
+            demand.sum(),
+            (demand * self.network.mrp[rows]).sum(),
+        ], dtype=np.float64)
+
+    def _aggregate(self, whs: np.ndarray, skus: np.ndarray) -> None:
+        net = self.network
+        doc = self.days_of_cover
+
+        def by(idx, rows, values, n, groups):
+            return np.bincount(idx, weights=values[rows], minlength=n)[groups]
+
+        n = len(net.warehouse_ids)
+        rows = np.concatenate([net.warehouse_rows[i] for i in whs])
+        idx = net.wh_idx[rows]
+        self.wh_revenue[whs] = by(idx, rows, self.revenue_at_risk, n, whs)
+        self.wh_stockouts[whs] = by(idx, rows, doc < RISK_WINDOW_DAYS, n, whs)
+        self.wh_critical[whs] = by(idx, rows, doc < CRITICAL_DAYS, n, whs)
+        self.wh_avg_cover[whs] = by(idx, rows, np.minimum(doc, COVER_CAP_DAYS), n, whs) \
+            / np.maximum(np.bincount(idx, minlength=n)[whs], 1)
+        first = np.full(n, np.inf)
+        np.minimum.at(first, idx, doc[rows])
+        self.wh_first[whs] = first[whs]
+
+        n = len(net.sku_ids)
+        rows = np.concatenate([net.sku_rows[i] for i in skus])
+        idx = net.sku_idx[rows]
+        self.sku_stock[skus] = by(idx, rows, self.stock, n, skus)
+        self.sku_demand[skus] = by(idx, rows, self.daily_demand, n, skus)
+        self.sku_revenue[skus] = by(idx, rows, self.revenue_at_risk, n, skus)
+        self.sku_positions[skus] = by(idx, rows, doc < RISK_WINDOW_DAYS, n, skus)
+        # Critical rows whose SKU has surplus cover at another warehouse
+        self.sku_sources[skus] = by(idx, rows, doc > TRANSFER_SOURCE_DAYS, n, skus)
+        self.transferable[rows] = (doc[rows] < CRITICAL_DAYS) & (self.sku_sources[idx] > 0)
+        # Warehouse that runs out of each SKU first
+        order = rows[np.lexsort((doc[rows], idx))]
+        starts = np.r_[0, np.flatnonzero(np.diff(net.sku_idx[order])) + 1]
+        self.sku_first_row[net.sku_idx[order[starts]]] = order[starts]
+
+        for i in whs.tolist():
+            entry = self._warehouse_entry(i)
+            self._warehouse_entries[i] = entry
+            self._warehouse_ranking.set(i, -entry["revenue_at_risk"])
+        for i in skus.tolist():
+            # Only SKUs with revenue at risk are listed, highest first
+            at_risk = self.sku_revenue[i] > 0
+            self._sku_entries[i] = self._sku_entry(i) if at_risk else None
+            self._sku_ranking.set(i, -float(self.sku_revenue[i]) if at_risk else None)
+
+    def _warehouse_entry(self, i: int) -> dict:
+        wh_id = int(self.network.warehouse_ids[i])
+        return {
+            "warehouse_id": wh_id,
+            **self.network.warehouse_info[wh_id],
+            "stockout_skus": int(self.wh_stockouts[i]),
+            "critical_skus": int(self.wh_critical[i]),
+            "revenue_at_risk": round(float(self.wh_revenue[i]), 0),
+            "avg_days_of_cover": round(float(self.wh_avg_cover[i]), 1),
+            "first_stockout_date": _stockout_date(self.wh_first[i]),
+        }
+
+    def _sku_entry(self, i: int) -> dict:
+        net = self.network
+        sku_id = int(net.sku_ids[i])
+        first_row = self.sku_first_row[i]
+        return {
+            "sku_id": sku_id,
+            **net.sku_info[sku_id],
+            "stock": int(self.sku_stock[i]),
+            "daily_demand": round(float(self.sku_demand[i]), 1),
+            "days_of_cover": round(float(self.sku_stock[i] / max(self.sku_demand[i], 1e-9)), 1),
+            "warehouses_at_risk": int(self.sku_positions[i]),
+            "revenue_at_risk": round(float(self.sku_revenue[i]), 0),
+            "first_stockout_date": _stockout_date(self.days_of_cover[first_row]),
+            "first_stockout_city": net.warehouse_info[int(net.warehouse_ids[net.wh_idx[first_row]])]["city"],
+        }
+
+    def summary(self, top_skus: int = 50) -> dict:
+        stockouts, critical, revenue, cover_weighted, demand, demand_value = self._totals.tolist()
+        return {
+            "risk_window_days": RISK_WINDOW_DAYS,
+            "affected_positions": self.affected_positions,
+            "stockout_positions": int(round(stockouts)),
+            "critical_positions": int(round(critical)),
+            "transferable_positions": self._transferable_total,
+            "revenue_at_risk": round(revenue, 0),
+            "avg_days_of_cover": round(cover_weighted / demand, 1) if demand > 0 else 0.0,
+            "daily_demand_value": round(demand_value, 0),
+            "warehouses": [self._warehouse_entries[i] for i in self._warehouse_ranking.top()],
+            "skus": [self._sku_entries[i] for i in self._sku_ranking.top(top_skus)],
+        }
+
+
+class _Ranking:
+    """Items in ascending (key, item) order, kept sorted as single keys change."""
+
+    def __init__(self):
+        self.keys: dict = {}
+        self.order: list = []
+
+    def set(self, item, key) -> None:
+        """Set an item's key; None removes the item."""
+        old = self.keys.pop(item, None)
+        if old is not None:
+            del self.order[bisect_left(self.order, (old, item))]
+        if key is not None:
+            self.keys[item] = key
+            insort(self.order, (key, item))
+
+    def top(self, n: int | None = None) -> list:
+        return [item for _, item in self.order[:n]]
+
+
+def _stockout_date(days: float) -> str | None:
+    if not np.isfinite(days) or days > STOCKOUT_HORIZON_DAYS:
+        return None
+    return (date.fromisoformat(APP_SIMULATION_DATE) + timedelta(days=int(days))).isoformat()
@@ -0,0 +1,317 @@
+from __future__ import annotations
+"""
+Monte Carlo stockout risk.
+Samples daily demand paths for every warehouse-SKU from the forecast
+uncertainty bands and reports, per warehouse, the probability of stockouts
+before replenishment (the horizon) and the expected lost revenue.
+
+Forecasts are per SKU and region; each warehouse's path follows the forecast's
+day-to-day shape and relative spread, scaled to the warehouse's current
+run-rate (the same demand estimate days of cover is based on). Paths are
+simulated in vectorized batches, in fixed-size chunks spread over a process
+pool. Every chunk gets its own child of one SeedSequence, so a seed gives
+the same result for any number of workers.
+
+The pool is started once with the app (forkserver or spawn workers, never a
+fork of the server) and inputs reach the workers as .npy files written once
+per inputs version, so a request only sends (inputs path, seed, size) per
+chunk. At most MONTE_CARLO_MAX_CONCURRENT simulations run at a time.
+"""
+
+import json
+import multiprocessing
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+from sqlalchemy.orm import Session
+from app.config import (
+    MONTE_CARLO_WORKERS, MONTE_CARLO_CHUNK_PATHS, MONTE_CARLO_BATCH_PATHS,
+    MONTE_CARLO_MAX_CONCURRENT, MONTE_CARLO_QUEUE_TIMEOUT,
+)
+from app.models import Region
+from app.services.forecast_service import get_forecasts, get_forecast_version
+from app.services.inventory_service import get_network_inventory_version
+from app.simulations.impact_engine import get_network, apply_scenario
+
+# Forecast bands are 80% intervals (Prophet's default interval_width)
+BAND_Z = 1.2816
+# Correlation between a path's daily demand shocks at one warehouse-SKU;
+# forecast errors persist, so days are not independent draws
+DAILY_SHOCK_CORRELATION = 0.5
+DEFAULT_HORIZON_DAYS = 14
+TOP_POSITIONS = 20
+# Published input versions kept on disk, so runs still using an older one can finish
+PUBLISHED_INPUTS_KEPT = 4
+INPUT_ARRAYS = ("mean", "rel_sigma", "stock", "mrp", "wh_onehot")
+
+
+# --- Worker side (runs in pool processes) ---
+
+# Inputs directory -> arrays; the most recent version only
+_worker_inputs: dict = {}
+
+
+def _load_worker_inputs(path: str) -> dict:
+    if path not in _worker_inputs:
+        _worker_inputs.clear()
+        _worker_inputs[path] = {
+            name: np.load(Path(path) / f"{name}.npy", mmap_mode="r") for name in INPUT_ARRAYS
+        }
+    return _worker_inputs[path]
+
+
+def _warm_worker() -> None:
+    """No-op task that makes the pool start its processes."""
+
+
+def _simulate_chunk(seed: np.random.SeedSequence, n_paths: int, inputs: dict | str) -> dict:
+    """
+    Simulate n_paths paths over the input arrays (or the directory they were
+    published to). Returns per-path, per-warehouse stockout counts and lost
+    revenue, and per-row stockout counts and lost revenue sums.
+    """
+    if isinstance(inputs, str):
+        inputs = _load_worker_inputs(inputs)
+    # float32 halves memory traffic; totals are accumulated in float64
+    mean = inputs["mean"].astype(np.float32)  # (rows, horizon)
+    daily_sigma = (inputs["mean"] * inputs["rel_sigma"] * np.sqrt(1 - DAILY_SHOCK_CORRELATION)).astype(np.float32)
+    # A path-level shock moves the whole horizon's demand together
+    level_sigma = (inputs["mean"] * inputs["rel_sigma"]).sum(axis=1) * np.sqrt(DAILY_SHOCK_CORRELATION)
+    expected = inputs["mean"].sum(axis=1)
+    stock, mrp, wh_onehot = inputs["stock"], inputs["mrp"], inputs["wh_onehot"]
+    rng = np.random.default_rng(seed)
+    rows, horizon = mean.shape
+
+    wh_stockouts, wh_lost = [], []
+    row_stockouts, row_lost = np.zeros(rows), np.zeros(rows)
+    for start in range(0, n_paths, MONTE_CARLO_BATCH_PATHS):
+        batch = min(MONTE_CARLO_BATCH_PATHS, n_paths - start)
+        daily = rng.standard_normal((batch, rows, horizon), dtype=np.float32)
+        daily *= daily_sigma
+        daily += mean
+        np.maximum(daily, 0.0, out=daily)  # no negative sales on a day
+        total = daily.sum(axis=2, dtype=np.float64)
+        total += level_sigma * rng.standard_normal((batch, rows))
+        np.clip(total, 0.0, 3 * expected, out=total)
+
+        lost = np.maximum(0.0, total - stock) * mrp
+        out = (total > stock).astype(np.float64)
+        row_stockouts += out.sum(axis=0)
+        row_lost += lost.sum(axis=0)
+        wh_stockouts.append(out @ wh_onehot)
+        wh_lost.append(lost @ wh_onehot)
+
+    return {
+        "wh_stockouts": np.concatenate(wh_stockouts),
+        "wh_lost": np.concatenate(wh_lost),
+        "row_stockouts": row_stockouts,
+        "row_lost": row_lost,
+    }
+
+
+# --- Pool (started and stopped with the app) ---
+
+_pool: ProcessPoolExecutor | None = None
+_pool_workers = 1
+_inputs_dir: Path | None = None
+# inputs token -> published directory, oldest first
+_published: "OrderedDict[str, Path]" = OrderedDict()
+_publish_lock = threading.Lock()
+_run_slots = threading.BoundedSemaphore(MONTE_CARLO_MAX_CONCURRENT)
+
+
+def start_simulation_pool(workers: int = MONTE_CARLO_WORKERS) -> None:
+    """Start the worker processes once; without a pool, simulations run in-process."""
+    global _pool, _pool_workers, _inputs_dir
+    if _pool is not None or workers <= 1:
+        return
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    _inputs_dir = Path(tempfile.mkdtemp(prefix="paintflow-mc-"))
+    _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    _pool_workers = workers
+    try:
+        for future in [_pool.submit(_warm_worker) for _ in range(workers)]:
+            future.result()
+    except Exception:
+        stop_simulation_pool()
+        raise
+    print(f"  Monte Carlo pool: {workers} worker processes.")
+
+
+def stop_simulation_pool() -> None:
+    global _pool, _pool_workers, _inputs_dir
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool, _pool_workers = None, 1
+    if _inputs_dir is not None:
+        shutil.rmtree(_inputs_dir, ignore_errors=True)
+        _inputs_dir = None
+    _published.clear()
+
+
+def _publish(inputs: dict) -> str:
+    """Directory holding the input arrays for the workers, written once per inputs token."""
+    with _publish_lock:
+        token = inputs["token"]
+        if token not in _published:
+            path = _inputs_dir / token
+            path.mkdir()
+            for name in INPUT_ARRAYS:
+                np.save(path / f"{name}.npy", inputs[name])
+            _published[token] = path
+            while len(_published) > PUBLISHED_INPUTS_KEPT:
+                shutil.rmtree(_published.popitem(last=False)[1], ignore_errors=True)
+        return str(_published[token])
+
+
+# --- Inputs and orchestration ---
+
+_inputs_cache: dict = {}
+_inputs_lock = threading.Lock()
+
+
+def get_inputs(db: Session, horizon: int = DEFAULT_HORIZON_DAYS, definition: dict | None = None) -> dict:
+    """build_inputs, cached until inventory or forecasts change."""
+    key = (
+        get_network_inventory_version(), get_forecast_version(), horizon,
+        json.dumps(definition, sort_keys=True),
+    )
+    # Concurrent requests share one build (and one published copy for the workers)
+    with _inputs_lock:
+        if key not in _inputs_cache:
+            _inputs_cache.clear()
+            _inputs_cache[key] = build_inputs(db, horizon, definition)
+        return _inputs_cache[key]
+
+
+def build_inputs(db: Session, horizon: int = DEFAULT_HORIZON_DAYS, definition: dict | None = None) -> dict:
+    """
+    Per warehouse-SKU row: mean daily demand path and relative spread from the
+    forecasts, stock and price; optionally under a scenario definition.
+    """
+    network = get_network(db)
+    region_ids = {r.name: r.id for r in db.query(Region).all()}
+    row_region_ids = np.array([region_ids[network.regions[i]] for i in network.region_idx])
+    row_sku_ids = network.sku_ids[network.sku_idx]
+
+    keys = sorted(set(zip(row_sku_ids.tolist(), row_region_ids.tolist())))
+    forecasts = get_forecasts(keys, horizon)
+    predicted, spread = {}, {}
+    for key in keys:
+        entries = forecasts[key][:horizon]
+        p = np.array([e["predicted"] for e in entries], dtype=np.float64)
+        band = np.array([e["upper_bound"] - e["lower_bound"] for e in entries], dtype=np.float64)
+        scale = p.mean() if p.size and p.mean() > 0 else 1.0
+        predicted[key] = p / scale
+        spread[key] = np.where(p > 0, band / (2 * BAND_Z * np.maximum(p, 1e-9)), 0.0)
+
+    row_keys = list(zip(row_sku_ids.tolist(), row_region_ids.tolist()))
+    shape = np.stack([predicted[k] for k in row_keys])
+    rel_sigma = np.stack([spread[k] for k in row_keys])
+    horizon = shape.shape[1]
+
+    stock, rate = network.stock, network.daily_demand[:, None] * np.ones(horizon)
+    if definition:
+        rows = apply_scenario(network, definition)
+        duration = min(definition.get("duration_days") or horizon, horizon)
+        stock = rows["stock"]
+        rate[:, :duration] = rows["daily_demand"][:, None]
+
+    wh_onehot = np.zeros((network.size, len(network.warehouse_ids)))
+    wh_onehot[np.arange(network.size), network.wh_idx] = 1.0
+    return {
+        "mean": rate * shape,
+        "rel_sigma": rel_sigma,
+        "stock": stock,
+        "mrp": network.mrp,
+        "wh_onehot": wh_onehot,
+        "network": network,
+        # Identifies these arrays once published to the worker pool
+        "token": uuid.uuid4().hex,
+    }
+
+
+def run_monte_carlo(inputs: dict, n_paths: int = 2000, seed: int = 42) -> dict:
+    """Stockout probability and expected lost revenue per warehouse over n_paths paths."""
+    if not _run_slots.acquire(timeout=MONTE_CARLO_QUEUE_TIMEOUT):
+        return {"error": "Too many simulations running; try again shortly."}
+    try:
+        return _run_monte_carlo(inputs, n_paths, seed)
+    finally:
+        _run_slots.release()
+
+
+def _run_monte_carlo(inputs: dict, n_paths: int, seed: int) -> dict:
+    network = inputs["network"]
+    chunks = [
+        min(MONTE_CARLO_CHUNK_PATHS, n_paths - start)
+        for start in range(0, n_paths, MONTE_CARLO_CHUNK_PATHS)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+
+    started = time.perf_counter()
+    pool = _pool
+    if pool is None or len(chunks) == 1:
+        workers = 1
+        results = [_simulate_chunk(s, n, inputs) for s, n in zip(seeds, chunks)]
+    else:
+        # Workers load the published arrays once per inputs version; chunks carry only (seed, size)
+        workers = _pool_workers
+        path = _publish(inputs)
+        results = list(pool.map(_simulate_chunk, seeds, chunks, [path] * len(chunks)))
+    elapsed = time.perf_counter() - started
+
+    wh_stockouts = np.concatenate([r["wh_stockouts"] for r in results])
+    wh_lost = np.concatenate([r["wh_lost"] for r in results])
+    row_probability = sum(r["row_stockouts"] for r in results) / n_paths
+    row_lost = sum(r["row_lost"] for r in results) / n_paths
+    network_lost = wh_lost.sum(axis=1)
+    skus_held = np.bincount(network.wh_idx, minlength=len(network.warehouse_ids))
+
+    warehouses = []
+    for i, wh_id in enumerate(network.warehouse_ids.tolist()):
+        warehouses.append({
+            "warehouse_id": wh_id,
+            **network.warehouse_info[wh_id],
+            # Chance of at least one stockout, and of a stockout for an average SKU held
+            "stockout_probability": round(float((wh_stockouts[:, i] > 0).mean()), 4),
+            "sku_stockout_probability": round(float(wh_stockouts[:, i].mean() / max(skus_held[i], 1)), 4),
+            "expected_stockout_skus": round(float(wh_stockouts[:, i].mean()), 2),
+            "expected_lost_revenue": round(float(wh_lost[:, i].mean()), 0),
+            "p95_lost_revenue": round(float(np.percentile(wh_lost[:, i], 95)), 0),
+        })
+
+    positions = []
+    for row in np.argsort(-row_lost)[:TOP_POSITIONS].tolist():
+        if row_lost[row] <= 0:
+            break
+        wh_id = int(network.warehouse_ids[network.wh_idx[row]])
+        sku_id = int(network.sku_ids[network.sku_idx[row]])
+        positions.append({
+            "warehouse_id": wh_id,
+            "city": network.warehouse_info[wh_id]["city"],
+            "sku_id": sku_id,
+            **network.sku_info[sku_id],
+            "stockout_probability": round(float(row_probability[row]), 4),
+            "expected_lost_revenue": round(float(row_lost[row]), 0),
+        })
+
+    return {
+        "paths": n_paths,
+        "horizon_days": inputs["mean"].shape[1],
+        "seed": seed,
+        "workers": workers,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "paths_per_second": round(n_paths / elapsed, 0) if elapsed else None,
+        "expected_lost_revenue": round(float(network_lost.mean()), 0),
+        "p95_lost_revenue": round(float(np.percentile(network_lost, 95)), 0),
+        "warehouses": sorted(warehouses, key=lambda w: -w["expected_lost_revenue"]),
+        "positions": positions,
+    }
@@ -1,15 +1,43 @@
 from __future__ import annotations
 """
 What-If simulation scenarios: Truck Strike, Heatwave, Early Monsoon.
-Pre-computed data loaded at startup for instant client-side toggling.
+Pre-computed data loaded at startup for instant client-side toggling, and
+kept fresh as inventory changes: only the warehouse-SKU rows that changed are
+recomputed, and the saved JSON is replaced atomically by a background writer.
+Custom scenarios are computed on demand and cached per parameter hash and
+inventory version, so repeated or shared scenarios are served instantly.
+Only the most recently used CUSTOM_SCENARIO_CACHE_SIZE custom ids are kept;
+older shared ids expire and must be submitted again.
 """
 
 import json
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from pathlib import Path
-from app.config import SCENARIO_DIR
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.config import SCENARIO_DIR, APP_SIMULATION_DATE, CUSTOM_SCENARIO_CACHE_SIZE
+from app.database import SessionLocal
+from app.models import InventoryTransfer, SalesHistory
+from app.services.inventory_service import get_network_inventory_version, on_inventory_change
+from app.simulations.impact_engine import (
+    InventoryNetwork, ScenarioImpact, get_network, refresh_network, compute_impact,
+)
 from typing import Optional
 
 _scenarios: dict = {}
+# Live results behind _scenarios, updated row by row on inventory changes
+_impacts: dict[str, ScenarioImpact] = {}
+_refresh_lock = threading.Lock()
+# Scenario files waiting to be written, newest data per scenario; one writer thread
+_pending_writes: dict[str, dict] = {}
+_write_lock = threading.Lock()
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scenario-writer")
 
 SCENARIO_DEFINITIONS = {
     "TRUCK_STRIKE": {
@@ -17,38 +45,38 @@ SCENARIO_DEFINITIONS = {
         "description": "Nationwide trucking strike reduces inbound stock by 50% for 5 days.",
         "impact": "Cascading stockouts across West and Central regions.",
         "affected_regions": ["West", "Central"],
+        "affected_categories": [],  # every category
         "inventory_multiplier": 0.5,
         "demand_multiplier": 1.0,
+        "duration_days": 5,
     },
     "HEATWAVE": {
         "name": "Heatwave",
         "description": "Severe heatwave increases exterior paint demand by 35%.",
         "impact": "Exterior paints deplete faster in North and Central regions.",
         "affected_regions": ["North", "Central"],
+        "affected_categories": ["Exterior Wall"],
         "inventory_multiplier": 1.0,
         "demand_multiplier": 1.35,
+        "duration_days": 14,
     },
     "EARLY_MONSOON": {
         "name": "Early Monsoon",
         "description": "Monsoon arrives 2 weeks early, waterproofing demand surges 60%.",
         "impact": "Waterproofing products deplete rapidly in West and South.",
         "affected_regions": ["West", "South"],
+        "affected_categories": ["Waterproofing", "Exterior Wall"],
         "inventory_multiplier": 1.0,
         "demand_multiplier": 1.6,
+        "duration_days": 14,
     },
 }
 
 
 def preload_scenarios():
-    """Load pre-computed scenario data from JSON files."""
+    """Load saved scenario data, then refresh it from current inventory."""
     global _scenarios
     scenario_dir = Path(SCENARIO_DIR)
-    if not scenario_dir.exists():
-        scenario_dir.mkdir(parents=True, exist_ok=True)
-        print("  Scenario directory created. Generating scenario data...")
-        generate_scenario_data()
-        return
-
     for json_file in scenario_dir.glob("*.json"):
         try:
             with open(json_file, "r") as f:
@@ -57,8 +85,13 @@ def preload_scenarios():
         except Exception as e:
             print(f"  Warning: Failed to load {json_file.name}: {e}")
 
-    if not _scenarios:
+    # Inventory may have moved since the files were written; saved data is the fallback
+    try:
         generate_scenario_data()
+    except Exception as e:
+        if not _scenarios:
+            raise
+        print(f"  Warning: Serving saved scenario data, refresh failed: {e}")
 
 
 def generate_scenario_data():
@@ -67,31 +100,106 @@ def generate_scenario_data():
     scenario_dir = Path(SCENARIO_DIR)
     scenario_dir.mkdir(parents=True, exist_ok=True)
 
-    for scenario_id, definition in SCENARIO_DEFINITIONS.items():
-        scenario_data = {
-            "id": scenario_id,
-            **definition,
-            "dashboard_summary": _compute_scenario_dashboard(definition),
-        }
-        _scenarios[scenario_id] = scenario_data
+    db = SessionLocal()
+    try:
+        with _refresh_lock:
+            network = get_network(db)
+            baseline = _current_baseline(db, get_network_inventory_version())
+            for scenario_id, definition in SCENARIO_DEFINITIONS.items():
+                _impacts[scenario_id] = ScenarioImpact(network, definition)
+                _save_scenario(scenario_id, baseline)
+                print(f"  Generated scenario: {scenario_id}")
+    finally:
+        db.close()
 
-        filepath = scenario_dir / f"{scenario_id.lower()}.json"
-        with open(filepath, "w") as f:
-            json.dump(scenario_data, f, indent=2)
-        print(f"  Generated scenario: {scenario_id}")
+
+@on_inventory_change
+def _refresh_scenarios(db: Session, warehouse_ids: set[int]) -> None:
+    """Recompute built-in scenarios for just the rows that changed at these warehouses."""
+    if not _impacts:
+        return
+    with _refresh_lock:
+        network, rows = refresh_network(db, warehouse_ids)
+        baseline = _current_baseline(db, get_network_inventory_version())
+        for scenario_id, impact in _impacts.items():
+            if rows is None or impact.network is not network:
+                _impacts[scenario_id] = ScenarioImpact(network, impact.definition)
+            else:
+                impact.update(rows)
+            _save_scenario(scenario_id, baseline)
 
 
-def _compute_scenario_dashboard(definition: dict) -> dict:
-    """Compute modified dashboard metrics for a scenario."""
-    inv_mult = definition["inventory_multiplier"]
-    demand_mult = definition["demand_multiplier"]
+def _save_scenario(scenario_id: str, baseline: dict) -> None:
+    impact = _impacts[scenario_id]
+    scenario_data = {
+        "id": scenario_id,
+        **SCENARIO_DEFINITIONS[scenario_id],
+        **_scenario_results(impact.network, impact.summary(), baseline),
+    }
+    _scenarios[scenario_id] = scenario_data
+
+    # Written off the request path; later saves of a scenario replace a pending one
+    with _write_lock:
+        schedule = not _pending_writes
+        _pending_writes[scenario_id] = scenario_data
+    if schedule:
+        _writer.submit(_write_pending)
+
+
+def _write_pending() -> None:
+    with _write_lock:
+        writes = dict(_pending_writes)
+        _pending_writes.clear()
+    for scenario_id, scenario_data in writes.items():
+        try:
+            _write_json(Path(SCENARIO_DIR) / f"{scenario_id.lower()}.json", scenario_data)
+        except Exception as e:
+            print(f"Warning: Failed to save scenario {scenario_id}: {e}")
 
+
+def _write_json(filepath: Path, data: dict) -> None:
+    # Write a temp file and swap it in, so a crash never leaves a truncated file
+    tmp_path = filepath.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+
+def _scenario_results(network: InventoryNetwork, impact: dict, baseline: dict) -> dict:
+    return {
+        "dashboard_summary": _compute_scenario_dashboard(network, impact, baseline),
+        "warehouse_impact": impact["warehouses"],
+        "sku_impact": impact["skus"],
+    }
+
+
+def _baseline(db: Session) -> dict:
+    """Current month-to-date revenue and pending transfers, which scenarios adjust."""
+    sim_date = date.fromisoformat(APP_SIMULATION_DATE)
     return {
-        "total_revenue_mtd": round(45_00_000 * demand_mult),
-        "stockout_count": int(8 + (1 - inv_mult) * 15 + (demand_mult - 1) * 10),
-        "pending_transfers": int(3 + (1 - inv_mult) * 5),
-        "revenue_at_risk": round(12_50_000 * (1 - inv_mult) + 8_00_000 * (demand_mult - 1)),
-        "avg_days_of_cover": round(25 * inv_mult / demand_mult, 1),
+        "revenue_mtd": db.query(func.sum(SalesHistory.revenue)).filter(
+            SalesHistory.date >= sim_date.replace(day=1)
+        ).scalar() or 0,
+        "pending_transfers": db.query(func.count(InventoryTransfer.id)).filter(
+            InventoryTransfer.status == "PENDING"
+        ).scalar(),
+    }
+
+
+def _compute_scenario_dashboard(network: InventoryNetwork, impact: dict, baseline: dict) -> dict:
+    """Compute modified dashboard metrics for a scenario from its impact."""
+    base_demand_value = network.demand_value
+    demand_ratio = impact["daily_demand_value"] / base_demand_value if base_demand_value else 1.0
+
+    return {
+        "total_revenue_mtd": round(baseline["revenue_mtd"] * demand_ratio),
+        "stockout_count": impact["critical_positions"],
+        # Today's pending transfers plus one per critical position another warehouse can cover
+        "pending_transfers": baseline["pending_transfers"] + impact["transferable_positions"],
+        "revenue_at_risk": impact["revenue_at_risk"],
+        "avg_days_of_cover": impact["avg_days_of_cover"],
     }
 
 
@@ -104,3 +212,106 @@ def get_scenario_list() -> list[dict]:
 
 def get_scenario_data(scenario_id: str) -> dict | None:
     return _scenarios.get(scenario_id)
+
+
+# --- Custom scenarios ---
+
+CUSTOM_PREFIX = "CUSTOM_"
+CUSTOM_PARAMS = (
+    "affected_regions", "affected_categories", "inventory_multiplier", "demand_multiplier", "duration_days",
+)
+
+# scenario id -> normalised parameters, so shared ids can be recomputed later (LRU)
+_custom_definitions: "OrderedDict[str, dict]" = OrderedDict()
+# (scenario id, inventory version) -> results
+_custom_results: "OrderedDict[tuple, dict]" = OrderedDict()
+# Guards both LRUs: request threads read, reorder and evict them concurrently
+_custom_lock = threading.Lock()
+_baseline_cache: dict = {}
+
+
+def get_scenario_definition(scenario_id: str) -> dict | None:
+    """Parameters of a built-in or previously submitted custom scenario."""
+    if scenario_id in SCENARIO_DEFINITIONS:
+        return SCENARIO_DEFINITIONS[scenario_id]
+    with _custom_lock:
+        return _custom_definitions.get(scenario_id)
+
+
+def run_custom_scenario(db: Session, params: dict) -> dict:
+    """
+    Scenario results for custom parameters. Identical parameters share one
+    id (a hash of them) and one computation per inventory version.
+    """
+    network = get_network(db)
+    unknown = [r for r in params.get("affected_regions") or [] if r not in network.regions] \
+        + [c for c in params.get("affected_categories") or [] if c not in network.categories]
+    if unknown:
+        return {"error": f"Unknown regions or categories: {', '.join(unknown)}"}
+
+    definition = {
+        "affected_regions": sorted(set(params.get("affected_regions") or [])),
+        "affected_categories": sorted(set(params.get("affected_categories") or [])),
+        "inventory_multiplier": round(float(params.get("inventory_multiplier", 1.0)), 4),
+        "demand_multiplier": round(float(params.get("demand_multiplier", 1.0)), 4),
+        "duration_days": int(params.get("duration_days", 7)),
+    }
+    digest = hashlib.sha1(json.dumps(definition, sort_keys=True).encode()).hexdigest()[:12]
+    scenario_id = CUSTOM_PREFIX + digest.upper()
+    with _custom_lock:
+        _custom_definitions[scenario_id] = definition
+        _custom_definitions.move_to_end(scenario_id)
+        while len(_custom_definitions) > CUSTOM_SCENARIO_CACHE_SIZE:
+            _custom_definitions.popitem(last=False)
+    return _custom_scenario(db, scenario_id, definition)
+
+
+def get_custom_scenario(db: Session, scenario_id: str) -> dict | None:
+    """
+    Results for a shared custom scenario id, recomputed if inventory has
+    changed. None once the id has expired from the cache.
+    """
+    with _custom_lock:
+        definition = _custom_definitions.get(scenario_id)
+        if definition is None:
+            return None
+        _custom_definitions.move_to_end(scenario_id)
+    return _custom_scenario(db, scenario_id, definition)
+
+
+def _custom_scenario(db: Session, scenario_id: str, definition: dict) -> dict:
+    version = get_network_inventory_version()
+    key = (scenario_id, version)
+    with _custom_lock:
+        cached = _custom_results.get(key)
+        if cached is not None:
+            _custom_results.move_to_end(key)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    started = time.perf_counter()
+    network = get_network(db)
+    impact = _scenario_results(network, compute_impact(network, definition), _current_baseline(db, version))
+    results = {
+        "id": scenario_id,
+        **definition,
+        **impact,
+        "inventory_version": version,
+        "compute_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    try:
+        json.dumps(results, allow_nan=False)
+    except ValueError:
+        # Never cache (or serve) results that are not valid JSON
+        return {"error": "Scenario produced non-numeric results; check the multipliers."}
+    with _custom_lock:
+        _custom_results[key] = results
+        while len(_custom_results) > CUSTOM_SCENARIO_CACHE_SIZE:
+            _custom_results.popitem(last=False)
+    return {**results, "cached": False}
+
+
+def _current_baseline(db: Session, version: int) -> dict:
+    if _baseline_cache.get("version") != version:
+        _baseline_cache.update(version=version, baseline=_baseline(db))
+    return _baseline_cache["baseline"]
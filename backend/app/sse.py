@@ -0,0 +1,10 @@
+from __future__ import annotations
+"""
+Server-sent events framing shared by the streaming endpoints.
+"""
+
+import json
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,111 @@
+from __future__ import annotations
+#!/usr/bin/env python3
+"""
+Load benchmark for the copilot chat endpoint.
+Drives POST /api/copilot/chat at a fixed concurrency and reports latency
+percentiles and how answers were sourced (model, cache, fallback).
+
+By default the app runs in-process against the local stand-in model
+backend, whose latency and error rate are set with the flags below.
+Pass --url to target a running server instead (its own backend applies).
+Requires httpx.
+
+Usage: python benchmarks/bench_copilot.py [--requests 500] [--concurrency 32]
+           [--latency-ms 800] [--sigma 0.5] [--error-rate 0.02] [--stream]
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+import numpy as np
+import httpx
+
+QUESTIONS = [
+    "Compare stock health between the North and South regions.",
+    "Why is Bridal Red low in Pune?",
+    "How would a 20% price cut on exterior paints affect sales?",
+    "What should I transfer before Diwali?",
+    "How is the truck strike affecting deliveries?",
+]
+
+
+async def run(client: httpx.AsyncClient, n_requests: int, concurrency: int, stream: bool, unique: bool):
+    latencies, sources = [], Counter()
+    next_id = iter(range(n_requests))
+
+    async def worker():
+        for i in next_id:
+            message = QUESTIONS[i % len(QUESTIONS)]
+            if unique:
+                message += f" (#{i})"  # defeat the response cache
+            start = time.perf_counter()
+            if stream:
+                source, event = "error", None
+                async with client.stream("POST", "/api/copilot/chat/stream", json={"message": message}) as r:
+                    async for line in r.aiter_lines():
+                        if line.startswith("event: "):
+                            event = line[len("event: "):]
+                        elif line.startswith("data: ") and event == "done":
+                            source = json.loads(line[len("data: "):]).get("source", "unknown")
+            else:
+                r = await client.post("/api/copilot/chat", json={"message": message})
+                source = r.json().get("source", "unknown") if r.status_code == 200 else f"http_{r.status_code}"
+            latencies.append((time.perf_counter() - start) * 1000)
+            sources[source] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return np.asarray(latencies), sources, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--stream", action="store_true", help="use /chat/stream")
+    parser.add_argument("--repeat-questions", action="store_true", help="allow response cache hits")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    args = parser.parse_args()
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        # Configure the stand-in before the app (and its config) is imported
+        os.environ["COPILOT_BACKEND"] = "standin"
+        os.environ["COPILOT_STANDIN_LATENCY_MS"] = str(args.latency_ms)
+        os.environ["COPILOT_STANDIN_LATENCY_SIGMA"] = str(args.sigma)
+        os.environ["COPILOT_STANDIN_ERROR_RATE"] = str(args.error_rate)
+        from app.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    async def go():
+        async with client:
+            return await run(client, args.requests, args.concurrency, args.stream, not args.repeat_questions)
+
+    latencies, sources, elapsed = asyncio.run(go())
+    total = sum(sources.values())
+    print(
+        f"{total} requests @ concurrency {args.concurrency} in {elapsed:.1f}s "
+        f"({total / elapsed:.1f} req/s)"
+    )
+    print(
+        f"latency p50 {np.percentile(latencies, 50):.0f} ms, p90 {np.percentile(latencies, 90):.0f} ms, "
+        f"p99 {np.percentile(latencies, 99):.0f} ms, max {latencies.max():.0f} ms"
+    )
+    print(
+        "sources: " + ", ".join(f"{k} {v} ({v / total:.1%})" for k, v in sources.most_common())
+        + f" | fallback rate {sources['fallback'] / total:.1%}"
+    )
+
+
+if __name__ == "__main__":
+    main()
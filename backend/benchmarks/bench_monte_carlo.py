@@ -0,0 +1,64 @@
+from __future__ import annotations
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the Monte Carlo stockout simulation.
+Builds the simulation inputs once from the local database, then reports
+paths/second for each worker count (after one warm-up run, as in the
+long-lived server pool) and checks that a seed gives the same result
+regardless of how many processes run it.
+
+Usage: python benchmarks/bench_monte_carlo.py [--paths 10000] [--horizon 14]
+           [--workers 1,2,4] [--scenario TRUCK_STRIKE]
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+
+from app.database import SessionLocal
+from app.simulations.monte_carlo import build_inputs, run_monte_carlo, start_simulation_pool, stop_simulation_pool
+from app.simulations.scenarios import SCENARIO_DEFINITIONS
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paths", type=int, default=10000)
+    parser.add_argument("--horizon", type=int, default=14)
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, 2, os.cpu_count() or 1})))
+    parser.add_argument("--scenario", help="run under a scenario from SCENARIO_DEFINITIONS")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        inputs = build_inputs(db, args.horizon, SCENARIO_DEFINITIONS[args.scenario] if args.scenario else None)
+        print(
+            f"inputs: {inputs['mean'].shape[0]} warehouse-SKU rows x {inputs['mean'].shape[1]} days "
+            f"in {(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+    finally:
+        db.close()
+
+    reference = None
+    for workers in (int(w) for w in args.workers.split(",")):
+        start_simulation_pool(workers)
+        try:
+            run_monte_carlo(inputs, args.paths, args.seed)  # warm-up: workers load the inputs
+            result = run_monte_carlo(inputs, args.paths, args.seed)
+        finally:
+            stop_simulation_pool()
+        same = reference is None or result["warehouses"] == reference["warehouses"]
+        reference = reference or result
+        print(
+            f"workers {workers:>2}: {result['paths']} paths in {result['elapsed_ms']:.0f} ms "
+            f"({result['paths_per_second']:,.0f} paths/s) | expected lost revenue "
+            f"₹{result['expected_lost_revenue']:,.0f} | matches 1st run: {same}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+from __future__ import annotations
+#!/usr/bin/env python3
+"""
+Throughput benchmark for image snap-and-find colour extraction.
+Generates synthetic multi-megapixel photos and times dominant colour
+extraction plus shade matching.
+
+Usage: python benchmarks/bench_snap_find.py [--megapixels 12] [--runs 10]
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import io
+import resource
+import time
+import numpy as np
+from PIL import Image
+
+from app.services.color_service import ShadeColorIndex, extract_dominant_colors
+from seed.paint_catalog import SHADES, hex_to_rgb
+
+
+def make_photo(megapixels: float, fmt: str, seed: int = 0) -> bytes:
+    """A wall-like test photo: a few flat colour regions with lighting gradient and noise."""
+    rng = np.random.default_rng(seed)
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+
+    # Build at low resolution and upscale so generation isn't what we measure
+    small_w, small_h = width // 8, height // 8
+    palette = rng.integers(0, 256, (4, 3))
+    regions = (np.arange(small_w)[None, :] * 4 // small_w).repeat(small_h, axis=0)
+    img = palette[regions].astype(float)
+    img *= np.linspace(0.8, 1.1, small_h)[:, None, None]
+    img += rng.normal(0, 6, img.shape)
+    small = Image.fromarray(np.clip(img, 0, 255).astype(np.uint8))
+
+    buf = io.BytesIO()
+    small.resize((width, height), Image.Resampling.NEAREST).save(buf, format=fmt, quality=90)
+    return buf.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--megapixels", type=float, default=12)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    shades = [hex_to_rgb(hex_color) for family in SHADES.values() for _, hex_color, _, _ in family]
+    index = ShadeColorIndex(range(len(shades)), shades)
+
+    for fmt in ("JPEG", "PNG"):
+        photo = make_photo(args.megapixels, fmt)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            colors = extract_dominant_colors(photo)
+            index.match_rgb([c["rgb"] for c in colors], k=1)
+        elapsed = time.perf_counter() - start
+
+        rss_growth_mb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+        print(
+            f"{fmt:5s} {args.megapixels:.0f} MP ({len(photo) / 1e6:.1f} MB): "
+            f"{elapsed / args.runs * 1000:.1f} ms/image, "
+            f"{args.runs * args.megapixels / elapsed:.1f} MP/s, "
+            f"peak RSS growth {rss_growth_mb:.0f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+from __future__ import annotations
+"""
+Shared fixtures: every test session runs against a freshly seeded database
+(and its own journal and scenario files) in a temporary directory, never
+the app's own paintflow.db.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the app at the temporary files before anything imports app.database
+import app.config as config  # noqa: E402
+
+_tmp = Path(tempfile.mkdtemp(prefix="paintflow-tests-"))
+config.DB_PATH = _tmp / "paintflow.db"
+config.DATABASE_URL = f"sqlite:///{config.DB_PATH}"
+config.ORDER_REQUEST_JOURNAL = _tmp / "order_requests.journal"
+config.SCENARIO_DIR = _tmp / "scenarios"
+
+import pytest  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+from seed.generate_data import run_seed  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def seeded_db():
+    run_seed()
+    init_db()
+    yield config.DB_PATH
+    shutil.rmtree(_tmp, ignore_errors=True)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    # No lifespan: routes build their indexes and caches lazily
+    return TestClient(app)
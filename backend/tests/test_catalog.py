@@ -0,0 +1,59 @@
+from __future__ import annotations
+import pytest
+
+SHADES = "/api/customer/shades"
+
+
+def _etag(client) -> str:
+    return client.get(SHADES).headers["etag"]
+
+
+@pytest.mark.parametrize("if_none_match", [
+    "{etag}",
+    "{strong}",
+    '"other", {etag}',
+    '"other",{strong}',
+    "*",
+])
+def test_matching_etag_returns_304(client, if_none_match):
+    etag = _etag(client)
+    header = if_none_match.format(etag=etag, strong=etag.removeprefix("W/"))
+    response = client.get(SHADES, headers={"If-None-Match": header})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+
+@pytest.mark.parametrize("if_none_match", ['"catalog"', 'W/"catalog-0"', ""])
+def test_other_etags_return_the_catalogue(client, if_none_match):
+    response = client.get(SHADES, headers={"If-None-Match": if_none_match})
+    assert response.status_code == 200
+    assert len(response.json()) > 0
+
+
+def test_etag_changes_with_the_filters(client):
+    assert client.get(SHADES, params={"trending": True}).headers["etag"] != _etag(client)
+
+
+@pytest.mark.parametrize("accept_encoding, gzipped", [
+    ("gzip", True),
+    ("br, gzip;q=0.5", True),
+    ("br, *;q=0.5", True),
+    ("gzip;q=0", False),
+    ("gzip;q=0, *", False),
+    ("identity", False),
+])
+def test_gzip_follows_accept_encoding_qvalues(client, accept_encoding, gzipped):
+    response = client.get(SHADES, headers={"Accept-Encoding": accept_encoding})
+    assert (response.headers.get("content-encoding") == "gzip") == gzipped
+    # The test client decodes gzip transparently
+    assert response.json()
+
+
+def test_unknown_filters_share_one_empty_snapshot(client):
+    from app.services.catalog_service import _snapshots
+
+    for i in range(20):
+        assert client.get(SHADES, params={"family": f"nope-{i}"}).json() == []
+    assert client.get(SHADES, params={"category": "nope"}).json() == []
+    assert len([k for k in _snapshots if k[0] and k[0].startswith("nope")]) == 0
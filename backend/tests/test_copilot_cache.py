@@ -0,0 +1,106 @@
+from __future__ import annotations
+import asyncio
+import types
+import pytest
+from app.services import copilot_service
+from app.services.copilot_service import ResponseCache, _cache_key
+
+ANSWER = '{"text": "Pune is short on Bridal Red.", "ui_widget": null}'
+
+
+def _key(message: str, version=3, scenario: str = "NORMAL") -> tuple:
+    return _cache_key(message, {"snapshot_version": version}, scenario)
+
+
+def test_cache_key_ignores_case_spacing_and_trailing_punctuation():
+    assert _key("Where is stock LOW?") == _key("  where   is stock low ") == _key("where is stock low!!")
+
+
+def test_cache_key_separates_scenarios_snapshots_and_questions():
+    assert _key("where is stock low") != _key("where is stock low", scenario="HEATWAVE")
+    assert _key("where is stock low") != _key("where is stock low", version=4)
+    assert _key("where is stock low") != _key("where is stock high")
+
+
+def test_response_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    cache.put(("a",), {"text": "a"})
+    cache.put(("b",), {"text": "b"})
+    cache.get(("a",))
+    cache.put(("c",), {"text": "c"})
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) == {"text": "a"}
+
+
+def test_response_cache_expires_entries():
+    cache = ResponseCache(max_entries=2, ttl_seconds=0)
+    cache.put(("a",), {"text": "a"})
+    assert cache.get(("a",)) is None
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """A fake model backend answering with whatever `model.raw` holds."""
+    fake = types.SimpleNamespace(raw=ANSWER, calls=0)
+
+    async def generate(system_instruction, contents):
+        fake.calls += 1
+        return fake.raw
+
+    async def stream(system_instruction, contents, deadline):
+        fake.calls += 1
+        yield fake.raw
+
+    monkeypatch.setattr(copilot_service, "_backend", types.SimpleNamespace(available=True, name="fake"))
+    monkeypatch.setattr(copilot_service, "_generate", generate)
+    monkeypatch.setattr(copilot_service, "_stream_model", stream)
+    monkeypatch.setattr(copilot_service, "_response_cache", ResponseCache(16, 60))
+    return fake
+
+
+def _ask(message: str, context: dict, stream: bool) -> dict:
+    async def ask():
+        if stream:
+            events = [e async for e in copilot_service.stream_chat_response(message, dict(context))]
+            return events[-1][1]
+        return await copilot_service.get_chat_response(message, dict(context))
+    return asyncio.run(ask())
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_model_answers_are_cached_per_snapshot(model, stream):
+    assert _ask("Stock in Pune?", {"snapshot_version": 1}, stream)["source"] == "model"
+    assert _ask("stock in pune", {"snapshot_version": 1}, stream)["source"] == "cache"
+    assert _ask("stock in pune", {"snapshot_version": 2}, stream)["source"] == "model"
+    assert model.calls == 2
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_non_json_answers_are_not_cached(model, stream):
+    model.raw = "Sorry, plain text"
+    for _ in range(2):
+        response = _ask("stock in pune", {"snapshot_version": 1}, stream)
+        assert response["source"] == "model" and response["text"] == "Sorry, plain text"
+    assert model.calls == 2
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_answers_without_a_snapshot_are_not_cached(model, stream):
+    for _ in range(2):
+        assert _ask("stock in pune", {"snapshot_version": None}, stream)["source"] == "model"
+    assert model.calls == 2
+
+
+def test_client_cannot_choose_the_snapshot_version(monkeypatch):
+    from app.routers import copilot as copilot_router
+
+    def broken_snapshot(db):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(copilot_router, "get_inventory_snapshot", broken_snapshot)
+    request = copilot_router.ChatRequest(
+        message="hi", context={"snapshot_version": 99, "inventory_snapshot": "made up"},
+    )
+    context = asyncio.run(copilot_router._build_context(request, None))
+    assert context["snapshot_version"] is None
+    assert context["inventory_snapshot"] != "made up"
@@ -0,0 +1,110 @@
+from __future__ import annotations
+from sqlalchemy import func
+from app.models import Dealer, DealerOrder, InventoryLevel
+from app.services.dealer_service import (
+    get_smart_order_set, accept_smart_order_bundle, get_order_history, _smart_order_cache,
+)
+from app.services.inventory_service import publish_inventory_change
+
+
+def _order_count(db, dealer_id: int) -> int:
+    return db.query(func.count(DealerOrder.id)).filter(DealerOrder.dealer_id == dealer_id).scalar()
+
+
+def _dealer_with_recommendations(db) -> Dealer:
+    for dealer in db.query(Dealer).order_by(Dealer.id):
+        orders = get_smart_order_set(db, dealer.id)["orders"]
+        if any(o["urgency"] in ("CRITICAL", "RECOMMENDED") for o in orders):
+            return dealer
+    raise AssertionError("seed data has no dealer with actionable recommendations")
+
+
+# --- Bundle acceptance ---
+
+def test_bundle_accepts_once_and_retries_are_idempotent(db):
+    dealer = _dealer_with_recommendations(db)
+    shown = get_smart_order_set(db, dealer.id)
+    actionable = [o for o in shown["orders"] if o["urgency"] in ("CRITICAL", "RECOMMENDED")]
+    before = _order_count(db, dealer.id)
+
+    first = accept_smart_order_bundle(db, dealer.id, shown["recommendation_set_id"])
+    assert first["success"] and not first["already_accepted"]
+    assert first["orders_placed"] == len(actionable)
+    assert _order_count(db, dealer.id) == before + len(actionable)
+
+    retry = accept_smart_order_bundle(db, dealer.id, shown["recommendation_set_id"])
+    assert retry["success"] and retry["already_accepted"]
+    assert retry["orders_placed"] == first["orders_placed"]
+    assert _order_count(db, dealer.id) == before + len(actionable)
+
+
+def test_bundle_set_id_survives_a_cold_cache(db):
+    dealer = db.query(Dealer).order_by(Dealer.id).first()
+    set_id = get_smart_order_set(db, dealer.id)["recommendation_set_id"]
+    # As after a restart, or on another worker
+    _smart_order_cache.clear()
+    assert get_smart_order_set(db, dealer.id)["recommendation_set_id"] == set_id
+
+
+def test_bundle_rejects_unknown_and_outdated_sets(db):
+    dealer = db.query(Dealer).order_by(Dealer.id.desc()).first()
+    assert accept_smart_order_bundle(db, dealer.id, "not-a-set")["stale"]
+
+    shown = get_smart_order_set(db, dealer.id)
+    level = db.query(InventoryLevel).filter(
+        InventoryLevel.warehouse_id == dealer.warehouse_id,
+        InventoryLevel.days_of_cover < 30,
+    ).order_by(InventoryLevel.days_of_cover).first()
+    level.current_stock += 7
+    db.commit()
+    publish_inventory_change(db, dealer.warehouse_id)
+
+    before = _order_count(db, dealer.id)
+    result = accept_smart_order_bundle(db, dealer.id, shown["recommendation_set_id"])
+    assert not result["success"] and result["stale"]
+    assert _order_count(db, dealer.id) == before
+
+
+def test_bundle_unknown_dealer(db):
+    assert accept_smart_order_bundle(db, 10**6, "x") == {"success": False, "message": "Dealer not found"}
+
+
+# --- Order history pagination ---
+
+def _all_pages(db, dealer_id: int, limit: int, **filters) -> list[dict]:
+    orders, cursor = [], None
+    while True:
+        page = get_order_history(db, dealer_id, cursor=cursor, limit=limit, **filters)
+        assert len(page["orders"]) <= limit
+        orders += page["orders"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return orders
+
+
+def test_order_history_pages_cover_every_order_once_newest_first(db):
+    dealer_id = db.query(DealerOrder.dealer_id).group_by(DealerOrder.dealer_id).order_by(
+        func.count(DealerOrder.id).desc()
+    ).first()[0]
+    full = get_order_history(db, dealer_id, limit=10_000)["orders"]
+    assert len(full) > 7
+
+    paged = _all_pages(db, dealer_id, limit=3)
+    assert [o["id"] for o in paged] == [o["id"] for o in full]
+    assert len({o["id"] for o in paged}) == len(full) == _order_count(db, dealer_id)
+    keys = [(o["order_date"], o["id"]) for o in paged]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_order_history_filters_apply_across_pages(db):
+    dealer_id = db.query(DealerOrder.dealer_id).first()[0]
+    status = db.query(DealerOrder.status).filter(DealerOrder.dealer_id == dealer_id).first()[0]
+    paged = _all_pages(db, dealer_id, limit=2, status=status)
+    assert paged and all(o["status"] == status for o in paged)
+    assert len(paged) == db.query(func.count(DealerOrder.id)).filter(
+        DealerOrder.dealer_id == dealer_id, DealerOrder.status == status
+    ).scalar()
+
+
+def test_order_history_rejects_invalid_cursor(db):
+    assert get_order_history(db, 1, cursor="not-a-cursor") == {"error": "Invalid cursor"}
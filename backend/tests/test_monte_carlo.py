@@ -0,0 +1,50 @@
+from __future__ import annotations
+import pytest
+from app.config import MONTE_CARLO_CHUNK_PATHS
+from app.simulations import monte_carlo
+from app.simulations.monte_carlo import get_inputs, run_monte_carlo, start_simulation_pool, stop_simulation_pool
+
+# Several chunks, so a pool actually splits the work
+PATHS = MONTE_CARLO_CHUNK_PATHS * 3 + 17
+TIMING = ("workers", "elapsed_ms", "paths_per_second")
+
+
+def _results(result: dict) -> dict:
+    assert "error" not in result
+    return {k: v for k, v in result.items() if k not in TIMING}
+
+
+@pytest.fixture(scope="module")
+def inputs():
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        yield get_inputs(db)
+    finally:
+        db.close()
+
+
+def test_same_seed_same_result_in_process(inputs):
+    assert _results(run_monte_carlo(inputs, PATHS, seed=7)) == _results(run_monte_carlo(inputs, PATHS, seed=7))
+    assert _results(run_monte_carlo(inputs, PATHS, seed=7)) != _results(run_monte_carlo(inputs, PATHS, seed=8))
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_same_seed_same_result_for_any_worker_count(inputs, workers):
+    expected = _results(run_monte_carlo(inputs, PATHS, seed=11))
+    start_simulation_pool(workers)
+    try:
+        pooled = run_monte_carlo(inputs, PATHS, seed=11)
+        assert pooled["workers"] == workers
+        assert _results(pooled) == expected
+    finally:
+        stop_simulation_pool()
+    assert monte_carlo._pool is None
+
+
+def test_results_cover_every_warehouse(inputs):
+    result = run_monte_carlo(inputs, PATHS, seed=1)
+    assert result["paths"] == PATHS
+    assert len(result["warehouses"]) == len(inputs["network"].warehouse_ids)
+    assert all(0 <= w["stockout_probability"] <= 1 for w in result["warehouses"])
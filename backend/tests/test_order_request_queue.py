@@ -0,0 +1,105 @@
+from __future__ import annotations
+import json
+from sqlalchemy import func
+from app.models import CustomerOrderRequest, CustomerOrderRequestRef, Dealer, Shade
+from app.services.order_request_queue import OrderRequestQueue
+
+
+def _request(db, **overrides) -> dict:
+    return {
+        "customer_name": "Test Customer",
+        "customer_phone": "9000000000",
+        "shade_id": db.query(Shade.id).first()[0],
+        "size_preference": "4L",
+        "dealer_id": db.query(Dealer.id).first()[0],
+        **overrides,
+    }
+
+
+def _journal_entry(ref: str, request: dict) -> dict:
+    return {"ref": ref, **request, "status": "requested", "created_at": "2025-10-10T09:30:00"}
+
+
+def _count(db) -> int:
+    return db.query(func.count(CustomerOrderRequest.id)).scalar()
+
+
+def test_submit_without_flusher_inserts_immediately(db, tmp_path):
+    queue = OrderRequestQueue(tmp_path / "requests.journal", flush_interval=0.05, max_batch=100)
+    before = _count(db)
+    ref = queue.submit(_request(db))
+    assert _count(db) == before + 1
+    assert db.query(CustomerOrderRequestRef).filter(CustomerOrderRequestRef.ref == ref).one()
+
+
+def test_journal_replay_inserts_pending_requests(db, tmp_path):
+    journal = tmp_path / "requests.journal"
+    journal.write_text("".join(json.dumps(_journal_entry(f"replay-{i}", _request(db))) + "\n" for i in range(5)))
+    before = _count(db)
+
+    queue = OrderRequestQueue(journal, flush_interval=0.05, max_batch=2)
+    queue.start()
+    queue.stop()
+
+    assert _count(db) == before + 5
+    assert journal.read_text() == ""
+    assert queue.metrics()["queue_depth"] == 0
+
+
+def test_journal_replay_skips_requests_already_inserted(db, tmp_path):
+    # A crash after a batch commit but before the journal rewrite leaves inserted requests journaled
+    queue = OrderRequestQueue(tmp_path / "requests.journal", flush_interval=0.05, max_batch=100)
+    request = _request(db)
+    inserted = [queue.submit(request) for _ in range(3)]
+    journal = tmp_path / "requests.journal"
+    journal.write_text("".join(
+        json.dumps(_journal_entry(ref, request)) + "\n" for ref in inserted + ["after-crash"]
+    ))
+    before = _count(db)
+
+    queue = OrderRequestQueue(journal, flush_interval=0.05, max_batch=100)
+    queue.start()
+    queue.stop()
+
+    assert _count(db) == before + 1
+    assert queue.metrics()["duplicates_skipped"] == 3
+
+
+def test_rejected_requests_are_dead_lettered_without_blocking_the_batch(db, tmp_path):
+    journal = tmp_path / "requests.journal"
+    good = [_journal_entry(f"good-{i}", _request(db)) for i in range(3)]
+    bad = _journal_entry("bad-1", _request(db, shade_id=None))
+    journal.write_text("".join(json.dumps(e) + "\n" for e in [good[0], bad, *good[1:]]))
+    before = _count(db)
+
+    queue = OrderRequestQueue(journal, flush_interval=0.05, max_batch=100)
+    queue.start()
+    queue.stop()
+
+    assert _count(db) == before + 3
+    metrics = queue.metrics()
+    assert metrics["dead_lettered"] == 1
+    assert [d["ref"] for d in metrics["recent_dead_letters"]] == ["bad-1"]
+    dead = [json.loads(line) for line in queue.dead_letter_path.read_text().splitlines()]
+    assert [d["ref"] for d in dead] == ["bad-1"] and "IntegrityError" in dead[0]["error"]
+    assert journal.read_text() == ""
+
+
+def test_running_queue_journals_then_flushes(db, tmp_path):
+    journal = tmp_path / "requests.journal"
+    queue = OrderRequestQueue(journal, flush_interval=60, max_batch=100)
+    queue.start()
+    before = _count(db)
+    try:
+        refs = [queue.submit(_request(db)) for _ in range(4)]
+        assert [json.loads(line)["ref"] for line in journal.read_text().splitlines()] == refs
+        assert _count(db) == before
+    finally:
+        queue.stop()
+    assert _count(db) == before + 4
+    assert journal.read_text() == ""
+
+
+def test_order_request_endpoint_keeps_request_id(client, db):
+    response = client.post("/api/customer/order-request", json=_request(db)).json()
+    assert response["success"] and response["request_id"] == response["request_ref"]
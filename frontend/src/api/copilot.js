@@ -2,3 +2,29 @@ import api from './client'
 
 export const sendChat = (message, context = {}) =>
   api.post('/copilot/chat', { message, context })
+
+// POST + server-sent events: calls onEvent(event, data) for each event as it arrives
+export const streamChat = async (message, context = {}, onEvent) => {
+  const res = await fetch(`${api.defaults.baseURL}/copilot/chat/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ message, context }),
+  })
+  if (!res.ok || !res.body) throw new Error(`Chat stream failed (${res.status})`)
+
+  const reader = res.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  for (;;) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    const frames = buffer.split('\n\n')
+    buffer = frames.pop()
+    for (const frame of frames) {
+      const event = frame.match(/^event: (.*)$/m)?.[1]
+      const data = frame.match(/^data: (.*)$/m)?.[1]
+      if (event && data) onEvent(event, JSON.parse(data))
+    }
+  }
+}
@@ -4,8 +4,15 @@ export const fetchShades = (params) => api.get('/customer/shades', { params })
 export const fetchShadeDetail = (id) => api.get(`/customer/shades/${id}`)
 export const fetchShadeAvailability = (id, lat, lng) =>
   api.get(`/customer/shades/${id}/availability`, { params: { lat, lng } })
+export const fetchShadeSubstitutes = (id, lat, lng) =>
+  api.get(`/customer/shades/${id}/substitutes`, { params: { lat, lng } })
 export const fetchNearbyDealers = (lat, lng) =>
   api.get('/customer/dealers/nearby', { params: { lat, lng } })
 export const snapAndFind = (hexColor) =>
   api.post('/customer/snap-find', null, { params: { hex_color: hexColor } })
+export const snapAndFindImage = (file) => {
+  const form = new FormData()
+  form.append('file', file)
+  return api.post('/customer/snap-find', form)
+}
 export const createOrderRequest = (data) => api.post('/customer/order-request', data)
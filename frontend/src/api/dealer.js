@@ -3,6 +3,8 @@ import api from './client'
 export const fetchDealerDashboard = (id) => api.get(`/dealer/${id}/dashboard`)
 export const fetchSmartOrders = (id) => api.get(`/dealer/${id}/smart-orders`)
 export const placeOrder = (id, data) => api.post(`/dealer/${id}/orders`, data)
-export const acceptBundle = (id) => api.post(`/dealer/${id}/orders/bundle`)
-export const fetchOrders = (id) => api.get(`/dealer/${id}/orders`)
+export const acceptBundle = (id, recommendationSetId) =>
+  api.post(`/dealer/${id}/orders/bundle`, { recommendation_set_id: recommendationSetId })
+export const fetchOrders = (id, params) => api.get(`/dealer/${id}/orders`, { params })
 export const fetchDealerAlerts = (id) => api.get(`/dealer/${id}/alerts`)
+export const dealerAlertStreamUrl = (id) => `/api/dealer/${id}/alerts/stream`
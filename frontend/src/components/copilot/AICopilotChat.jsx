@@ -1,6 +1,6 @@
 import { useState, useRef, useEffect } from 'react'
 import { ChatBubbleLeftRightIcon, XMarkIcon, PaperAirplaneIcon } from '@heroicons/react/24/solid'
-import { sendChat } from '../../api/copilot'
+import { sendChat, streamChat } from '../../api/copilot'
 import { useSimulation } from '../../contexts/SimulationContext'
 import ChatBubble from './ChatBubble'
 
@@ -25,11 +25,31 @@ export default function AICopilotChat() {
     setMessages(prev => [...prev, { text: userMsg, isUser: true }])
     setLoading(true)
 
+    // Stream the answer into a placeholder bubble; fall back to the plain endpoint
+    const updateReply = (patch) => setMessages(prev => {
+      const next = [...prev]
+      next[next.length - 1] = { ...next[next.length - 1], ...patch(next[next.length - 1]) }
+      return next
+    })
+    let started = false
     try {
-      const res = await sendChat(userMsg, { scenario_id: scenario })
-      setMessages(prev => [...prev, { ...res.data, isUser: false }])
+      await streamChat(userMsg, { scenario_id: scenario }, (event, data) => {
+        if (!started) {
+          started = true
+          setLoading(false)
+          setMessages(prev => [...prev, { text: '', isUser: false }])
+        }
+        if (event === 'token') updateReply(m => ({ text: m.text + data.text }))
+        else if (event === 'done') updateReply(() => ({ ...data }))
+      })
     } catch {
-      setMessages(prev => [...prev, { text: 'Sorry, something went wrong. Try again.', isUser: false }])
+      if (started) return
+      try {
+        const res = await sendChat(userMsg, { scenario_id: scenario })
+        setMessages(prev => [...prev, { ...res.data, isUser: false }])
+      } catch {
+        setMessages(prev => [...prev, { text: 'Sorry, something went wrong. Try again.', isUser: false }])
+      }
     } finally {
       setLoading(false)
     }
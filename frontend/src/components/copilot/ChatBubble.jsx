@@ -7,7 +7,7 @@ const InsightCard = ({ props }) => (
       {(props?.items || []).map((item, i) => (
         <div key={i} className="flex items-center justify-between text-xs">
           <span className="text-white">{item.shade} - {item.location}</span>
-          <span className="text-red-400 font-mono">{item.days_left} days</span>
+          <span className="text-red-400 font-mono">{item.value ?? `${item.days_left} days`}</span>
         </div>
       ))}
     </div>
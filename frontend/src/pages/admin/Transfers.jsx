@@ -76,6 +76,8 @@ export default function Transfers() {
                 <span className="text-white">{t.to_warehouse?.city}</span>
                 <span className="text-gray-600">|</span>
                 <span>{t.quantity} units</span>
+                <span className="text-gray-600">|</span>
+                <span>{t.distance_km} km, ~{t.lead_time_days} days</span>
               </div>
 
               <p className="text-xs text-gray-500 mb-3">{t.reason}</p>
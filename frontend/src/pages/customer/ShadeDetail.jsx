@@ -1,13 +1,14 @@
 import { useState, useEffect } from 'react'
 import { useParams, Link } from 'react-router-dom'
 import LoadingSpinner from '../../components/common/LoadingSpinner'
-import { fetchShadeDetail, fetchShadeAvailability } from '../../api/customer'
+import { fetchShadeDetail, fetchShadeAvailability, fetchShadeSubstitutes } from '../../api/customer'
 import { FireIcon, MapPinIcon } from '@heroicons/react/24/solid'
 
 export default function ShadeDetail() {
   const { shadeId } = useParams()
   const [shade, setShade] = useState(null)
   const [availability, setAvailability] = useState([])
+  const [substitutes, setSubstitutes] = useState([])
   const [loading, setLoading] = useState(true)
 
   useEffect(() => {
@@ -17,6 +18,10 @@ export default function ShadeDetail() {
     ]).then(([s, a]) => {
       setShade(s.data)
       setAvailability(a.data)
+      if (!a.data.some(d => d.stock_qty > 0)) {
+        return fetchShadeSubstitutes(shadeId, 19.07, 72.87).then(r => setSubstitutes(r.data.substitutes || []))
+      }
+      setSubstitutes([])
     }).catch(() => {}).finally(() => setLoading(false))
   }, [shadeId])
 
@@ -110,6 +115,30 @@ export default function ShadeDetail() {
               </div>
             )}
           </div>
+
+          {substitutes.length > 0 && (
+            <div>
+              <h3 className="font-semibold text-gray-900 mb-3">Similar Shades In Stock Nearby</h3>
+              <div className="space-y-2">
+                {substitutes.map(s => (
+                  <Link
+                    key={s.shade_id}
+                    to={`/customer/shade/${s.shade_id}`}
+                    className="bg-white border border-gray-200 rounded-xl p-3 flex items-center gap-3 hover:shadow-md transition-shadow"
+                  >
+                    <div className="w-10 h-10 rounded-lg shadow-inner" style={{ backgroundColor: s.hex_color }} />
+                    <div className="flex-1">
+                      <p className="font-medium text-gray-900 text-sm">{s.shade_name}</p>
+                      <p className="text-xs text-gray-500">
+                        {s.nearest_dealer.dealer_name} | {s.nearest_dealer.distance_km} km away
+                      </p>
+                    </div>
+                    <span className="text-xs font-semibold text-gray-500">{s.confidence}% match</span>
+                  </Link>
+                ))}
+              </div>
+            </div>
+          )}
         </div>
       </div>
     </div>
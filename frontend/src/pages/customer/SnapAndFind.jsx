@@ -2,7 +2,7 @@ import { useState } from 'react'
 import { Link } from 'react-router-dom'
 import { CameraIcon } from '@heroicons/react/24/solid'
 import LoadingSpinner from '../../components/common/LoadingSpinner'
-import { snapAndFind, fetchShadeAvailability } from '../../api/customer'
+import { snapAndFind, snapAndFindImage, fetchShadeAvailability } from '../../api/customer'
 
 const scanSteps = [
   'Scanning wall surface...',
@@ -17,10 +17,17 @@ export default function SnapAndFind() {
   const [loading, setLoading] = useState(false)
   const [scanStep, setScanStep] = useState(0)
   const [imagePreview, setImagePreview] = useState(null)
+  const [imageFile, setImageFile] = useState(null)
+
+  const handleHexChange = (e) => {
+    setHexInput(e.target.value)
+    setImageFile(null)
+  }
 
   const handleImageUpload = (e) => {
     const file = e.target.files?.[0]
     if (!file) return
+    setImageFile(file)
 
     const reader = new FileReader()
     reader.onload = () => setImagePreview(reader.result)
@@ -54,7 +61,8 @@ export default function SnapAndFind() {
     }
 
     try {
-      const res = await snapAndFind(hexInput)
+      // Photos are analysed server-side for their dominant colors
+      const res = imageFile ? await snapAndFindImage(imageFile) : await snapAndFind(hexInput)
       setResult(res.data)
 
       if (res.data.shade_id) {
@@ -112,13 +120,13 @@ export default function SnapAndFind() {
         <input
           type="color"
           value={hexInput}
-          onChange={e => setHexInput(e.target.value)}
+          onChange={handleHexChange}
           className="w-12 h-12 rounded-lg cursor-pointer border-0"
         />
         <input
           type="text"
           value={hexInput}
-          onChange={e => setHexInput(e.target.value)}
+          onChange={handleHexChange}
           className="flex-1 bg-white border border-gray-200 text-gray-900 rounded-lg px-4 py-2 text-sm font-mono outline-none focus:ring-2 focus:ring-orange-300"
           placeholder="#FF0000"
         />
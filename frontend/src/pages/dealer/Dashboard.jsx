@@ -7,7 +7,7 @@ import {
 import StatCard from '../../components/common/StatCard'
 import HealthScoreGauge from '../../components/paint/HealthScoreGauge'
 import LoadingSpinner from '../../components/common/LoadingSpinner'
-import { fetchDealerDashboard, fetchDealerAlerts } from '../../api/dealer'
+import { fetchDealerDashboard, fetchDealerAlerts, dealerAlertStreamUrl } from '../../api/dealer'
 import { formatCurrency } from '../../utils/formatters'
 
 const DEALER_ID = 1
@@ -27,6 +27,13 @@ export default function DealerDashboard() {
     }).catch(() => {}).finally(() => setLoading(false))
   }, [])
 
+  useEffect(() => {
+    // Alerts are pushed by the server whenever warehouse inventory changes
+    const source = new EventSource(dealerAlertStreamUrl(DEALER_ID))
+    source.addEventListener('alerts', e => setAlerts(JSON.parse(e.data).alerts))
+    return () => source.close()
+  }, [])
+
   if (loading) return <LoadingSpinner />
   if (!data) return <p className="text-gray-500">Dealer not found</p>
 
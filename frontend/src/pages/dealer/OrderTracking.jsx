@@ -9,20 +9,37 @@ const DEALER_ID = 1
 
 export default function OrderTracking() {
   const [orders, setOrders] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [loading, setLoading] = useState(true)
 
-  useEffect(() => {
-    fetchOrders(DEALER_ID)
-      .then(r => setOrders(r.data))
+  const loadPage = (cursor) =>
+    fetchOrders(DEALER_ID, cursor ? { cursor } : undefined)
+      .then(r => {
+        setOrders(prev => (cursor ? [...prev, ...r.data.orders] : r.data.orders))
+        setNextCursor(r.data.next_cursor)
+      })
       .catch(() => {})
       .finally(() => setLoading(false))
+
+  useEffect(() => {
+    loadPage(null)
   }, [])
 
   if (loading) return <LoadingSpinner />
 
   const columns = [
     { key: 'id', label: 'Order ID', render: v => <span className="font-mono text-gray-400">#{v}</span> },
-    { key: 'sku_id', label: 'SKU ID' },
+    {
+      key: 'shade_name',
+      label: 'Product',
+      render: (v, row) => (
+        <div className="flex items-center gap-2">
+          <div className="w-4 h-4 rounded" style={{ backgroundColor: row.shade_hex }} />
+          <span>{v}</span>
+          <span className="text-xs text-gray-500">{row.size}</span>
+        </div>
+      ),
+    },
     { key: 'quantity', label: 'Qty', render: v => v?.toLocaleString('en-IN') },
     {
       key: 'order_date',
@@ -61,7 +78,7 @@ export default function OrderTracking() {
       <div className="flex items-center justify-between">
         <div>
           <h1 className="text-2xl font-bold text-white">Order History</h1>
-          <p className="text-sm text-gray-500 mt-1">Last 50 orders</p>
+          <p className="text-sm text-gray-500 mt-1">Most recent first</p>
         </div>
         {totalSavings > 0 && (
           <div className="glass rounded-xl px-4 py-3 border border-emerald-500/30">
@@ -72,6 +89,15 @@ export default function OrderTracking() {
       </div>
 
       <DataTable columns={columns} data={orders} />
+
+      {nextCursor && (
+        <button
+          onClick={() => loadPage(nextCursor)}
+          className="w-full py-3 glass rounded-xl border border-gray-800 hover:border-gray-700 text-sm text-gray-300 transition-colors"
+        >
+          Load more
+        </button>
+      )}
     </div>
   )
 }
@@ -9,21 +9,34 @@ const DEALER_ID = 1
 
 export default function SmartOrders() {
   const [orders, setOrders] = useState([])
+  const [recommendationSetId, setRecommendationSetId] = useState(null)
   const [loading, setLoading] = useState(true)
   const [bundleResult, setBundleResult] = useState(null)
 
-  useEffect(() => {
+  const loadOrders = () =>
     fetchSmartOrders(DEALER_ID)
-      .then(r => setOrders(r.data))
+      .then(r => {
+        setOrders(r.data.orders)
+        setRecommendationSetId(r.data.recommendation_set_id)
+      })
       .catch(() => {})
       .finally(() => setLoading(false))
+
+  useEffect(() => {
+    loadOrders()
   }, [])
 
   const totalSavings = orders.reduce((s, o) => s + (o.savings_amount || 0), 0)
 
   const handleAcceptBundle = async () => {
     try {
-      const res = await acceptBundle(DEALER_ID)
+      const res = await acceptBundle(DEALER_ID, recommendationSetId)
+      if (res.data.stale) {
+        // Inventory or forecasts moved on since these were shown - reload them
+        setLoading(true)
+        loadOrders()
+        return
+      }
       setBundleResult(res.data)
       confetti({
         particleCount: 150,